@@ -3,6 +3,7 @@ from dagster import AssetExecutionContext, AssetIn, asset
 
 from data_pipeline.partitions import user_partitions_def
 from data_pipeline.resources.batch_embedder_resource import BatchEmbedderResource
+from data_pipeline.utils.embedding_series import to_embedding_series
 
 
 @asset(
@@ -36,7 +37,12 @@ async def deduplicated_graph_w_embeddings(
 
     # Create a new DataFrame with just labels and embeddings
     embedding_df = pl.DataFrame(
-        {"label": nodes_to_process.get_column("label"), "new_embedding": embeddings}
+        [
+            nodes_to_process.get_column("label"),
+            to_embedding_series(
+                embeddings, batch_embedder.embedding_dimensions, name="new_embedding"
+            ),
+        ]
     )
 
     # Join the embeddings back to the original DataFrame
@@ -10,7 +10,7 @@ from dagster import AssetExecutionContext, AssetIn, asset
 from json_repair import repair_json
 from pydantic import Field
 
-from data_pipeline.constants.custom_config import RowLimitConfig
+from data_pipeline.constants.custom_config import LlmCacheConfig, RowLimitConfig
 from data_pipeline.partitions import user_partitions_def
 from data_pipeline.resources.batch_inference.base_llm_resource import BaseLlmResource
 from data_pipeline.utils.graph.save_graph import save_graph
@@ -56,7 +56,7 @@ def parse_causal_labels(completion: str) -> list[str] | None:
         return None
 
 
-class RecursiveCausalityConfig(RowLimitConfig):
+class RecursiveCausalityConfig(RowLimitConfig, LlmCacheConfig):
     row_limit: int | None = None
 
     top_k: int = Field(
@@ -210,7 +210,7 @@ async def recursive_causality(
     if prompt_sequences:
         # Get all completions in one (big) batch
         completions_list, cost = llm.get_prompt_sequences_completions_batch(
-            prompt_sequences
+            prompt_sequences, use_cache=config.use_llm_cache
         )
         total_cost += cost
 
@@ -3,6 +3,7 @@ from dagster import AssetExecutionContext, AssetIn, asset
 
 from data_pipeline.partitions import user_partitions_def
 from data_pipeline.resources.batch_embedder_resource import BatchEmbedderResource
+from data_pipeline.utils.embedding_series import to_embedding_series
 
 
 @asset(
@@ -29,4 +30,6 @@ async def speculatives_query_entities_w_embeddings(
 
     context.log.info(f"Embeddings cost: ${cost:.2f}")
 
-    return df.with_columns(pl.Series(embeddings).alias("embedding"))
+    return df.with_columns(
+        to_embedding_series(embeddings, batch_embedder.embedding_dimensions)
+    )
@@ -5,6 +5,7 @@ from data_pipeline.constants.custom_config import RowLimitConfig
 from data_pipeline.constants.environments import get_environment
 from data_pipeline.partitions import user_partitions_def
 from data_pipeline.resources.batch_embedder_resource import BatchEmbedderResource
+from data_pipeline.utils.embedding_series import to_embedding_series
 
 
 class NodeEmbeddingsConfig(RowLimitConfig):
@@ -38,12 +39,7 @@ async def node_embeddings(
 
     # Add embedding columns to the result DataFrame
     result = df.with_columns(
-        embedding=pl.Series(
-            dtype=pl.List(pl.Float64),
-            name="embedding",
-            values=embeddings,
-            strict=False,
-        )
+        to_embedding_series(embeddings, embedder.embedding_dimensions)
     )
 
     # Check for invalid embeddings
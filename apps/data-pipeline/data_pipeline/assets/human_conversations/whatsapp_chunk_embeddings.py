@@ -3,6 +3,7 @@ from dagster import AssetExecutionContext, AssetIn, asset
 
 from data_pipeline.partitions import multi_phone_number_partitions_def
 from data_pipeline.resources.batch_embedder_resource import BatchEmbedderResource
+from data_pipeline.utils.embedding_series import to_embedding_series
 
 
 @asset(
@@ -27,5 +28,5 @@ async def whatsapp_chunk_embeddings(
     context.log.info(f"Total cost: ${cost:.2f}")
 
     return whatsapp_chunks_subgraphs.with_columns(
-        pl.Series(embeddings).alias("embedding"),
+        to_embedding_series(embeddings, batch_embedder.embedding_dimensions),
     )
@@ -5,7 +5,7 @@ from dagster import AssetExecutionContext, AssetIn, asset
 from json_repair import repair_json
 from pydantic import BaseModel, Field
 
-from data_pipeline.constants.custom_config import RowLimitConfig
+from data_pipeline.constants.custom_config import LlmCacheConfig, RowLimitConfig
 from data_pipeline.constants.environments import get_environment
 from data_pipeline.partitions import multi_phone_number_partitions_def
 from data_pipeline.resources.batch_inference.base_llm_resource import (
@@ -48,7 +48,7 @@ def parse_subgraphs(response: str, subgraph_type: str) -> list[dict] | None:
         return None
 
 
-class WhatsappChunksSubgraphsConfig(RowLimitConfig):
+class WhatsappChunksSubgraphsConfig(RowLimitConfig, LlmCacheConfig):
     row_limit: int | None = None if get_environment() == "LOCAL" else None
 
 
@@ -117,6 +117,7 @@ def whatsapp_chunks_subgraphs(
         cost,
     ) = llm.get_prompt_sequences_completions_batch(
         prompt_sequences,
+        use_cache=config.use_llm_cache,
     )
 
     context.log.info(f"Subgraphs extraction cost: ${cost:.6f}")
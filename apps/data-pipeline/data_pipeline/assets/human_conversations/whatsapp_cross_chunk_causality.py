@@ -214,19 +214,23 @@ def whatsapp_cross_chunk_causality(
                 )
             )
 
-    completions, cost = llm.get_prompt_sequences_completions_batch(
+    # Parse the completions as they stream in, keeping the prompts order
+    chunk_id_new_causal_links: list[tuple[int, list[dict] | None]] = [
+        (chunk_id, []) for chunk_id, _ in chunk_id_prompt_sequences
+    ]
+    cost = 0.0
+    for i, completion, sequence_cost in llm.iter_prompt_sequences_completions(
         [x[1] for x in chunk_id_prompt_sequences]
-    )
+    ):
+        cost += sequence_cost
+        if completion:
+            chunk_id_new_causal_links[i] = (
+                chunk_id_prompt_sequences[i][0],
+                _parse_cross_chunk_causality_response(completion[-1]),
+            )
 
     context.log.info(f"Total cost: ${cost:.2f}")
 
-    chunk_id_new_causal_links = [
-        (chunk_id, _parse_cross_chunk_causality_response(completion[-1]))
-        if completion
-        else (chunk_id, [])
-        for completion, (chunk_id, _) in zip(completions, chunk_id_prompt_sequences)
-    ]
-
     chunk_id_to_new_causal_links = {
         k: list(concat(v[1] for v in vals if v[1] is not None))
         for k, vals in groupby(lambda x: x[0], chunk_id_new_causal_links).items()
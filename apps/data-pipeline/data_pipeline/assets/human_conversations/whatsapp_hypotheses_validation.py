@@ -2,7 +2,6 @@ import asyncio
 import json
 from dataclasses import asdict
 
-import networkx as nx
 import polars as pl
 from ai_agents.base_agent import TraceRecord
 from ai_agents.graph_explorer_agent.actions.get_causal_chain import (
@@ -21,10 +20,12 @@ from ai_agents.graph_explorer_agent.actions.get_similar_nodes import (
 from ai_agents.graph_explorer_agent.agent import (
     GraphExplorerAgent,
 )
+from ai_agents.graph_explorer_agent.compact_graph import CompactGraph
 from ai_agents.graph_explorer_agent.types import (
     ActionsImpl,
     HypothesisValidationResult,
 )
+from ai_agents.graph_explorer_agent.utils.similarity_index import SimilarityIndex
 from dagster import AssetExecutionContext, AssetIn, asset
 
 from data_pipeline.constants.environments import get_environment
@@ -33,7 +34,6 @@ from data_pipeline.resources.batch_embedder_resource import BatchEmbedderResourc
 from data_pipeline.resources.batch_inference.base_llm_resource import (
     BaseLlmResource,
 )
-from data_pipeline.utils.get_node_datetime import get_node_datetime
 
 
 @asset(
@@ -62,22 +62,17 @@ def whatsapp_hypotheses_validation(
     llm_config = deepseek_r1.llm_config
     df = whatsapp_nodes_deduplicated
 
-    G = nx.DiGraph()
-    for row in df.iter_rows(named=True):
-        G.add_node(
-            row["id"],
-            description=row["proposition"],
-            frequency=row["frequency"],
-            user=row["user"],
-            datetime=get_node_datetime(row["datetimes"]),
-            chunk_ids=row["chunk_ids"],
-        )
-        G.add_edges_from([(row["id"], e) for e in row["edges"]])
+    G = CompactGraph.from_nodes_df(
+        df, version=f"{context.run_id}:{context.partition_key}"
+    )
+
+    # Built once and shared by all the hypotheses
+    similarity_index = SimilarityIndex.from_nodes_df(df)
 
     async def get_similar_nodes_async(query):
         return await get_similar_nodes(
             G,
-            df.select("id", "embedding").to_dicts(),
+            similarity_index,
             batch_embedder,
             query,
             use_lock=get_environment() == "LOCAL",
@@ -3,6 +3,7 @@ from dagster import AssetExecutionContext, AssetIn, Config, asset
 
 from data_pipeline.partitions import multi_phone_number_partitions_def
 from data_pipeline.resources.batch_embedder_resource import BatchEmbedderResource
+from data_pipeline.utils.embedding_series import to_embedding_series
 
 
 def _get_exploded_df(
@@ -56,4 +57,6 @@ async def whatsapp_node_embeddings(
 
     context.log.info(f"Total cost: ${cost:.2f}")
 
-    return df.with_columns(pl.Series(embeddings).alias("embedding"))
+    return df.with_columns(
+        to_embedding_series(embeddings, batch_embedder.embedding_dimensions)
+    )
@@ -2,6 +2,7 @@ import polars as pl
 from dagster import AssetExecutionContext, AssetIn, asset
 from json_repair import repair_json
 
+from data_pipeline.constants.custom_config import LlmCacheConfig
 from data_pipeline.partitions import multi_phone_number_partitions_def
 from data_pipeline.resources.batch_inference.base_llm_resource import (
     BaseLlmResource,
@@ -49,6 +50,7 @@ async def whatsapp_node_sentiments(
     context: AssetExecutionContext,
     whatsapp_nodes_deduplicated: pl.DataFrame,
     llama70b: BaseLlmResource,
+    config: LlmCacheConfig,
 ) -> pl.DataFrame:
     df = whatsapp_nodes_deduplicated
 
@@ -58,7 +60,7 @@ async def whatsapp_node_sentiments(
     ]
 
     completions, cost = llama70b.get_prompt_sequences_completions_batch(
-        prompt_sequences
+        prompt_sequences, use_cache=config.use_llm_cache
     )
 
     context.log.info(f"Cost: ${cost:.6f}")
@@ -1,6 +1,8 @@
+import asyncio
 from textwrap import dedent
-from typing import Dict
+from typing import Dict, List
 
+import numpy as np
 import polars as pl
 from dagster import AssetExecutionContext, AssetIn, Config, asset
 from json_repair import repair_json
@@ -13,10 +15,24 @@ from data_pipeline.resources.batch_inference.base_llm_resource import (
     PromptSequence,
 )
 from data_pipeline.resources.postgres_resource import PostgresResource
+from data_pipeline.utils.embedding_series import (
+    to_embedding_matrix,
+    to_embedding_series,
+)
 from data_pipeline.utils.get_messaging_partners import get_messaging_partners
+from data_pipeline.utils.get_working_dir import get_working_dir
 from data_pipeline.utils.graph.build_graph_from_df import build_graph_from_df
 from data_pipeline.utils.graph.save_graph import save_graph
-from data_pipeline.utils.super_deduplicator import deduplicate_nodes_dataframe
+from data_pipeline.utils.similarity_join import (
+    SimilarityJoinConfig,
+    normalize_embeddings,
+)
+from data_pipeline.utils.super_deduplicator import (
+    DeduplicationResult,
+    DeduplicationState,
+    MergePolicy,
+    deduplicate_nodes,
+)
 
 
 def _get_synthetization_prompt_sequence(
@@ -55,52 +71,119 @@ class WhatsappClaimsDeduplicatedConfig(Config):
         default=0.98,
         description="Cosine similarity threshold for merging claims. (depends on the embedding model used upstream)",
     )
+    index_kind: str = Field(
+        default="auto",
+        description="FAISS index for the similarity search: auto, flat, ivf, hnsw or ivfpq",
+    )
+    range_search: bool = Field(
+        default=True,
+        description="Find every neighbor above the threshold instead of the top 30",
+    )
+    pca_dimensions: int | None = Field(
+        default=None,
+        description="Project the embeddings on this many dimensions before searching",
+    )
+    representative: str = Field(
+        default="min_label",
+        description="Node representing a merged group: min_label, first or centroid",
+    )
+    incremental: bool = Field(
+        default=True,
+        description="Resume from the previous run's groups, only synthesizing the groups that changed",
+    )
     debug_graph: bool = Field(
         default=True, description="Whether to save the graph to the debug directory"
     )
 
 
 def _make_ids_globally_unique(
-    df: pl.DataFrame,
-    used_ids: set[str],
+    dfs: List[pl.DataFrame],
     id_col: str = "id",
     rel_col: str = "relationships",
-) -> pl.DataFrame:
+) -> List[pl.DataFrame]:
     """
-    Ensures IDs in df[id_col] are unique globally, by appending '_2', '_3', etc.
-    Updates relationship references accordingly.
+    Ensures IDs in df[id_col] are unique across the dataframes, by appending '_2',
+    '_3', etc. to the later occurrences. Updates the relationship references of
+    each dataframe to its own IDs accordingly.
     """
-    old_ids = df[id_col].to_list()
-    # Build a mapping from old_id -> new_id
-    id_mapping: Dict[str, str] = {}
-    for old_id in old_ids:
-        candidate = old_id
-        counter = 2
-        # If candidate is already taken, append _2, _3, etc.
-        while candidate in used_ids:
-            candidate = f"{old_id}_{counter}"
-            counter += 1
-        id_mapping[old_id] = candidate
-        used_ids.add(candidate)
-
-    # Replace the DataFrame's id column
-    df = df.with_columns(pl.col(id_col).map_elements(lambda x: id_mapping[x]))
-
-    # Update relationships so that old references get mapped to new IDs
-    if rel_col in df.columns:
-        df = df.with_columns(
-            pl.col(rel_col).map_elements(
-                lambda rels: [
-                    {
-                        "source": id_mapping.get(r["source"], r["source"]),
-                        "target": id_mapping.get(r["target"], r["target"]),
-                    }
-                    for r in rels
-                ]
+    id_mapping = pl.concat(
+        [
+            df.select(pl.col(id_col).alias("old_id"), pl.lit(i).alias("_frame"))
+            for i, df in enumerate(dfs)
+        ]
+    ).with_columns(
+        # The rank of each id over the dataframes gives its suffix
+        _counter=pl.int_range(1, pl.len() + 1).over("old_id")
+    )
+
+    # Bumps the suffixes that are taken by an earlier id, e.g. an actual "x_2"
+    while True:
+        id_mapping = id_mapping.with_columns(
+            new_id=pl.when(pl.col("_counter") > 1)
+            .then(pl.format("{}_{}", "old_id", "_counter"))
+            .otherwise(pl.col("old_id"))
+        )
+        taken = pl.int_range(pl.len()).over("new_id") > 0
+        if not id_mapping.select(taken.any()).item():
+            break
+        id_mapping = id_mapping.with_columns(
+            _counter=pl.when(taken)
+            .then(pl.col("_counter") + 1)
+            .otherwise(pl.col("_counter"))
+        )
+
+    unique_dfs = []
+    for i, df in enumerate(dfs):
+        frame_mapping = id_mapping.filter(pl.col("_frame") == i).select(
+            "old_id", "new_id"
+        )
+        df = (
+            df.join(
+                frame_mapping,
+                left_on=id_col,
+                right_on="old_id",
+                how="left",
+                maintain_order="left",
             )
+            .with_columns(pl.col("new_id").alias(id_col))
+            .drop("new_id")
         )
 
-    return df
+        # Update relationships so that old references get mapped to new IDs
+        if rel_col in df.columns:
+            relationships = (
+                df.with_row_index("_row")
+                .select("_row", rel_col)
+                .explode(rel_col)
+                .drop_nulls(rel_col)
+                .unnest(rel_col)
+                .with_row_index("_order")
+            )
+            for col in ("source", "target"):
+                relationships = (
+                    relationships.join(
+                        frame_mapping, left_on=col, right_on="old_id", how="left"
+                    )
+                    .with_columns(pl.coalesce("new_id", col).alias(col))
+                    .drop("new_id")
+                )
+            relationships = (
+                relationships.sort("_order")
+                .group_by("_row", maintain_order=True)
+                .agg(pl.struct("source", "target").alias(rel_col))
+            )
+
+            df = (
+                df.drop(rel_col)
+                .with_row_index("_row")
+                .join(relationships, on="_row", how="left", maintain_order="left")
+                .with_columns(pl.col(rel_col).fill_null([]))
+                .select(df.columns)
+            )
+
+        unique_dfs.append(df)
+
+    return unique_dfs
 
 
 @asset(
@@ -179,42 +262,96 @@ async def whatsapp_nodes_deduplicated(
     deduplication_args = {
         "label_col": "id",
         "embedding_col": "embedding",
-        "single_fields": ["user", "proposition", "embedding"],
-        "list_fields": [
-            ("chunk_ids", "chunk_id"),
-            ("datetimes", "datetime"),
-            ("propositions_to_merge", "proposition"),
-            ("subgraph_types", "subgraph_type"),
-        ],
+        "policy": MergePolicy(
+            single_fields=["user", "proposition", "embedding"],
+            list_fields=[
+                ("chunk_ids", "chunk_id"),
+                ("datetimes", "datetime"),
+                ("propositions_to_merge", "proposition"),
+                ("subgraph_types", "subgraph_type"),
+            ],
+            representative=config.representative,  # type: ignore
+        ),
         "relationship_col": "relationships",
         "threshold": config.threshold,
+        "similarity_join": SimilarityJoinConfig(
+            kind=config.index_kind,  # type: ignore
+            max_k=None if config.range_search else 30,
+            pca_dimensions=config.pca_dimensions,
+        ),
     }
 
-    # Deduplicate by user group
-    df_both = df.filter(pl.col("user") == "both")
-    df_initiator = df.filter(pl.col("user") == messaging_partners.initiator_name)
-    df_partner = df.filter(pl.col("user") == messaging_partners.partner_name)
+    # Deduplicate by user group. The groups are made contiguous so that they can
+    # share slices of one normalized embedding matrix
+    user_groups = {
+        "both": "both",
+        "initiator": messaging_partners.initiator_name,
+        "partner": messaging_partners.partner_name,
+    }
+    df = df.sort(
+        pl.col("user").replace_strict(
+            list(user_groups.values()), range(len(user_groups)), default=None
+        ),
+        maintain_order=True,
+    )
+    embeddings = normalize_embeddings(to_embedding_matrix(df.get_column("embedding")))
+
+    # Deduplication state of each user group, kept across runs of the partition
+    initiator_phone_number, partner_phone_number = context.partition_keys[0].split("|")
+    state_dir = (
+        get_working_dir(context)
+        / "state"
+        / initiator_phone_number
+        / partner_phone_number
+    )
 
-    deduped_both = deduplicate_nodes_dataframe(df_both, **deduplication_args)
-    deduped_initiator = deduplicate_nodes_dataframe(df_initiator, **deduplication_args)
-    deduped_partner = deduplicate_nodes_dataframe(df_partner, **deduplication_args)
+    def deduplicate_group(group: str) -> DeduplicationResult:
+        rows = np.flatnonzero((df.get_column("user") == user_groups[group]).to_numpy())
+        start, end = (rows[0], rows[-1] + 1) if len(rows) else (0, 0)
 
-    # Make IDs globally unique across the three dataframes
-    used_ids: set[str] = set()
+        state = None
+        if config.incremental:
+            state = DeduplicationState.load(state_dir / group)
 
-    deduped_both = _make_ids_globally_unique(deduped_both, used_ids)
-    deduped_initiator = _make_ids_globally_unique(deduped_initiator, used_ids)
-    deduped_partner = _make_ids_globally_unique(deduped_partner, used_ids)
+        return deduplicate_nodes(
+            df.slice(start, end - start),
+            state=state,
+            embeddings=embeddings[start:end],
+            **deduplication_args,
+        )
 
-    # Combine them
+    # faiss, numpy and polars release the GIL, so threads run the groups in
+    # parallel without copying the embeddings to other processes
+    results = await asyncio.gather(
+        *[asyncio.to_thread(deduplicate_group, group) for group in user_groups]
+    )
+
+    deduped_dfs = []
+    states: Dict[str, DeduplicationState | None] = {}
+    for group, deduplicated in zip(user_groups, results):
+        context.log.info(
+            f"Deduplicated {deduplicated.label_mapping.height} -> "
+            f"{len(deduplicated.nodes)} {group} nodes, "
+            f"{deduplicated.changed.sum()} changed ({deduplicated.format_timings()})"
+        )
+        states[group] = deduplicated.state
+        deduped_dfs.append(
+            deduplicated.nodes.with_columns(
+                deduplicated.changed.alias("_changed"),
+                pl.col("id").alias("_label"),
+                pl.lit(group).alias("_group"),
+            )
+        )
+
+    # Make IDs globally unique across the three dataframes, and combine them
     deduplicated_df = pl.concat(
-        [deduped_both, deduped_initiator, deduped_partner],
-        how="vertical",
+        _make_ids_globally_unique(deduped_dfs), how="vertical"
     ).with_row_count("index")
 
-    # Synthesize propositions for rows with frequency > 1
+    # Synthesize propositions for rows with frequency > 1, unless their group is
+    # unchanged and already has one from a previous run
     to_synthesize = (
-        deduplicated_df.filter(pl.col("frequency") > 1)
+        deduplicated_df.filter((pl.col("frequency") > 1) & pl.col("_changed"))
         .select("index", "propositions_to_merge")
         .with_columns(
             propositions_to_merge_str=pl.col("propositions_to_merge").list.join("\n")
@@ -243,7 +380,9 @@ async def whatsapp_nodes_deduplicated(
         to_synthesize.get_column("proposition").to_list(),
     )
     context.log.info(f"Embedding cost: ${cost:.6f}")
-    to_synthesize = to_synthesize.with_columns(embedding=pl.Series(embeddings))
+    to_synthesize = to_synthesize.with_columns(
+        to_embedding_series(embeddings, batch_embedder.embedding_dimensions)
+    )
 
     deduplicated_df = deduplicated_df.join(
         to_synthesize, on="index", how="left", suffix="_right"
@@ -254,16 +393,25 @@ async def whatsapp_nodes_deduplicated(
         for col in deduplicated_df.columns
         if col.endswith("_right")
     ]
-    deduplicated_df = (
-        deduplicated_df.with_columns(
-            [
-                pl.col(f"{col}_right").fill_null(pl.col(col)).alias(col)
-                for col in cols_to_coalesce
-            ]
-        )
-        .drop([col + "_right" for col in cols_to_coalesce])
-        .drop("index")
-    )
+    deduplicated_df = deduplicated_df.with_columns(
+        [
+            pl.col(f"{col}_right").fill_null(pl.col(col)).alias(col)
+            for col in cols_to_coalesce
+        ]
+    ).drop([col + "_right" for col in cols_to_coalesce])
+
+    # Groups whose synthesis failed aren't kept, so they're retried next time
+    failed = to_synthesize.filter(pl.col("proposition").is_null()).get_column("index")
+    representatives = deduplicated_df.filter(~pl.col("index").is_in(failed.implode()))
+    for group, state in states.items():
+        if state is None:
+            continue
+        state.representatives = representatives.filter(
+            pl.col("_group") == group
+        ).select(pl.col("_label").alias("id"), "proposition", "embedding")
+        state.save(state_dir / group)
+
+    deduplicated_df = deduplicated_df.drop("index", "_changed", "_label", "_group")
 
     if config.debug_graph:
         save_graph(
@@ -14,3 +14,13 @@ class RowLimitConfig(Config):
             "environments."
         ),
     )
+
+
+class LlmCacheConfig(Config):
+    use_llm_cache: bool = Field(
+        default=True,
+        description=(
+            "Reuse cached LLM completions for unchanged prompts. Disable to force "
+            "fresh completions (they still refresh the cache)."
+        ),
+    )
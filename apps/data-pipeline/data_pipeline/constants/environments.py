@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 from typing import Literal
 
 from upath import UPath
@@ -25,6 +26,14 @@ DAGSTER_STORAGE_DIRECTORY = STORAGE_BUCKET / "dagster"
 BATCH_STORAGE_DIRECTORY = STORAGE_BUCKET / "batch"
 API_STORAGE_DIRECTORY = STORAGE_BUCKET / "api"
 
+# Caches backed by sqlite or memory-mapped files need a local filesystem,
+# so they can't live in the (possibly remote) storage bucket
+LOCAL_CACHE_DIRECTORY = Path(
+    os.getenv(
+        "LOCAL_CACHE_DIRECTORY", Path(__file__).parent.parent.parent / "data" / "cache"
+    )
+)
+
 DEPLOYMENT_ROW_LIMIT = {"LOCAL": 50, "BRANCH": None, "PROD": None}[DEPLOYMENT_TYPE]
 
 
@@ -11,12 +11,16 @@ from data_pipeline.resources.batch_inference.llms.deepseek_v3 import (
     create_deepseek_v3_resource,
 )
 from data_pipeline.resources.batch_inference.llms.gemini_pro import gemini_pro_resource
-from data_pipeline.resources.batch_inference.llms.gpt4o import create_gpt4o_resource
+from data_pipeline.resources.batch_inference.llms.gpt4o import (
+    create_gpt4o_batch_resource,
+    create_gpt4o_resource,
+)
 from data_pipeline.resources.batch_inference.llms.gpt4o_mini import (
     create_gpt4o_mini_resource,
 )
 from data_pipeline.resources.batch_inference.llms.llama8b import create_llama8b_resource
 from data_pipeline.resources.batch_inference.llms.llama70b import (
+    create_llama70b_hedged_resource,
     create_llama70b_resource,
 )
 from data_pipeline.resources.batch_inference.llms.llama70b_turbo import (
@@ -33,9 +37,11 @@ resources = {
     "claude": claude_resource(),
     "llama70b_turbo": create_llama70b_turbo_resource(),
     "llama70b": create_llama70b_resource(),
+    "llama70b_hedged": create_llama70b_hedged_resource(),
     "llama8b": create_llama8b_resource(),
     "gemini_pro": gemini_pro_resource(),
     "gpt4o": create_gpt4o_resource(),
+    "gpt4o_batch": create_gpt4o_batch_resource(),
     "gpt4o_mini": create_gpt4o_mini_resource(),
     "o1_mini": create_o1_mini_resource(),
     "deepseek_r1": create_deepseek_r1_resource(),
@@ -1,6 +1,7 @@
 import asyncio
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
+import numpy as np
 from ai_agents.embeddings.base_embedder_client import BaseEmbedderClient
 from ai_agents.embeddings.deepinfra_embedder_client import DeepInfraEmbedderClient
 from dagster import (
@@ -10,17 +11,33 @@ from dagster import (
 )
 from pydantic import PrivateAttr
 
+from data_pipeline.constants.environments import LOCAL_CACHE_DIRECTORY
+from data_pipeline.resources.embedding_cache import (
+    EmbeddingCache,
+    get_model_namespace,
+    get_text_cache_key,
+)
+
 
 class BatchEmbedderResource(ConfigurableResource, BaseEmbedderClient):
     api_key: str | None = None
     base_url: str | None = None
+    embedding_model: str = "BAAI/bge-en-icl"
+    # Size of the embedding_model vectors, which fixes the dtype of embedding columns
+    embedding_dimensions: int = 4096
+    embedding_cache_enabled: bool = True
 
     _client: BaseEmbedderClient = PrivateAttr()
     _loop: asyncio.AbstractEventLoop = PrivateAttr()
+    _embedding_cache: EmbeddingCache | None = PrivateAttr(default=None)
 
     def setup_for_execution(self, context: InitResourceContext) -> None:
         self._client = (
-            DeepInfraEmbedderClient(api_key=self.api_key, logger=get_dagster_logger())
+            DeepInfraEmbedderClient(
+                api_key=self.api_key,
+                base_url=f"https://api.deepinfra.com/v1/inference/{self.embedding_model}",
+                logger=get_dagster_logger(),
+            )
             # LocalEmbedderClient()
             # if get_environment() == "LOCAL"
             # else RayClusterEmbedderClient(
@@ -34,12 +51,59 @@ class BatchEmbedderResource(ConfigurableResource, BaseEmbedderClient):
             self._loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self._loop)
 
+        if self.embedding_cache_enabled:
+            self._embedding_cache = EmbeddingCache(
+                LOCAL_CACHE_DIRECTORY
+                / "embeddings"
+                / get_model_namespace(self.embedding_model)
+            )
+
+    async def _get_cached_embeddings(
+        self, texts: List[str], **kwargs
+    ) -> Tuple[float, List[np.ndarray | None]]:
+        """
+        Only the distinct texts missing from the cache are sent to the client.
+        Texts that failed to embed are returned as None and not cached.
+        """
+        cache = self._embedding_cache
+        keys = [get_text_cache_key(text) for text in texts]
+        # Dedupe identical texts within the call
+        unique_texts: Dict[str, str] = dict(zip(keys, texts))
+
+        rows = cache.lookup(list(unique_texts))
+        missing_keys = [key for key in unique_texts if key not in rows]
+
+        cost = 0.0
+        if missing_keys:
+            cost, new_embeddings = await self._client.get_embeddings(
+                [unique_texts[key] for key in missing_keys], **kwargs
+            )
+            embedded = [
+                (key, embedding)
+                for key, embedding in zip(missing_keys, new_embeddings)
+                if embedding is not None
+            ]
+            if embedded:
+                cache.put(
+                    [key for key, _ in embedded],
+                    np.stack([embedding for _, embedding in embedded]),
+                )
+                rows = cache.lookup(list(unique_texts))
+
+        get_dagster_logger().info(
+            f"Embedding cache: {len(unique_texts) - len(missing_keys)}/{len(unique_texts)} distinct texts cached ({len(texts)} total)"
+        )
+
+        found_keys = [key for key in keys if key in rows]
+        vectors = iter(cache.read([rows[key] for key in found_keys]))
+        return cost, [next(vectors) if key in rows else None for key in keys]
+
     async def get_embeddings(
         self,
         texts: List[str],
         api_batch_size: int | None = None,
         gpu_batch_size: int | None = None,
-    ) -> Tuple[float, List[List[float]]]:
+    ) -> Tuple[float, List[np.ndarray | None]]:
         """
         Get embeddings for a list of texts.
 
@@ -49,7 +113,7 @@ class BatchEmbedderResource(ConfigurableResource, BaseEmbedderClient):
             gpu_batch_size: The batch size for the GPU. Adjust this based on the length of the input texts to avoid OOM errors.
 
         Returns:
-            The cost of the embeddings and the embeddings
+            The cost of the embeddings and the embeddings, as float32 vectors (None if failed)
         """
         try:
             kwargs = {}
@@ -59,6 +123,8 @@ class BatchEmbedderResource(ConfigurableResource, BaseEmbedderClient):
             if api_batch_size is not None:
                 kwargs["api_batch_size"] = api_batch_size
 
+            if self._embedding_cache:
+                return await self._get_cached_embeddings(texts, **kwargs)
             return await self._client.get_embeddings(texts, **kwargs)
         except Exception as e:
             await self._client.close()
@@ -69,3 +135,6 @@ class BatchEmbedderResource(ConfigurableResource, BaseEmbedderClient):
 
     async def teardown_after_execution(self, context: InitResourceContext) -> None:
         await self.close()
+
+        if self._embedding_cache:
+            self._embedding_cache.close()
@@ -1,8 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Callable, List, Sequence, Tuple, Union
+from typing import Callable, Iterator, List, Sequence, Tuple, Union
 
 from dagster import Config, ConfigurableResource
 
+from data_pipeline.resources.batch_inference.batch_llm_config import BatchLlmConfig
 from data_pipeline.resources.batch_inference.local_llm_config import LocalLlmConfig
 from data_pipeline.resources.batch_inference.remote_llm_config import RemoteLlmConfig
 
@@ -12,13 +13,14 @@ class LlmConfig(Config):
     is_multimodal: bool = False
     local_llm_config: LocalLlmConfig | None = None
     remote_llm_config: RemoteLlmConfig | None = None
+    batch_llm_config: BatchLlmConfig | None = None
 
 
 PromptSequence = Sequence[Union[str, Callable[[str], str]]]
 
 
 class BaseLlmResource(ConfigurableResource, ABC):
-    llm_config: RemoteLlmConfig | LocalLlmConfig
+    llm_config: RemoteLlmConfig | LocalLlmConfig | BatchLlmConfig
 
     @abstractmethod
     def setup_for_execution(self, context) -> None:
@@ -26,13 +28,28 @@ class BaseLlmResource(ConfigurableResource, ABC):
 
     @abstractmethod
     def get_prompt_sequences_completions_batch(
-        self, prompt_sequences: Sequence[PromptSequence]
+        self, prompt_sequences: Sequence[PromptSequence], use_cache: bool = True
     ) -> Tuple[List[List[str]], float]:
         """
         Returns a tuple of the results for each prompt sequence and the cost of the inference.
+        Pass use_cache=False to ignore previously cached completions.
         """
         pass
 
+    def iter_prompt_sequences_completions(
+        self, prompt_sequences: Sequence[PromptSequence], use_cache: bool = True
+    ) -> Iterator[Tuple[int, List[str], float]]:
+        """
+        Yields (index, completions, cost) for each prompt sequence as it completes.
+        Implementations that can't stream fall back to a single batch, reporting the
+        whole cost with the first result.
+        """
+        completions, cost = self.get_prompt_sequences_completions_batch(
+            prompt_sequences, use_cache=use_cache
+        )
+        for index, completion in enumerate(completions):
+            yield index, completion, cost if index == 0 else 0.0
+
     @abstractmethod
     def teardown_after_execution(self, context) -> None:
         pass
@@ -0,0 +1,359 @@
+import json
+import random
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+import httpx
+from dagster import InitResourceContext, get_dagster_logger
+from pydantic import PrivateAttr
+from upath import UPath
+
+from data_pipeline.constants.environments import (
+    BATCH_STORAGE_DIRECTORY,
+    LOCAL_CACHE_DIRECTORY,
+)
+from data_pipeline.resources.batch_inference.base_llm_resource import (
+    BaseLlmResource,
+    PromptSequence,
+)
+from data_pipeline.resources.batch_inference.batch_llm_config import BatchLlmConfig
+from data_pipeline.resources.batch_inference.completion_cache import (
+    CompletionCache,
+    get_payload_cache_key,
+)
+from data_pipeline.resources.batch_inference.rate_limiter import parse_retry_after
+
+_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# custom_id -> (answer, (input_tokens, output_tokens))
+RoundResults = Dict[str, Tuple[str, Tuple[int, int]]]
+
+
+class BatchApiLlmResource(BaseLlmResource):
+    """
+    Runs prompt sequences through an offline, OpenAI-compatible batch API:
+    requests are written to JSONL under BATCH_STORAGE_DIRECTORY, uploaded, submitted
+    and polled until the provider collates the results. A sequence with N prompts
+    takes N rounds, each round sending the next step of every still-alive sequence.
+    """
+
+    llm_config: BatchLlmConfig
+    is_multimodal: bool = False
+    completion_cache_enabled: bool = True
+    completion_cache_max_bytes: int = 2 * 1024**3
+
+    _client: httpx.Client = PrivateAttr()
+    _completion_cache: CompletionCache | None = PrivateAttr(default=None)
+
+    def setup_for_execution(self, context: InitResourceContext) -> None:
+        self._client = httpx.Client(
+            base_url=self.llm_config.base_url.rstrip("/"),
+            params=self.llm_config.query_params or {},
+            headers={
+                # We need both because of inconsistencies across providers
+                "Authorization": f"Bearer {self.llm_config.api_key}",
+                "api-key": self.llm_config.api_key,
+            },
+            timeout=self.llm_config.timeout,
+        )
+
+        if self.completion_cache_enabled:
+            self._completion_cache = CompletionCache(
+                LOCAL_CACHE_DIRECTORY / "llm_completions.sqlite",
+                max_size_bytes=self.completion_cache_max_bytes,
+            )
+
+    def _get_payload(self, conversation: List[Dict]) -> Dict:
+        # If a message has with_memory set to False, remove all previous messages from the payload
+        conversation_payload = [
+            {"role": msg["role"], "content": msg["content"]}
+            for i, msg in enumerate(conversation)
+            if msg.get("with_memory", True) or i == len(conversation) - 1
+        ]
+        return {"messages": conversation_payload, **self.llm_config.inference_config}
+
+    def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Calls the provider, retrying 429s, 5xxs and connection errors with
+        exponential backoff (full jitter, never shorter than Retry-After).
+        """
+        logger = get_dagster_logger()
+
+        for attempt in range(self.llm_config.max_attempts - 1):
+            retry_after = None
+            try:
+                response = self._client.request(method, url, **kwargs)
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    return response
+
+                error = f"status code {response.status_code}: {response.text}"
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            except httpx.TransportError as e:
+                error = repr(e)
+
+            delay = random.uniform(0, min(self.llm_config.max_backoff, 2**attempt))
+            if retry_after is not None:
+                delay = retry_after + delay * 0.1
+            logger.warning(
+                f"{method} {url} failed with {error}. Retrying in {delay:.1f}s..."
+            )
+            time.sleep(delay)
+
+        response = self._client.request(method, url, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def _submit_batch(self, lines: List[str], input_path: UPath) -> str:
+        content = "\n".join(lines) + "\n"
+        input_path.write_text(content)
+
+        upload = self._request(
+            "POST",
+            "/files",
+            data={"purpose": "batch"},
+            files={"file": (input_path.name, content.encode("utf-8"))},
+        )
+
+        batch = self._request(
+            "POST",
+            "/batches",
+            json={
+                "input_file_id": upload.json()["id"],
+                "endpoint": self.llm_config.batch_endpoint,
+                "completion_window": self.llm_config.completion_window,
+            },
+        )
+        return batch.json()["id"]
+
+    def _wait_for_batches(self, batch_ids: List[str]) -> List[Dict]:
+        logger = get_dagster_logger()
+        finished: Dict[str, Dict] = {}
+
+        while len(finished) < len(batch_ids):
+            for batch_id in batch_ids:
+                if batch_id in finished:
+                    continue
+
+                batch = self._request("GET", f"/batches/{batch_id}").json()
+
+                if batch["status"] in _TERMINAL_STATUSES:
+                    finished[batch_id] = batch
+                else:
+                    counts = batch.get("request_counts") or {}
+                    logger.info(
+                        f"Batch {batch_id} is {batch['status']}: {counts.get('completed', 0)}/{counts.get('total', '?')} requests completed"
+                    )
+
+            if len(finished) < len(batch_ids):
+                time.sleep(self.llm_config.poll_interval)
+
+        return [finished[batch_id] for batch_id in batch_ids]
+
+    def _download_file(self, file_id: str, path: UPath) -> str:
+        content = self._request("GET", f"/files/{file_id}/content").text
+        path.write_text(content)
+        return content
+
+    def _collect_batch_results(self, batch: Dict, output_path: UPath) -> RoundResults:
+        logger = get_dagster_logger()
+
+        if batch["status"] != "completed":
+            logger.error(
+                f"Batch {batch['id']} ended with status {batch['status']}: {batch.get('errors')}"
+            )
+
+        # Requests that failed are reported in a separate file, not in the output
+        error_file_id = batch.get("error_file_id")
+        if error_file_id:
+            errors = self._download_file(
+                error_file_id, output_path.with_suffix(".errors.jsonl")
+            )
+            failed = [json.loads(line) for line in errors.splitlines() if line.strip()]
+            for entry in failed:
+                logger.error(
+                    f"Batch request {entry.get('custom_id')} failed: {entry.get('error') or entry.get('response')}"
+                )
+            logger.error(f"Batch {batch['id']} has {len(failed)} failed requests")
+
+        # Expired or cancelled batches still expose their partial results
+        output_file_id = batch.get("output_file_id")
+        if not output_file_id:
+            return {}
+
+        output = self._download_file(output_file_id, output_path)
+
+        results: RoundResults = {}
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+
+            entry = json.loads(line)
+            result = entry.get("response") or {}
+            if entry.get("error") or result.get("status_code") != 200:
+                logger.error(
+                    f"Batch request {entry.get('custom_id')} failed: {entry.get('error') or result}"
+                )
+                continue
+
+            body = result["body"]
+            answer = body["choices"][0]["message"]["content"]
+            if answer:
+                results[entry["custom_id"]] = (
+                    answer,
+                    (
+                        body["usage"]["prompt_tokens"],
+                        body["usage"]["completion_tokens"],
+                    ),
+                )
+
+        return results
+
+    def _run_round(
+        self, payloads: Dict[str, Dict], round_dir: UPath, use_cache: bool
+    ) -> Tuple[RoundResults, float]:
+        results: RoundResults = {}
+        cost = 0.0
+
+        # Only submit what isn't cached already
+        cache_keys = {}
+        to_submit = {}
+        for custom_id, payload in payloads.items():
+            if self._completion_cache:
+                cache_keys[custom_id] = get_payload_cache_key(
+                    self.llm_config.base_url + self.llm_config.batch_endpoint, payload
+                )
+                cached = (
+                    self._completion_cache.get(cache_keys[custom_id])
+                    if use_cache
+                    else None
+                )
+                if cached:
+                    results[custom_id] = (
+                        cached.answer,
+                        (cached.input_tokens, cached.output_tokens),
+                    )
+                    continue
+            to_submit[custom_id] = payload
+
+        if not to_submit:
+            return results, cost
+
+        round_dir.mkdir(parents=True, exist_ok=True)
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": self.llm_config.batch_endpoint,
+                    "body": payload,
+                },
+                ensure_ascii=False,
+            )
+            for custom_id, payload in to_submit.items()
+        ]
+
+        max_lines = self.llm_config.max_requests_per_batch
+        batch_ids = [
+            self._submit_batch(
+                lines[i : i + max_lines], round_dir / f"part_{i // max_lines}.input.jsonl"
+            )
+            for i in range(0, len(lines), max_lines)
+        ]
+        get_dagster_logger().info(
+            f"Submitted {len(lines)} requests in {len(batch_ids)} batches: {batch_ids}"
+        )
+
+        for part, batch in enumerate(self._wait_for_batches(batch_ids)):
+            batch_results = self._collect_batch_results(
+                batch, round_dir / f"part_{part}.output.jsonl"
+            )
+
+            for custom_id, (answer, (input_tokens, output_tokens)) in batch_results.items():
+                cost += (input_tokens * self.llm_config.input_cpm / 1_000_000) + (
+                    output_tokens * self.llm_config.output_cpm / 1_000_000
+                )
+                if self._completion_cache:
+                    self._completion_cache.put(
+                        cache_keys[custom_id], answer, (input_tokens, output_tokens)
+                    )
+
+            results.update(batch_results)
+
+        return results, cost
+
+    def get_prompt_sequences_completions_batch(
+        self, prompt_sequences: List[PromptSequence], use_cache: bool = True
+    ) -> Tuple[List[List[str]], float]:
+        """
+        Blocks until every round has been collated by the provider, which can take up
+        to the completion window per round.
+        """
+        batch_dir = (
+            BATCH_STORAGE_DIRECTORY
+            / "llm_batches"
+            / f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        )
+        conversations: List[List[Dict]] = [[] for _ in prompt_sequences]
+        alive = set(range(len(prompt_sequences)))
+        total_cost = 0.0
+
+        n_rounds = max((len(sequence) for sequence in prompt_sequences), default=0)
+        for step in range(n_rounds):
+            payloads = {}
+            for i in sorted(alive):
+                if step >= len(prompt_sequences[i]):
+                    continue
+
+                prompt = prompt_sequences[i][step]
+                with_memory = True
+                if callable(prompt):
+                    content = prompt(conversations[i][-1]["content"])
+                    # We reset the "memory" when the prompt is a callable
+                    # since we carry over just the last response as parameter
+                    with_memory = False
+                else:
+                    content = prompt
+
+                conversations[i].append(
+                    {
+                        "role": "user",
+                        "content": [{"type": "text", "text": content}]
+                        if self.is_multimodal
+                        else content,
+                        "with_memory": with_memory,
+                    }
+                )
+                payloads[str(i)] = self._get_payload(conversations[i])
+
+            results, cost = self._run_round(
+                payloads, batch_dir / f"round_{step}", use_cache
+            )
+            total_cost += cost
+
+            for custom_id in payloads:
+                if custom_id in results:
+                    conversations[int(custom_id)].append(
+                        {"role": "assistant", "content": results[custom_id][0]}
+                    )
+                else:
+                    alive.discard(int(custom_id))
+
+            get_dagster_logger().info(
+                f"Round {step + 1}/{n_rounds}: {len(results)}/{len(payloads)} completions | Cost so far: ${total_cost:.4f}"
+            )
+
+        # Return all the assistant responses, only for completed conversations
+        return [
+            [message["content"] for message in conversation[1::2]]
+            if i in alive
+            else []
+            for i, conversation in enumerate(conversations)
+        ], total_cost
+
+    def teardown_after_execution(self, context: InitResourceContext) -> None:
+        self._client.close()
+
+        if self._completion_cache:
+            self._completion_cache.close()
@@ -0,0 +1,25 @@
+from dagster import Config
+
+
+class BatchLlmConfig(Config):
+    """Config for providers exposing the OpenAI-compatible batch API."""
+
+    api_key: str
+    # e.g. https://api.openai.com/v1, the /files and /batches routes are appended
+    base_url: str
+    inference_config: dict
+    # Batch prices, usually half of the synchronous ones
+    input_cpm: float
+    output_cpm: float
+    # The url each batch line targets, relative to the provider root
+    batch_endpoint: str = "/v1/chat/completions"
+    completion_window: str = "24h"
+    # Extra query params for every call, e.g. {"api-version": ...} on Azure
+    query_params: dict | None = None
+    poll_interval: int = 60
+    timeout: int = 60 * 5
+    max_requests_per_batch: int = 50_000
+    # Retries of each call to the provider on 429s, 5xxs and connection errors,
+    # so that a transient failure doesn't throw away hours of batch processing
+    max_attempts: int = 8
+    max_backoff: int = 5 * 60
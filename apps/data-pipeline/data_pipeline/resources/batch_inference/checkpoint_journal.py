@@ -0,0 +1,129 @@
+import hashlib
+import json
+import marshal
+import re
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from dagster import DagsterInvariantViolationError, OpExecutionContext
+from upath import UPath
+
+from data_pipeline.resources.batch_inference.base_llm_resource import PromptSequence
+
+
+def _get_callable_fingerprint(prompt: Callable) -> str:
+    """
+    Callables can't be hashed by value, so they contribute their module, qualified
+    name and compiled code, which tells apart lambdas with the same qualified name.
+    """
+    code = getattr(prompt, "__code__", None)
+    code_hash = hashlib.sha256(marshal.dumps(code)).hexdigest() if code else ""
+    return (
+        f"<callable:{getattr(prompt, '__module__', '')}:"
+        f"{getattr(prompt, '__qualname__', type(prompt).__qualname__)}:{code_hash}>"
+    )
+
+
+def get_current_asset_key() -> str:
+    """The asset (or op) being executed, empty outside of a Dagster execution."""
+    try:
+        context = OpExecutionContext.get()
+    except DagsterInvariantViolationError:
+        return ""
+
+    if context.has_assets_def and len(context.assets_def.keys) == 1:
+        return context.asset_key.to_user_string()
+    return context.op.name
+
+
+def get_batch_fingerprint(
+    prompt_sequences: Sequence[PromptSequence], model_identity: str, asset_key: str
+) -> str:
+    """
+    Stable hash of a batch of prompt sequences sent by an asset, so that assets
+    sending the same prompts in the same partition don't share a journal.
+    """
+    hasher = hashlib.sha256(model_identity.encode("utf-8"))
+    hasher.update(asset_key.encode("utf-8"))
+    hasher.update(b"\x1d")
+    for prompt_sequence in prompt_sequences:
+        for prompt in prompt_sequence:
+            if callable(prompt):
+                prompt = _get_callable_fingerprint(prompt)
+            hasher.update(prompt.encode("utf-8"))
+            hasher.update(b"\x1f")
+        hasher.update(b"\x1e")
+    return hasher.hexdigest()
+
+
+def sanitize_journal_namespace(namespace: str) -> str:
+    # Multi-partition keys look like "+123|+456"
+    return re.sub(r"[^\w.-]", "_", namespace)
+
+
+class CheckpointJournal:
+    """
+    Append-only journal of finished prompt sequences for a single batch.
+
+    Since blob storage doesn't support appends, each flush writes a new immutable
+    JSONL segment to the journal directory. Loading replays every segment, so a
+    crash can at most lose the results buffered since the last flush.
+    """
+
+    def __init__(
+        self,
+        directory: UPath,
+        flush_every: int = 200,
+        flush_interval: float = 60,
+    ):
+        self.directory = directory
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+        self._buffer: List[str] = []
+        self._last_flush_at = time.monotonic()
+
+    def load(self) -> Dict[int, Tuple[List[str], float]]:
+        if not self.directory.exists():
+            return {}
+
+        results = {}
+        for segment in sorted(self.directory.glob("*.jsonl")):
+            for line in segment.read_text().splitlines():
+                # A segment interrupted mid-write may have a truncated last line
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                results[entry["index"]] = (entry["completions"], entry["cost"])
+
+        return results
+
+    def append(self, index: int, completions: List[str], cost: float) -> None:
+        self._buffer.append(
+            json.dumps(
+                {"index": index, "completions": completions, "cost": cost},
+                ensure_ascii=False,
+            )
+        )
+
+        if (
+            len(self._buffer) >= self.flush_every
+            or time.monotonic() - self._last_flush_at >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush_at = time.monotonic()
+        if not self._buffer:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segment = self.directory / f"{time.time_ns()}.jsonl"
+        segment.write_text("\n".join(self._buffer) + "\n")
+        self._buffer = []
+
+    def clear(self) -> None:
+        self._buffer = []
+        if self.directory.exists():
+            self.directory.fs.rm(self.directory.path, recursive=True)
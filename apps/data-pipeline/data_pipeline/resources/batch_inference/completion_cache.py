@@ -0,0 +1,145 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class CachedCompletion:
+    answer: str
+    input_tokens: int
+    output_tokens: int
+
+
+def get_payload_cache_key(inference_url: str, payload: Dict[str, Any]) -> str:
+    """
+    Content-addressed key for a chat completion request.
+    The payload already carries the messages, the inference config (incl. the model
+    name) and the provider routing. The url is included because some endpoints
+    (e.g. Azure) encode the model in the url rather than in the payload.
+    """
+    serialized = json.dumps(
+        {"inference_url": inference_url, "payload": payload},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    On-disk LRU cache of chat completions, backed by sqlite.
+
+    Entries are evicted by least recent access once the total size of the stored
+    answers exceeds `max_size_bytes`. Safe to share across threads.
+    """
+
+    def __init__(self, db_path: Path, max_size_bytes: int):
+        self.db_path = db_path
+        self.max_size_bytes = max_size_bytes
+        self.stats = CacheStats()
+
+        self._lock = threading.Lock()
+
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_last_accessed "
+            "ON completions (last_accessed)"
+        )
+        self._conn.commit()
+
+        self._total_size: int = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM completions"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> CachedCompletion | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, input_tokens, output_tokens FROM completions WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+            if row is None:
+                self.stats.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE completions SET last_accessed = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._conn.commit()
+            self.stats.hits += 1
+
+            return CachedCompletion(
+                answer=row[0], input_tokens=row[1], output_tokens=row[2]
+            )
+
+    def put(self, key: str, answer: str, tokens: Tuple[int, int]) -> None:
+        size = len(answer.encode("utf-8"))
+
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?)",
+                (key, answer, tokens[0], tokens[1], size, time.time()),
+            )
+            self._total_size += size - (previous[0] if previous else 0)
+
+            if self._total_size > self.max_size_bytes:
+                self._evict()
+
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        # Evict down to 90% of the budget so we don't evict on every put
+        target_size = int(self.max_size_bytes * 0.9)
+        cursor = self._conn.execute(
+            "SELECT key, size FROM completions ORDER BY last_accessed ASC"
+        )
+
+        evicted_keys = []
+        for key, size in cursor:
+            if self._total_size <= target_size:
+                break
+            evicted_keys.append((key,))
+            self._total_size -= size
+
+        self._conn.executemany("DELETE FROM completions WHERE key = ?", evicted_keys)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,242 @@
+import asyncio
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List
+from urllib.parse import urlparse
+
+from dagster import InitResourceContext, get_dagster_logger
+from pydantic import PrivateAttr
+
+from data_pipeline.resources.batch_inference.remote_llm_config import RemoteLlmConfig
+from data_pipeline.resources.batch_inference.remote_llm_resource import (
+    RemoteLlmResource,
+)
+
+CompletionResult = tuple[str | None, float, tuple[int, int, int]]
+
+
+@dataclass
+class BackendState:
+    name: str
+    get_completion: Callable[..., Awaitable[CompletionResult]]
+    # Latencies are measured from the moment the request is on the wire,
+    # so that time spent queueing in the rate limiter doesn't trigger hedging
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=500))
+    consecutive_failures: int = 0
+    unhealthy_until: float = 0.0
+
+    def get_latency_percentile(self, percentile: float, min_samples: int) -> float | None:
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(percentile * len(ordered)))]
+
+
+@dataclass
+class BackendAttempt:
+    backend: BackendState
+    sent: asyncio.Event = field(default_factory=asyncio.Event)
+    sent_at: float = 0.0
+
+    def mark_sent(self) -> None:
+        # Called again on every retry
+        self.sent_at = time.monotonic()
+        self.sent.set()
+
+
+def get_backend_name(llm_config: RemoteLlmConfig) -> str:
+    model = llm_config.inference_config.get("model", "")
+    return f"{urlparse(llm_config.inference_url).hostname}:{model}"
+
+
+class HedgedLlmResource(RemoteLlmResource):
+    """
+    RemoteLlmResource that can answer each request from interchangeable backends.
+
+    - Hedging: when the primary backend takes longer than its own `hedge_percentile`
+      latency, a duplicate request is sent to the next backend and the first answer wins.
+    - Failover: a backend failing `failover_threshold` requests in a row (i.e. after
+      its own retries) is skipped for `failover_cooldown` seconds, and a failed request
+      is retried on the next backend straight away.
+
+    The backend serving each answer is counted and reported by the status printer.
+    """
+
+    fallback_llm_configs: List[RemoteLlmConfig]
+    hedge_percentile: float = 0.95
+    # Don't hedge before we know what a normal latency looks like
+    hedge_min_samples: int = 20
+    failover_threshold: int = 3
+    failover_cooldown: float = 120
+
+    _fallbacks: List[RemoteLlmResource] = PrivateAttr(default_factory=list)
+    _backends: List[BackendState] = PrivateAttr(default_factory=list)
+    _wins: Counter = PrivateAttr(default_factory=Counter)
+    _hedged_count: int = PrivateAttr(default=0)
+
+    def setup_for_execution(self, context: InitResourceContext) -> None:
+        super().setup_for_execution(context)
+
+        self._fallbacks = [
+            RemoteLlmResource(
+                llm_config=llm_config,
+                is_multimodal=self.is_multimodal,
+                completion_cache_enabled=self.completion_cache_enabled,
+                completion_cache_max_bytes=self.completion_cache_max_bytes,
+            )
+            for llm_config in self.fallback_llm_configs
+        ]
+        for fallback in self._fallbacks:
+            # The fallbacks run on our event loop
+            fallback._setup_backend()
+
+        self._backends = [
+            BackendState(
+                name=get_backend_name(self.llm_config),
+                get_completion=lambda *args, **kwargs: RemoteLlmResource._get_completion(
+                    self, *args, **kwargs
+                ),
+            ),
+            *(
+                BackendState(
+                    name=get_backend_name(fallback.llm_config),
+                    get_completion=fallback._get_completion,
+                )
+                for fallback in self._fallbacks
+            ),
+        ]
+
+    def _ensure_client(self) -> None:
+        super()._ensure_client()
+        for fallback in self._fallbacks:
+            fallback._ensure_client()
+
+    def _get_status_message(self) -> str:
+        wins = ", ".join(f"{name}: {count}" for name, count in self._wins.items())
+        return (
+            super()._get_status_message()
+            + f" | Hedged: {self._hedged_count} | Answered by: {wins or '-'}"
+        )
+
+    def _get_available_backends(self) -> List[BackendState]:
+        now = time.monotonic()
+        healthy = [b for b in self._backends if b.unhealthy_until <= now]
+        # If everything is failing, keep trying in the configured order
+        return healthy or list(self._backends)
+
+    async def _call_backend(
+        self,
+        attempt: BackendAttempt,
+        conversation: List[Dict[str, str]],
+        conversation_id: int,
+        use_cache: bool,
+    ) -> CompletionResult:
+        backend = attempt.backend
+        result = await backend.get_completion(
+            conversation, conversation_id, use_cache, on_request_sent=attempt.mark_sent
+        )
+
+        if result[0] is None:
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self.failover_threshold:
+                backend.unhealthy_until = time.monotonic() + self.failover_cooldown
+                get_dagster_logger().warning(
+                    f"Backend {backend.name} failed {backend.consecutive_failures} requests in a row, failing over for {self.failover_cooldown}s"
+                )
+        else:
+            backend.consecutive_failures = 0
+            # Cache hits are never sent
+            if attempt.sent.is_set():
+                backend.latencies.append(time.monotonic() - attempt.sent_at)
+
+        return result
+
+    async def _get_hedge_timeout(
+        self, task: asyncio.Task, attempt: BackendAttempt
+    ) -> float | None:
+        """
+        Seconds left before the running attempt should be hedged, waiting first for it
+        to be sent. None means it shouldn't be hedged (yet).
+        """
+        threshold = attempt.backend.get_latency_percentile(
+            self.hedge_percentile, self.hedge_min_samples
+        )
+        if threshold is None:
+            return None
+
+        if not attempt.sent.is_set():
+            sent_waiter = asyncio.create_task(attempt.sent.wait())
+            await asyncio.wait(
+                {task, sent_waiter}, return_when=asyncio.FIRST_COMPLETED
+            )
+            sent_waiter.cancel()
+            if task.done():
+                return 0
+
+        return max(0.0, threshold - (time.monotonic() - attempt.sent_at))
+
+    async def _get_completion(
+        self,
+        conversation: List[Dict[str, str]],
+        conversation_id: int,
+        use_cache: bool = True,
+        on_request_sent: Callable[[], None] | None = None,
+    ) -> CompletionResult:
+        backends = self._get_available_backends()
+        attempts: Dict[asyncio.Task, BackendAttempt] = {}
+        total_cost = 0.0
+
+        def start_next() -> None:
+            attempt = BackendAttempt(backend=backends[len(started)])
+            started.append(attempt)
+            task = asyncio.create_task(
+                self._call_backend(attempt, conversation, conversation_id, use_cache)
+            )
+            attempts[task] = attempt
+
+        started: List[BackendAttempt] = []
+        start_next()
+
+        try:
+            while attempts:
+                timeout = None
+                if len(started) < len(backends) and len(attempts) == 1:
+                    ((task, attempt),) = attempts.items()
+                    timeout = await self._get_hedge_timeout(task, attempt)
+
+                done, _ = await asyncio.wait(
+                    attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    # Straggler: hedge on the next backend
+                    self._hedged_count += 1
+                    start_next()
+                    continue
+
+                for task in done:
+                    attempt = attempts.pop(task)
+                    answer, cost, tokens = task.result()
+                    total_cost += cost
+                    if answer is not None:
+                        self._wins[attempt.backend.name] += 1
+                        return answer, total_cost, tokens
+
+                # All finished requests failed: fail over to the next backend
+                if not attempts and len(started) < len(backends):
+                    start_next()
+
+            return None, total_cost, (0, 0, 0)
+        finally:
+            # The losing requests are abandoned
+            for task in attempts:
+                task.cancel()
+
+    async def teardown_after_execution(self, context: InitResourceContext) -> None:
+        for fallback in self._fallbacks:
+            await fallback._client.aclose()
+            if fallback._completion_cache:
+                fallback._completion_cache.close()
+
+        await super().teardown_after_execution(context)
@@ -1,9 +1,17 @@
+from typing import List
+
 from dagster import get_dagster_logger
 
 from data_pipeline.resources.batch_inference.base_llm_resource import (
     BaseLlmResource,
     LlmConfig,
 )
+from data_pipeline.resources.batch_inference.batch_api_llm_resource import (
+    BatchApiLlmResource,
+)
+from data_pipeline.resources.batch_inference.hedged_llm_resource import (
+    HedgedLlmResource,
+)
 from data_pipeline.resources.batch_inference.remote_llm_resource import (
     RemoteLlmResource,
 )
@@ -20,3 +28,41 @@ def create_llm_resource(config: LlmConfig) -> BaseLlmResource:
         return RemoteLlmResource(
             llm_config=config.remote_llm_config, is_multimodal=config.is_multimodal
         )
+
+
+def create_batch_llm_resource(config: LlmConfig) -> BaseLlmResource:
+    logger = get_dagster_logger()
+
+    if config.batch_llm_config is None:
+        logger.warning(
+            f"Batch LLM config not found for model: {config.colloquial_model_name}"
+        )
+    else:
+        return BatchApiLlmResource(
+            llm_config=config.batch_llm_config, is_multimodal=config.is_multimodal
+        )
+
+
+def create_hedged_llm_resource(
+    config: LlmConfig, fallback_configs: List[LlmConfig]
+) -> BaseLlmResource:
+    """
+    Primary model with interchangeable fallbacks, tried in the given order for
+    hedged and failed-over requests.
+    """
+    logger = get_dagster_logger()
+
+    if config.remote_llm_config is None:
+        logger.warning(
+            f"Remote LLM config not found for model: {config.colloquial_model_name}"
+        )
+    else:
+        return HedgedLlmResource(
+            llm_config=config.remote_llm_config,
+            is_multimodal=config.is_multimodal,
+            fallback_llm_configs=[
+                fallback.remote_llm_config
+                for fallback in fallback_configs
+                if fallback.remote_llm_config is not None
+            ],
+        )
@@ -18,6 +18,9 @@ openrouter_config = RemoteLlmConfig(
     timeout=300,
     input_cpm=3,
     output_cpm=15,
+    # Cache reads are billed at 10% of the input price
+    cached_input_cpm=0.3,
+    prompt_cache_control=True,
 )
 
 claude_config = LlmConfig(
@@ -69,7 +69,7 @@ _azure_config = RemoteLlmConfig(
     },
     input_cpm=0.55,
     output_cpm=2.19,
-    context_length=16_000,
+    context_length=64_000,
 )
 
 r1_config = LlmConfig(
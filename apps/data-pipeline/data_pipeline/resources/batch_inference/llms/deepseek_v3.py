@@ -19,7 +19,7 @@ _deepseek_config = RemoteLlmConfig(
     },
     input_cpm=0.27,
     output_cpm=1.1,
-    context_length=16_000,
+    context_length=64_000,
 )
 
 
@@ -34,7 +34,7 @@ _deepinfra_config = RemoteLlmConfig(
     },
     input_cpm=0.85,
     output_cpm=0.9,
-    context_length=16_000,
+    context_length=64_000,
 )
 
 _openrouter_config = RemoteLlmConfig(
@@ -44,7 +44,7 @@ _openrouter_config = RemoteLlmConfig(
         "model": "deepseek/deepseek-chat",
         "max_tokens": 8192,
     },
-    context_length=16_000,
+    context_length=64_000,
     concurrency_limit=50,
     timeout=300,
     # In reality these vary by provider but 1$ is a good ballpark
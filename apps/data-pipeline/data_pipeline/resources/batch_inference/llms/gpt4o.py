@@ -1,13 +1,14 @@
 from dagster import EnvVar
 
 from data_pipeline.resources.batch_inference.base_llm_resource import BaseLlmResource
+from data_pipeline.resources.batch_inference.batch_llm_config import BatchLlmConfig
 from data_pipeline.resources.batch_inference.llm_factory import (
     LlmConfig,
+    create_batch_llm_resource,
     create_llm_resource,
 )
 from data_pipeline.resources.batch_inference.remote_llm_config import RemoteLlmConfig
 
-# TODO: Implement batch https://platform.openai.com/docs/api-reference/batch
 gpt4o_config = LlmConfig(
     colloquial_model_name="gpt-4o",
     is_multimodal=True,
@@ -28,8 +29,29 @@ gpt4o_config = LlmConfig(
         output_cpm=10,
         context_length=128_000,
     ),
+    # Requires a "Global Batch" deployment on the Azure resource
+    batch_llm_config=BatchLlmConfig(
+        api_key=EnvVar("AZURE_OPENAI_API_KEY"),
+        base_url="https://enclaveidai2163546968.openai.azure.com/openai",
+        batch_endpoint="/chat/completions",
+        query_params={"api-version": "2024-10-21"},
+        inference_config={
+            "temperature": 1,
+            "max_tokens": 1024,
+            "top_p": 1,
+            "model": "gpt-4o-batch",
+            "frequency_penalty": 0,
+            "presence_penalty": 0,
+        },
+        input_cpm=1.25,
+        output_cpm=5,
+    ),
 )
 
 
 def create_gpt4o_resource() -> BaseLlmResource:
     return create_llm_resource(gpt4o_config)
+
+
+def create_gpt4o_batch_resource() -> BaseLlmResource:
+    return create_batch_llm_resource(gpt4o_config)
@@ -3,8 +3,12 @@ from dagster import EnvVar
 from data_pipeline.resources.batch_inference.base_llm_resource import BaseLlmResource
 from data_pipeline.resources.batch_inference.llm_factory import (
     LlmConfig,
+    create_hedged_llm_resource,
     create_llm_resource,
 )
+from data_pipeline.resources.batch_inference.llms.llama70b_turbo import (
+    llama70b_turbo_config,
+)
 from data_pipeline.resources.batch_inference.remote_llm_config import RemoteLlmConfig
 
 _azure_config = RemoteLlmConfig(
@@ -48,3 +52,7 @@ llama70b_config = LlmConfig(
 
 def create_llama70b_resource() -> BaseLlmResource:
     return create_llm_resource(llama70b_config)
+
+
+def create_llama70b_hedged_resource() -> BaseLlmResource:
+    return create_hedged_llm_resource(llama70b_config, [llama70b_turbo_config])
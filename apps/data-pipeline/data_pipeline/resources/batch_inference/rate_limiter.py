@@ -0,0 +1,181 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Deque
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `rate_per_minute`.
+    Waiters are served in FIFO order. The level can go negative through `consume`,
+    e.g. when the actual usage of a request exceeds its estimate.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate_per_second = rate_per_minute / 60
+        self.capacity = capacity or rate_per_minute
+
+        self._level = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(
+            self.capacity,
+            self._level + (now - self._updated_at) * self.rate_per_second,
+        )
+        self._updated_at = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        # A single request bigger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._level >= amount:
+                    self._level -= amount
+                    return
+                await asyncio.sleep((amount - self._level) / self.rate_per_second)
+
+    def consume(self, amount: float) -> None:
+        """Debits (or credits, if negative) the bucket without waiting."""
+        self._refill()
+        self._level = min(self.capacity, self._level - amount)
+
+
+class AimdConcurrencyLimiter:
+    """
+    Additive-increase / multiplicative-decrease limit on the number of in-flight
+    requests. Every successful request grows the limit by `1 / limit` (i.e. ~+1
+    per window of `limit` requests) and a throttled one shrinks it by
+    `decrease_factor`, at most once per `decrease_cooldown` seconds so that a burst
+    of 429s from the same window only counts once.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: int | None = None,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 5.0,
+    ):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial_limit or max_limit)
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+
+        self.in_flight = 0
+        self.throttled_count = 0
+
+        self._last_decrease_at = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted right before the cancellation: give it back
+                self.in_flight -= 1
+                self._wake_waiters()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, throttled: bool | None = False) -> None:
+        """
+        Frees a slot. `throttled=None` means the outcome is unknown (e.g. the request
+        was cancelled) and leaves the limit untouched.
+        """
+        self.in_flight -= 1
+
+        if throttled:
+            self.throttled_count += 1
+            now = time.monotonic()
+            if now - self._last_decrease_at >= self.decrease_cooldown:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease_at = now
+        elif throttled is not None:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+
+class AdaptiveRateLimiter:
+    """
+    Per-provider limiter combining AIMD concurrency with optional requests-per-minute
+    and tokens-per-minute token buckets. Each request holds a slot only while it is
+    on the wire: retries back off individually without stalling unrelated requests.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.concurrency = AimdConcurrencyLimiter(max_limit=max_concurrency)
+        self.requests_bucket = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        if self.requests_bucket:
+            await self.requests_bucket.acquire(1)
+        if self.tokens_bucket:
+            await self.tokens_bucket.acquire(estimated_tokens)
+        await self.concurrency.acquire()
+
+    def release(
+        self,
+        throttled: bool | None,
+        estimated_tokens: int,
+        actual_tokens: int | None = None,
+    ) -> None:
+        self.concurrency.release(throttled)
+
+        if self.tokens_bucket and actual_tokens is not None:
+            self.tokens_bucket.consume(actual_tokens - estimated_tokens)
+
+    def get_retry_delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """Exponential backoff with full jitter, never shorter than Retry-After."""
+        backoff = random.uniform(
+            0, min(self.max_backoff, self.base_backoff * 2**attempt)
+        )
+        if retry_after is not None:
+            return retry_after + backoff * 0.1
+        return backoff
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        # HTTP-date formatted values are rare for LLM APIs, fall back to backoff
+        return None
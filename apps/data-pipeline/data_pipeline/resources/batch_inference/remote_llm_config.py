@@ -1,3 +1,5 @@
+from typing import Literal
+
 from dagster import Config
 
 
@@ -9,5 +11,20 @@ class RemoteLlmConfig(Config):
     inference_config: dict
     input_cpm: float
     output_cpm: float
+    # Price of input tokens read from the provider prompt cache, if discounted
+    cached_input_cpm: float | None = None
     context_length: int
     provider: dict | None = None
+    # Provider quotas, leave unset when unknown: the concurrency
+    # limit then adapts to throttling responses on its own
+    requests_per_minute: int | None = None
+    tokens_per_minute: int | None = None
+    max_attempts: int = 6
+    # What to do with payloads that don't fit context_length (incl. max_tokens):
+    # "truncate" drops the middle of the longest message, so opt in per model.
+    # Without tiktoken the counts are estimates, and only payloads beyond
+    # ESTIMATE_MARGIN are rejected or truncated
+    context_overflow: Literal["truncate", "reject"] = "reject"
+    # Add explicit cache_control breakpoints, for providers without automatic
+    # prompt caching (e.g. Anthropic models)
+    prompt_cache_control: bool = False
@@ -1,18 +1,77 @@
 import asyncio
+import json
+import queue
 import time
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
 from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Tuple
 
 import httpx
 from dagster import InitResourceContext, get_dagster_logger
 from pydantic import PrivateAttr
 
+from data_pipeline.constants.environments import (
+    BATCH_STORAGE_DIRECTORY,
+    LOCAL_CACHE_DIRECTORY,
+)
 from data_pipeline.resources.batch_inference.base_llm_resource import (
     BaseLlmResource,
     PromptSequence,
 )
+from data_pipeline.resources.batch_inference.checkpoint_journal import (
+    CheckpointJournal,
+    get_batch_fingerprint,
+    get_current_asset_key,
+    sanitize_journal_namespace,
+)
+from data_pipeline.resources.batch_inference.completion_cache import (
+    CompletionCache,
+    get_payload_cache_key,
+)
+from data_pipeline.resources.batch_inference.rate_limiter import (
+    AdaptiveRateLimiter,
+    parse_retry_after,
+)
 from data_pipeline.resources.batch_inference.remote_llm_config import RemoteLlmConfig
+from data_pipeline.resources.batch_inference.token_counter import (
+    ESTIMATE_MARGIN,
+    count_messages_tokens,
+    fit_messages_to_budget,
+    is_token_count_exact,
+)
+
+
+def get_cached_input_tokens(usage: Dict[str, Any]) -> int:
+    """Prompt cache hits, as reported by the different providers."""
+    details = usage.get("prompt_tokens_details") or {}
+    return (
+        details.get("cached_tokens")
+        # DeepSeek
+        or usage.get("prompt_cache_hit_tokens")
+        # Anthropic-style usage
+        or usage.get("cache_read_input_tokens")
+        or 0
+    )
+
+
+def add_cache_breakpoint(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Marks the conversation so far (everything but the new prompt) as cacheable, for
+    providers that need explicit cache_control breakpoints (e.g. Anthropic).
+    """
+    idx = len(messages) - 2 if len(messages) > 1 else 0
+    message = dict(messages[idx])
+    content = message["content"]
+    parts = (
+        [dict(part) for part in content]
+        if isinstance(content, list)
+        else [{"type": "text", "text": content}]
+    )
+    parts[-1]["cache_control"] = {"type": "ephemeral"}
+    message["content"] = parts
+    return [*messages[:idx], message, *messages[idx + 1 :]]
 
 
 @dataclass
@@ -21,17 +80,27 @@ class SequenceMetrics:
     duration: float | None = None
     input_tokens: int = 0
     output_tokens: int = 0
+    # Input tokens served from the provider prompt cache
+    cached_input_tokens: int = 0
 
 
 class RemoteLlmResource(BaseLlmResource):
     llm_config: RemoteLlmConfig
     is_multimodal: bool = False
+    completion_cache_enabled: bool = True
+    completion_cache_max_bytes: int = 2 * 1024**3
+    # Defaults to 4x the concurrency limit
+    max_in_flight_sequences: int | None = None
+    checkpoint_journal_enabled: bool = True
+    prefix_aware_ordering: bool = True
 
     _client: httpx.AsyncClient = PrivateAttr()
-    _retry_event: asyncio.Event = PrivateAttr(default_factory=asyncio.Event)
+    _rate_limiter: AdaptiveRateLimiter = PrivateAttr()
     _remaining_reqs: int = PrivateAttr()
     _loop: asyncio.AbstractEventLoop = PrivateAttr()
     _sequence_metrics: Dict[int, SequenceMetrics] = PrivateAttr(default_factory=dict)
+    _completion_cache: CompletionCache | None = PrivateAttr(default=None)
+    _journal_namespace: str | None = PrivateAttr(default=None)
 
     def _create_client(self) -> httpx.AsyncClient:
         return httpx.AsyncClient(
@@ -43,35 +112,96 @@ class RemoteLlmResource(BaseLlmResource):
         )
 
     def setup_for_execution(self, context: InitResourceContext) -> None:
-        self._client = self._create_client()
-        self._retry_event.set()  # Initially allow all operations
         self._loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self._loop)
+        self._setup_backend()
+
+        # Journals are keyed by partition so that they survive run re-executions,
+        # falling back to the run id for unpartitioned assets
+        run = context.dagster_run
+        if self.checkpoint_journal_enabled and run:
+            self._journal_namespace = sanitize_journal_namespace(
+                run.tags.get("dagster/partition") or run.run_id
+            )
 
-    async def _periodic_status_printer(self) -> None:
-        logger = get_dagster_logger()
-        while True:
-            # Only consider completed sequences (those with duration set)
-            completed_metrics = [
-                m for m in self._sequence_metrics.values() if m.duration is not None
-            ]
+    def _setup_backend(self) -> None:
+        """Sets up what's needed to send requests, without an event loop of its own."""
+        self._client = self._create_client()
+        self._rate_limiter = AdaptiveRateLimiter(
+            max_concurrency=self.llm_config.concurrency_limit,
+            requests_per_minute=self.llm_config.requests_per_minute,
+            tokens_per_minute=self.llm_config.tokens_per_minute,
+        )
 
-            log_mgs = f"{self._remaining_reqs} requests remaining"
+        if self.completion_cache_enabled:
+            self._completion_cache = CompletionCache(
+                LOCAL_CACHE_DIRECTORY / "llm_completions.sqlite",
+                max_size_bytes=self.completion_cache_max_bytes,
+            )
 
-            if completed_metrics:
-                avg_duration = sum(m.duration for m in completed_metrics) / len(  # type: ignore
-                    completed_metrics
-                )
-                avg_input_tokens = sum(m.input_tokens for m in completed_metrics) / len(
-                    completed_metrics
+    def _open_checkpoint_journal(
+        self, prompt_sequences: List[PromptSequence]
+    ) -> CheckpointJournal | None:
+        if not self._journal_namespace:
+            return None
+
+        model_identity = json.dumps(
+            [
+                self.llm_config.inference_url,
+                self.llm_config.inference_config,
+                self.llm_config.provider,
+            ],
+            sort_keys=True,
+        )
+        return CheckpointJournal(
+            BATCH_STORAGE_DIRECTORY
+            / "journals"
+            / self._journal_namespace
+            / get_batch_fingerprint(
+                prompt_sequences, model_identity, get_current_asset_key()
+            )
+        )
+
+    def _get_status_message(self) -> str:
+        # Only consider completed sequences (those with duration set)
+        completed_metrics = [
+            m for m in self._sequence_metrics.values() if m.duration is not None
+        ]
+
+        concurrency = self._rate_limiter.concurrency
+        log_mgs = f"{self._remaining_reqs} requests remaining | Concurrency: {concurrency.in_flight}/{int(concurrency.limit)} | Throttled: {concurrency.throttled_count}"
+
+        if completed_metrics:
+            avg_duration = sum(m.duration for m in completed_metrics) / len(  # type: ignore
+                completed_metrics
+            )
+            avg_input_tokens = sum(m.input_tokens for m in completed_metrics) / len(
+                completed_metrics
+            )
+            avg_output_tokens = sum(
+                m.output_tokens for m in completed_metrics
+            ) / len(completed_metrics)
+
+            log_mgs += f" | Avg seq duration: {avg_duration:.2f}s | Avg seq in tokens: {avg_input_tokens:.1f} | Avg seq out tokens: {avg_output_tokens:.1f}"
+
+            total_input_tokens = sum(m.input_tokens for m in completed_metrics)
+            if total_input_tokens:
+                cached_ratio = (
+                    sum(m.cached_input_tokens for m in completed_metrics)
+                    / total_input_tokens
                 )
-                avg_output_tokens = sum(
-                    m.output_tokens for m in completed_metrics
-                ) / len(completed_metrics)
+                log_mgs += f" | Prompt cache hit: {cached_ratio:.1%}"
 
-                log_mgs += f" | Avg seq duration: {avg_duration:.2f}s | Avg seq in tokens: {avg_input_tokens:.1f} | Avg seq out tokens: {avg_output_tokens:.1f}"
+        if self._completion_cache:
+            cache_stats = self._completion_cache.stats
+            log_mgs += f" | Cache hits: {cache_stats.hits} | Cache misses: {cache_stats.misses}"
 
-            logger.info(log_mgs)
+        return log_mgs
+
+    async def _periodic_status_printer(self) -> None:
+        logger = get_dagster_logger()
+        while True:
+            logger.info(self._get_status_message())
 
             await asyncio.sleep(60)
 
@@ -79,7 +209,9 @@ class RemoteLlmResource(BaseLlmResource):
         self,
         conversation: List[Dict[str, str]],
         conversation_id: int,
-    ) -> tuple[str | None, float, tuple[int, int]]:
+        use_cache: bool = True,
+        on_request_sent: Callable[[], None] | None = None,
+    ) -> tuple[str | None, float, tuple[int, int, int]]:
         # If a message has with_memory set to False, remove all previous messages from the payload
         conversation_payload = [
             {"role": msg["role"], "content": msg["content"]}
@@ -87,7 +219,42 @@ class RemoteLlmResource(BaseLlmResource):
             if msg.get("with_memory", True) or i == len(conversation) - 1
         ]
 
-        # TODO: Ensure payload fits the context window
+        logger = get_dagster_logger()
+
+        # Make sure the payload fits the context window instead of paying
+        # for a round-trip that is guaranteed to 400
+        max_output_tokens = self.llm_config.inference_config.get("max_tokens", 0)
+        max_prompt_tokens = self.llm_config.context_length - max_output_tokens
+        prompt_tokens = count_messages_tokens(conversation_payload)
+        # Don't reject on a heuristic count: borderline payloads go through
+        # and the provider has the final say
+        overflow_limit = (
+            max_prompt_tokens
+            if is_token_count_exact()
+            else int(max_prompt_tokens * (1 + ESTIMATE_MARGIN))
+        )
+
+        if prompt_tokens > overflow_limit:
+            fitted_payload = (
+                fit_messages_to_budget(conversation_payload, max_prompt_tokens)
+                if self.llm_config.context_overflow == "truncate"
+                else None
+            )
+            if fitted_payload is None:
+                logger.error(
+                    f"LLM completion #{conversation_id} rejected: {prompt_tokens} prompt tokens exceed the {max_prompt_tokens} available."
+                )
+                return None, 0, (0, 0, 0)
+
+            logger.warning(
+                f"LLM completion #{conversation_id} truncated: {prompt_tokens} prompt tokens exceed the {max_prompt_tokens} available."
+            )
+            conversation_payload = fitted_payload
+            prompt_tokens = count_messages_tokens(conversation_payload)
+
+        if self.llm_config.prompt_cache_control:
+            conversation_payload = add_cache_breakpoint(conversation_payload)
+
         payload = {
             "messages": conversation_payload,
             **self.llm_config.inference_config,
@@ -96,14 +263,34 @@ class RemoteLlmResource(BaseLlmResource):
         if self.llm_config.provider:
             payload["provider"] = self.llm_config.provider
 
-        # Requests are attempted in seuqnence, meaning that the latter
-        # will likely be blocked more often
-        max_attempts = conversation_id + 3
-        logger = get_dagster_logger()
+        cache_key = None
+        if self._completion_cache:
+            cache_key = get_payload_cache_key(self.llm_config.inference_url, payload)
+
+            # When bypassing we still write the fresh answer back below
+            if use_cache:
+                cached = self._completion_cache.get(cache_key)
+                if cached:
+                    # Nothing was paid for a cached answer
+                    return (
+                        cached.answer,
+                        0,
+                        (cached.input_tokens, cached.output_tokens, 0),
+                    )
+
+        max_attempts = self.llm_config.max_attempts
+        # Providers count max_tokens against the tokens-per-minute quota up front,
+        # the estimate is reconciled with the actual usage after the response
+        estimated_tokens = prompt_tokens + max_output_tokens
 
-        for _ in range(max_attempts):
-            await self._retry_event.wait()  # Wait if currently in retry mode
+        for attempt in range(max_attempts):
+            await self._rate_limiter.acquire(estimated_tokens)
+            if on_request_sent:
+                on_request_sent()
             response = None
+            throttled = False
+            used_tokens = None
+            retry_delay = None
 
             try:
                 response = await self._client.post(
@@ -119,30 +306,53 @@ class RemoteLlmResource(BaseLlmResource):
 
                 # Providers often return 500s for rate limits
                 if response.status_code == 429 or response.status_code >= 500:
-                    retry_after = response.headers.get("Retry-After") or (2**_)
+                    throttled = True
+                    retry_delay = self._rate_limiter.get_retry_delay(
+                        attempt, parse_retry_after(response.headers.get("Retry-After"))
+                    )
                     logger.info(
-                        f"LLM completion #{conversation_id} returned status code {response.status_code}: {response.text}. Retrying in {retry_after}s..."
+                        f"LLM completion #{conversation_id} returned status code {response.status_code}: {response.text}. Retrying in {retry_delay:.1f}s..."
                     )
-                    wait_time = int(retry_after)
-                    self._retry_event.clear()  # Block further requests
-                    await asyncio.sleep(wait_time)  # Wait as advised by the server
-                    self._retry_event.set()  # Allow requests again
-                    continue
-
-                response.raise_for_status()
-                res = response.json()
-                answer: str = res["choices"][0]["message"]["content"]
-                input_tokens = res["usage"]["prompt_tokens"]
-                output_tokens = res["usage"]["completion_tokens"]
-
-                cost = (input_tokens * self.llm_config.input_cpm / 1_000_000) + (
-                    output_tokens * self.llm_config.output_cpm / 1_000_000
-                )
-                return answer, cost, (input_tokens, output_tokens)
+                else:
+                    response.raise_for_status()
+                    res = response.json()
+                    answer: str = res["choices"][0]["message"]["content"]
+                    input_tokens = res["usage"]["prompt_tokens"]
+                    output_tokens = res["usage"]["completion_tokens"]
+                    cached_input_tokens = get_cached_input_tokens(res["usage"])
+                    used_tokens = input_tokens + output_tokens
+
+                    cached_input_cpm = (
+                        self.llm_config.cached_input_cpm
+                        if self.llm_config.cached_input_cpm is not None
+                        else self.llm_config.input_cpm
+                    )
+                    cost = (
+                        (input_tokens - cached_input_tokens)
+                        * self.llm_config.input_cpm
+                        / 1_000_000
+                        + cached_input_tokens * cached_input_cpm / 1_000_000
+                        + output_tokens * self.llm_config.output_cpm / 1_000_000
+                    )
+
+                    if self._completion_cache and cache_key and answer:
+                        self._completion_cache.put(
+                            cache_key, answer, (input_tokens, output_tokens)
+                        )
+
+                    return answer, cost, (input_tokens, output_tokens, cached_input_tokens)
 
+            except asyncio.CancelledError:
+                # Abandoned (e.g. a losing hedge): says nothing about the provider
+                throttled = None
+                raise
             except (httpx.TimeoutException, httpx.ReadError) as e:
-                logger.error(f"LLM completion #{conversation_id} timed out: {e}")
-                return None, 0, (0, 0)
+                # Timeouts are usually a symptom of an overloaded provider
+                throttled = True
+                retry_delay = self._rate_limiter.get_retry_delay(attempt, None)
+                logger.info(
+                    f"LLM completion #{conversation_id} timed out: {e!r}. Retrying in {retry_delay:.1f}s..."
+                )
             except Exception as e:
                 if response:
                     logger.error(
@@ -151,15 +361,23 @@ class RemoteLlmResource(BaseLlmResource):
                 else:
                     logger.error(f"Error in LLM completion #{conversation_id}: {e}")
 
-                return None, 0, (0, 0)
+                return None, 0, (0, 0, 0)
+            finally:
+                # Release the slot before backing off so other requests can proceed
+                self._rate_limiter.release(throttled, estimated_tokens, used_tokens)
+
+            await asyncio.sleep(retry_delay)
 
         logger.error(
             f"Failed to get completion #{conversation_id} after {max_attempts} attempts."
         )
-        return None, 0, (0, 0)
+        return None, 0, (0, 0, 0)
 
     async def _get_prompt_sequence_completion(
-        self, prompts_sequence: PromptSequence, conversation_id: int
+        self,
+        prompts_sequence: PromptSequence,
+        conversation_id: int,
+        use_cache: bool = True,
     ) -> tuple[list[Dict[str, str]], float]:
         self._sequence_metrics[conversation_id] = SequenceMetrics(
             start_time=time.time()
@@ -186,9 +404,11 @@ class RemoteLlmResource(BaseLlmResource):
                     "with_memory": with_memory,
                 }
             )
-            response, cost, (input_tokens, output_tokens) = await self._get_completion(
-                conversation, conversation_id
-            )
+            (
+                response,
+                cost,
+                (input_tokens, output_tokens, cached_input_tokens),
+            ) = await self._get_completion(conversation, conversation_id, use_cache)
             self._remaining_reqs -= 1
 
             if not response:
@@ -198,6 +418,7 @@ class RemoteLlmResource(BaseLlmResource):
             metrics = self._sequence_metrics[conversation_id]
             metrics.input_tokens += input_tokens
             metrics.output_tokens += output_tokens
+            metrics.cached_input_tokens += cached_input_tokens
             total_cost += cost
 
         # Store final duration
@@ -206,51 +427,146 @@ class RemoteLlmResource(BaseLlmResource):
 
         return conversation, total_cost
 
-    async def _get_prompt_sequences_completions_batch_async(
-        self, prompt_sequences: List[PromptSequence]
-    ) -> tuple[List[List[str]], float]:
-        self._remaining_reqs = len(prompt_sequences) * len(prompt_sequences[0])
-        self._status_printer_task = asyncio.create_task(self._periodic_status_printer())
+    async def _run_prompt_sequence(
+        self, index: int, prompt_sequence: PromptSequence, use_cache: bool
+    ) -> Tuple[int, List[str], float]:
+        conversation, cost = await self._get_prompt_sequence_completion(
+            prompt_sequence, index, use_cache
+        )
+
+        # Return the assistant responses only for completed conversations
+        if len(conversation) == len(prompt_sequence) * 2:
+            return index, [message["content"] for message in conversation[1::2]], cost
+
+        return index, [], cost
+
+    def _get_scheduling_order(self, prompt_sequences: List[PromptSequence]) -> List[int]:
         """
-        This method is used to get completions for multiple prompt sequences in parallel.
-        Prompt sequence items (other than the first in the list) can be callables that take
-        the previous assistant response as input and return the next user prompt based on custom logic"""
+        Sorting by the first prompt puts sequences sharing a prefix (e.g. the same
+        instructions preamble) next to each other, so that they are sent back-to-back
+        and hit the provider prompt cache while it's still warm.
+        """
+        if not self.prefix_aware_ordering:
+            return list(range(len(prompt_sequences)))
+
+        return sorted(
+            range(len(prompt_sequences)),
+            key=lambda i: prompt_sequences[i][0]
+            if prompt_sequences[i] and isinstance(prompt_sequences[i][0], str)
+            else "",
+        )
 
-        results = await asyncio.gather(
-            *(
-                self._get_prompt_sequence_completion(prompt_sequence, i)
-                for i, prompt_sequence in enumerate(prompt_sequences)
+    async def _iter_prompt_sequences_completions_async(
+        self, prompt_sequences: List[PromptSequence], use_cache: bool = True
+    ) -> AsyncIterator[Tuple[int, List[str], float]]:
+        """
+        Yields (index, completions, cost) for each prompt sequence as soon as it finishes.
+        At most max_in_flight_sequences sequences are scheduled at any given time, the
+        rest are started as earlier ones complete.
+        Finished sequences are checkpointed to a journal: if the step is retried, they
+        are replayed from it (at no cost) and only the remainder is requested, unless
+        use_cache is False.
+        Prompt sequence items (other than the first in the list) can be callables that take
+        the previous assistant response as input and return the next user prompt based on custom logic
+        """
+        journal = self._open_checkpoint_journal(prompt_sequences)
+        replayed = {}
+        if journal and use_cache:
+            replayed = journal.load()
+        elif journal:
+            # Completions must all be requested again, not mixed with older ones
+            journal.clear()
+        if replayed:
+            get_dagster_logger().info(
+                f"Replaying {len(replayed)}/{len(prompt_sequences)} sequences from the checkpoint journal"
             )
+
+        for index, (completions, _) in replayed.items():
+            yield index, completions, 0.0
+
+        self._remaining_reqs = sum(
+            len(sequence)
+            for i, sequence in enumerate(prompt_sequences)
+            if i not in replayed
         )
+        status_printer_task = asyncio.create_task(self._periodic_status_printer())
 
-        self._status_printer_task.cancel()
+        max_in_flight = (
+            self.max_in_flight_sequences or self.llm_config.concurrency_limit * 4
+        )
+        sequences_iter = (
+            (i, prompt_sequences[i])
+            for i in self._get_scheduling_order(prompt_sequences)
+            if i not in replayed
+        )
+        pending: set[asyncio.Task] = set()
+
+        def schedule_next() -> None:
+            for index, prompt_sequence in islice(
+                sequences_iter, max_in_flight - len(pending)
+            ):
+                pending.add(
+                    asyncio.create_task(
+                        self._run_prompt_sequence(index, prompt_sequence, use_cache)
+                    )
+                )
 
-        conversations = [conv for conv, cost in results]
-        costs = [cost for conv, cost in results]
+        try:
+            schedule_next()
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                pending.difference_update(done)
+                schedule_next()
+
+                for task in done:
+                    index, completions, cost = task.result()
+                    # Failed sequences are left out so that a retry requests them again
+                    if journal and completions:
+                        journal.append(index, completions, cost)
+                    yield index, completions, cost
+
+            if journal:
+                journal.clear()
+        finally:
+            status_printer_task.cancel()
+            for task in pending:
+                task.cancel()
+            if journal:
+                journal.flush()
 
-        # Assume all prompt sequences have the same length
-        prompt_sequences_length = max(len(sequence) for sequence in prompt_sequences)
+    async def _get_prompt_sequences_completions_batch_async(
+        self, prompt_sequences: List[PromptSequence], use_cache: bool = True
+    ) -> tuple[List[List[str]], float]:
+        results: List[List[str]] = [[] for _ in prompt_sequences]
+        total_cost = 0.0
 
-        # Return all the assistant responses, only for completed conversations
-        return list(
-            map(
-                lambda x: [message["content"] for message in x[1::2]]
-                if len(x) == prompt_sequences_length * 2
-                else [],
-                conversations,
-            )
-        ), sum(costs)
+        results_iter = self._iter_prompt_sequences_completions_async(
+            prompt_sequences, use_cache
+        )
+        async for index, completions, cost in results_iter:
+            results[index] = completions
+            total_cost += cost
+
+        return results, total_cost
+
+    def _ensure_client(self) -> None:
+        # Check if client is closed and recreate if necessary
+        if self._client.is_closed:
+            self._client = self._create_client()
 
     def get_prompt_sequences_completions_batch(
-        self, prompt_sequences: List[PromptSequence]
+        self, prompt_sequences: List[PromptSequence], use_cache: bool = True
     ) -> Tuple[List[PromptSequence], float]:
         """
         Synchronous wrapper for the async get_prompt_sequences_completions_batch function.
         Uses a thread to run the async function in a new event loop.
+
+        Set use_cache=False to skip completion cache lookups for this batch
+        (fresh answers are still written to the cache).
         """
-        # Check if client is closed and recreate if necessary
-        if self._client.is_closed:
-            self._client = self._create_client()
+        self._ensure_client()
 
         def run_async_in_thread(async_func: Any, *args) -> Any:
             # Use the existing event loop instead of creating a new one
@@ -262,9 +578,49 @@ class RemoteLlmResource(BaseLlmResource):
                 run_async_in_thread,
                 self._get_prompt_sequences_completions_batch_async,
                 prompt_sequences,
+                use_cache,
             )
             return future.result()
 
+    def iter_prompt_sequences_completions(
+        self, prompt_sequences: List[PromptSequence], use_cache: bool = True
+    ) -> Iterator[Tuple[int, List[str], float]]:
+        """
+        Streaming counterpart of get_prompt_sequences_completions_batch.
+        The requests run on the resource event loop in a worker thread while the
+        caller consumes (index, completions, cost) tuples in completion order.
+        """
+        self._ensure_client()
+
+        results_queue: queue.Queue = queue.Queue()
+        producer_task: List[asyncio.Task] = []
+        done_sentinel = object()
+
+        async def produce() -> None:
+            producer_task.append(asyncio.current_task())  # type: ignore
+            try:
+                async for result in self._iter_prompt_sequences_completions_async(
+                    prompt_sequences, use_cache
+                ):
+                    results_queue.put(result)
+            finally:
+                results_queue.put(done_sentinel)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self._loop.run_until_complete, produce())
+            try:
+                while (result := results_queue.get()) is not done_sentinel:
+                    yield result
+            finally:
+                # The consumer stopped early: stop scheduling new requests
+                if not future.done() and producer_task:
+                    self._loop.call_soon_threadsafe(producer_task[0].cancel)
+                with suppress(asyncio.CancelledError):
+                    future.result()
+
     async def teardown_after_execution(self, context: InitResourceContext) -> None:
         await self._client.aclose()
         self._loop.close()
+
+        if self._completion_cache:
+            self._completion_cache.close()
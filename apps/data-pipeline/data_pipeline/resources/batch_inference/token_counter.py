@@ -0,0 +1,129 @@
+from functools import lru_cache
+from typing import Any, Dict, List
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character heuristic
+    tiktoken = None
+
+# Chars-per-token ratios when no tokenizer is available: English text averages
+# ~4 chars per token, other scripts (CJK, Cyrillic...) can go down to one
+_CHARS_PER_TOKEN = 3.5
+_NON_ASCII_CHARS_PER_TOKEN = 1.0
+# Relative error of the heuristic: only estimates beyond this margin are
+# treated as overflows, the borderline ones are left to the provider
+ESTIMATE_MARGIN = 0.15
+# Chat templates add a few tokens around every message
+_TOKENS_PER_MESSAGE = 4
+_TOKENS_PER_REPLY = 3
+# Re-tokenizing around the cut can add a couple of tokens
+_TRUNCATION_SLACK = 16
+
+TRUNCATION_MARKER = "\n[...]\n"
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    # Not the exact tokenizer of every provider, but within a few percent
+    # of the Llama 3 / DeepSeek ones on English text
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # The encoding files are downloaded on first use and may be unreachable
+        return None
+
+
+def is_token_count_exact() -> bool:
+    """Whether token counts come from a tokenizer rather than a heuristic."""
+    return _get_encoding() is not None
+
+
+def count_text_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    non_ascii_chars = len(text) - ascii_chars
+    return (
+        int(
+            ascii_chars / _CHARS_PER_TOKEN
+            + non_ascii_chars / _NON_ASCII_CHARS_PER_TOKEN
+        )
+        + 1
+    )
+
+
+def _get_message_text(message: Dict[str, Any]) -> str:
+    content = message["content"]
+    if isinstance(content, list):
+        # Multimodal format: [{"type": "text", "text": ...}, ...]
+        return "".join(part.get("text", "") for part in content)
+    return content
+
+
+def count_messages_tokens(messages: List[Dict[str, Any]]) -> int:
+    return _TOKENS_PER_REPLY + sum(
+        _TOKENS_PER_MESSAGE + count_text_tokens(_get_message_text(message))
+        for message in messages
+    )
+
+
+def truncate_text_middle(text: str, max_tokens: int) -> str:
+    """
+    Drops the middle of the text so that it fits in max_tokens. Prompts usually
+    have instructions both before and after the data, so we keep both ends.
+    """
+    encoding = _get_encoding()
+    keep = max(0, max_tokens - count_text_tokens(TRUNCATION_MARKER))
+
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        head, tail = keep // 2, keep - keep // 2
+        return (
+            encoding.decode(tokens[:head])
+            + TRUNCATION_MARKER
+            + (encoding.decode(tokens[-tail:]) if tail else "")
+        )
+
+    text_tokens = count_text_tokens(text)
+    if text_tokens <= max_tokens:
+        return text
+    # Keep the text's own chars-per-token ratio, whatever its script
+    keep_chars = int(len(text) * keep / text_tokens)
+    head, tail = keep_chars // 2, keep_chars - keep_chars // 2
+    return text[:head] + TRUNCATION_MARKER + (text[-tail:] if tail else "")
+
+
+def fit_messages_to_budget(
+    messages: List[Dict[str, Any]], max_prompt_tokens: int
+) -> List[Dict[str, Any]] | None:
+    """
+    Returns a copy of the messages fitting in max_prompt_tokens by truncating the
+    longest one, or None if even that isn't enough.
+    """
+    excess = count_messages_tokens(messages) - max_prompt_tokens
+    if excess <= 0:
+        return messages
+
+    longest_idx = max(
+        range(len(messages)),
+        key=lambda i: len(_get_message_text(messages[i])),
+    )
+    longest_text = _get_message_text(messages[longest_idx])
+    budget = count_text_tokens(longest_text) - excess - _TRUNCATION_SLACK
+    if budget <= 0:
+        return None
+
+    truncated_text = truncate_text_middle(longest_text, budget)
+    message = dict(messages[longest_idx])
+    message["content"] = (
+        [{"type": "text", "text": truncated_text}]
+        if isinstance(message["content"], list)
+        else truncated_text
+    )
+
+    return [*messages[:longest_idx], message, *messages[longest_idx + 1 :]]
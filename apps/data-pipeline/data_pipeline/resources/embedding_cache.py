@@ -0,0 +1,153 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from data_pipeline.resources.batch_inference.completion_cache import CacheStats
+
+# sqlite's default limit on the number of bound parameters
+_MAX_QUERY_PARAMS = 900
+
+
+def get_text_cache_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_model_namespace(model: str) -> str:
+    # Model names look like "BAAI/bge-en-icl"
+    return re.sub(r"[^\w.-]", "_", model)
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed store of embeddings for a single model.
+
+    Vectors are appended as float32 rows to a flat file that is read through a
+    memory map, while a sqlite index maps the hash of each text to its row.
+    Entries are never evicted. Writers serialize on the sqlite write lock, so the
+    store can be shared by concurrent runs.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.stats = CacheStats()
+
+        self._lock = threading.Lock()
+        self._vectors_path = directory / "vectors.f32"
+        self._memmap: np.memmap | None = None
+
+        directory.mkdir(parents=True, exist_ok=True)
+        self._vectors_path.touch(exist_ok=True)
+
+        # Transactions are managed explicitly in put()
+        self._conn = sqlite3.connect(
+            directory / "index.sqlite", check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, row INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+
+    def _get_dimensions(self) -> int | None:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE name = 'dimensions'"
+        ).fetchone()
+        return row[0] if row else None
+
+    def _select_rows(self, keys: List[str]) -> Dict[str, int]:
+        rows: Dict[str, int] = {}
+        for i in range(0, len(keys), _MAX_QUERY_PARAMS):
+            chunk = keys[i : i + _MAX_QUERY_PARAMS]
+            rows.update(
+                self._conn.execute(
+                    f"SELECT key, row FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+            )
+        return rows
+
+    def lookup(self, keys: List[str]) -> Dict[str, int]:
+        """Returns the row of every key found in the cache."""
+        with self._lock:
+            rows = self._select_rows(keys)
+
+        self.stats.hits += len(rows)
+        self.stats.misses += len(keys) - len(rows)
+        return rows
+
+    def read(self, rows: List[int]) -> np.ndarray:
+        """Gathers the given rows into a (len(rows), dimensions) float32 array."""
+        with self._lock:
+            dimensions = self._get_dimensions()
+            if not rows or dimensions is None:
+                return np.empty((len(rows), dimensions or 0), dtype=np.float32)
+
+            # The file only grows, so the map only needs refreshing for new rows
+            if self._memmap is None or max(rows) >= self._memmap.shape[0]:
+                n_rows = os.path.getsize(self._vectors_path) // (dimensions * 4)
+                self._memmap = np.memmap(
+                    self._vectors_path,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(n_rows, dimensions),
+                )
+
+            return np.asarray(self._memmap[np.asarray(rows, dtype=np.int64)])
+
+    def put(self, keys: List[str], vectors: np.ndarray) -> None:
+        if not keys:
+            return
+
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                dimensions = self._get_dimensions()
+                if dimensions is None:
+                    dimensions = vectors.shape[1]
+                    self._conn.execute(
+                        "INSERT INTO meta VALUES ('dimensions', ?)", (dimensions,)
+                    )
+                elif dimensions != vectors.shape[1]:
+                    raise ValueError(
+                        f"Expected {dimensions}-dimensional embeddings in {self.directory}, got {vectors.shape[1]}"
+                    )
+
+                # Another run may have stored some of them in the meantime
+                existing = self._select_rows(keys)
+                new_idx = [i for i, key in enumerate(keys) if key not in existing]
+
+                # Rows written by a run that crashed before committing are dropped
+                row_bytes = dimensions * 4
+                (first_row,) = self._conn.execute(
+                    "SELECT COALESCE(MAX(row) + 1, 0) FROM embeddings"
+                ).fetchone()
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(first_row * row_bytes)
+                    f.write(vectors[new_idx].tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                self._conn.executemany(
+                    "INSERT INTO embeddings VALUES (?, ?)",
+                    ((keys[i], first_row + j) for j, i in enumerate(new_idx)),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            self._memmap = None
+            self._conn.close()
@@ -0,0 +1,45 @@
+from typing import List
+
+import numpy as np
+import polars as pl
+
+
+def to_embedding_series(
+    embeddings: List[np.ndarray | None], dimensions: int, name: str = "embedding"
+) -> pl.Series:
+    """
+    Packs embeddings into a fixed-size Array(Float32, dimensions) column, half the
+    size of a List(Float64) one in parquet. Failed embeddings (None) become nulls,
+    the dtype stays the same even when all of them failed.
+    """
+    dtype = pl.Array(pl.Float32, dimensions)
+    valid = np.array([embedding is not None for embedding in embeddings], dtype=bool)
+    if not valid.any():
+        return pl.Series(name, [None] * len(embeddings), dtype=dtype)
+
+    vectors = np.stack([embedding for embedding in embeddings if embedding is not None])
+    if vectors.shape[1] != dimensions:
+        raise ValueError(
+            f"Expected {dimensions}-dimensional embeddings, got {vectors.shape[1]}"
+        )
+    matrix = np.zeros((len(embeddings), dimensions), dtype=np.float32)
+    matrix[valid] = vectors
+
+    series = pl.Series(name, matrix)
+    if valid.all():
+        return series
+    return pl.select(pl.when(pl.Series(valid)).then(series).alias(name)).to_series()
+
+
+def to_embedding_matrix(series: pl.Series) -> np.ndarray:
+    """
+    Unpacks an Array or List embedding column into a contiguous (n, dimensions)
+    float32 matrix, without going through Python lists.
+    """
+    if series.is_empty():
+        return np.empty((0, 0), dtype=np.float32)
+
+    if not isinstance(series.dtype, pl.Array):
+        series = series.list.to_array(int(series.list.len().max()))  # type: ignore
+
+    return np.ascontiguousarray(series.to_numpy(), dtype=np.float32)
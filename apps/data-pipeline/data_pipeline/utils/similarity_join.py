@@ -0,0 +1,284 @@
+import math
+from dataclasses import dataclass
+from typing import Literal, Tuple
+
+import faiss
+import numpy as np
+
+SimilarityIndexKind = Literal["auto", "flat", "ivf", "hnsw", "ivfpq"]
+
+# Neighbors first looked at by HNSW range searches, grown until it covers the range
+RANGE_SEARCH_INITIAL_K = 32
+
+
+@dataclass
+class SimilarityJoinConfig:
+    """
+    How to find the pairs of similar rows of an embedding matrix.
+
+    kind: "flat" is an exact search, "ivf" and "hnsw" are approximate, "ivfpq" also
+        compresses the vectors for large inputs. "auto" uses flat up to
+        `flat_max_rows` rows and IVF above.
+    max_k: Neighbors checked per row. None finds every neighbor above the threshold
+        (range search), which doesn't drop matches in dense clusters.
+    pca_dimensions: Project the embeddings on this many principal components before
+        indexing, to cut the cost of every distance computation.
+    query_block_size: Rows searched at once, which bounds the memory of the results.
+    candidate_margin: Approximate indexes (PCA, PQ) look for candidates this much
+        below the threshold, before rescoring them exactly.
+    """
+
+    kind: SimilarityIndexKind = "auto"
+    max_k: int | None = 30
+    pca_dimensions: int | None = None
+    query_block_size: int = 4096
+    flat_max_rows: int = 20_000
+    ivf_nprobe: int = 16
+    hnsw_m: int = 32
+    hnsw_ef_search: int = 128
+    pq_bytes: int = 64
+    candidate_margin: float = 0.05
+
+
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """
+    L2-normalized float32 copy of the embeddings. Already normalized matrices are
+    returned as they are, so one can be shared by several joins without copies.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32, order="C")
+    if np.allclose(np.einsum("ij,ij->i", embeddings, embeddings), 1.0, atol=1e-4):
+        return embeddings
+
+    embeddings = embeddings.copy()
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def _get_training_sample(embeddings: np.ndarray, size: int) -> np.ndarray:
+    if len(embeddings) <= size:
+        return embeddings
+    rows = np.random.default_rng(0).choice(len(embeddings), size, replace=False)
+    return embeddings[np.sort(rows)]
+
+
+def _build_index(
+    embeddings: np.ndarray, kind: SimilarityIndexKind, config: SimilarityJoinConfig
+) -> faiss.Index:
+    n, dimensions = embeddings.shape
+
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(
+            dimensions, config.hnsw_m, faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efSearch = config.hnsw_ef_search
+    elif kind in ("ivf", "ivfpq"):
+        # faiss wants ~39 training points per list
+        n_lists = max(1, min(int(4 * math.sqrt(n)), n // 39))
+        quantizer = faiss.IndexFlatIP(dimensions)
+        if kind == "ivf":
+            index = faiss.IndexIVFFlat(
+                quantizer, dimensions, n_lists, faiss.METRIC_INNER_PRODUCT
+            )
+        else:
+            # The number of sub-quantizers has to divide the dimensions, and each
+            # of their 2^bits centroids wants ~39 training points too
+            subquantizers = math.gcd(dimensions, config.pq_bytes)
+            bits = min(8, max(1, int(math.log2(max(n // 39, 2)))))
+            index = faiss.IndexIVFPQ(
+                quantizer,
+                dimensions,
+                n_lists,
+                subquantizers,
+                bits,
+                faiss.METRIC_INNER_PRODUCT,
+            )
+        index.train(_get_training_sample(embeddings, 256 * n_lists))  # type: ignore
+        index.nprobe = min(n_lists, config.ivf_nprobe)
+    else:
+        index = faiss.IndexFlatIP(dimensions)
+
+    index.add(embeddings)  # type: ignore
+    return index
+
+
+def _is_approximate(index: faiss.Index) -> bool:
+    """Whether the scores of the index are only approximate, i.e. PCA or PQ."""
+    return isinstance(index, (faiss.IndexPreTransform, faiss.IndexIVFPQ))
+
+
+def _search_block(
+    index: faiss.Index, queries: np.ndarray, threshold: float, max_k: int | None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the (query row, indexed row) pairs with a score above the threshold."""
+    base_index = index
+    if isinstance(index, faiss.IndexPreTransform):
+        base_index = faiss.downcast_index(index.index)
+
+    if max_k is None and not isinstance(base_index, faiss.IndexHNSW):
+        limits, _, targets = index.range_search(queries, threshold)  # type: ignore
+        counts = np.diff(limits.astype(np.int64))
+        return np.repeat(np.arange(len(queries)), counts), targets
+
+    if max_k is not None:
+        similarities, targets = index.search(queries, k=max_k)  # type: ignore
+        sources = np.broadcast_to(np.arange(len(queries))[:, None], targets.shape)
+        # faiss pads with -1 when there are fewer than max_k rows
+        mask = (targets >= 0) & (similarities >= threshold)
+        return sources[mask], targets[mask]
+
+    # HNSW range searches aren't reliable on large batches, so search growing
+    # neighborhoods until the furthest neighbor falls below the threshold
+    sources, targets = [], []
+    pending = np.arange(len(queries))
+    k = RANGE_SEARCH_INITIAL_K
+    while len(pending):
+        k = min(k, index.ntotal)
+        similarities, indices = index.search(queries[pending], k=k)  # type: ignore
+
+        done = (k == index.ntotal) | (similarities[:, -1] < threshold)
+        mask = done[:, None] & (indices >= 0) & (similarities >= threshold)
+        sources.append(np.broadcast_to(pending[:, None], mask.shape)[mask])
+        targets.append(indices[mask])
+
+        pending = pending[~done]
+        k *= 4
+
+    return np.concatenate(sources), np.concatenate(targets)
+
+
+def build_similarity_index(
+    embeddings: np.ndarray, config: SimilarityJoinConfig | None = None
+) -> faiss.Index:
+    """
+    Indexes the rows of an embedding matrix for `similarity_join`. The index takes
+    raw embeddings, so it can be grown with `index.add` and saved with
+    `faiss.serialize_index` to be joined against later.
+    """
+    config = config or SimilarityJoinConfig()
+    embeddings = normalize_embeddings(embeddings)
+    n, dimensions = embeddings.shape
+
+    kind = config.kind
+    if kind == "auto":
+        kind = "flat" if n <= config.flat_max_rows else "ivf"
+
+    if not config.pca_dimensions or config.pca_dimensions >= dimensions:
+        return _build_index(embeddings, kind, config)
+
+    pca = faiss.PCAMatrix(dimensions, config.pca_dimensions)
+    pca.train(_get_training_sample(embeddings, 100_000))  # type: ignore
+    vectors = normalize_embeddings(pca.apply(embeddings))  # type: ignore
+    index = _build_index(vectors, kind, config)
+
+    # Projects and re-normalizes whatever is added or searched later on
+    index = faiss.IndexPreTransform(
+        faiss.NormalizationTransform(config.pca_dimensions, 2.0), index
+    )
+    index.prepend_transform(pca)
+    return index
+
+
+def add_to_similarity_index(index: faiss.Index, embeddings: np.ndarray):
+    """Adds rows to an index from `build_similarity_index`, after its current ones."""
+    if len(embeddings):
+        index.add(normalize_embeddings(embeddings))  # type: ignore
+
+
+def _empty_join() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return (
+        np.empty(0, dtype=np.int64),
+        np.empty(0, dtype=np.int64),
+        np.empty(0, dtype=np.float32),
+    )
+
+
+def similarity_join(
+    index: faiss.Index,
+    indexed_embeddings: np.ndarray,
+    queries: np.ndarray,
+    threshold: float,
+    config: SimilarityJoinConfig | None = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the (query, indexed row) pairs whose cosine similarity is at least
+    `threshold`.
+
+    Args:
+        index: Output of `build_similarity_index`.
+        indexed_embeddings: The embeddings of the indexed rows, in index order,
+            against which candidates are rescored exactly.
+        queries: The embeddings to look up.
+
+    Returns:
+        Three arrays (sources, targets, similarities), one entry per pair, sources
+        being query rows and targets indexed rows.
+    """
+    config = config or SimilarityJoinConfig()
+    if not len(queries) or not index.ntotal:
+        return _empty_join()
+
+    same = queries is indexed_embeddings
+    queries = normalize_embeddings(queries)
+    indexed_embeddings = queries if same else normalize_embeddings(indexed_embeddings)
+
+    search_threshold = threshold
+    if _is_approximate(index):
+        search_threshold -= config.candidate_margin
+
+    sources, targets = [], []
+    for start in range(0, len(queries), config.query_block_size):
+        block_sources, block_targets = _search_block(
+            index,
+            queries[start : start + config.query_block_size],
+            search_threshold,
+            config.max_k,
+        )
+        sources.append(block_sources + start)
+        targets.append(block_targets)
+
+    sources = np.concatenate(sources).astype(np.int64)
+    targets = np.concatenate(targets).astype(np.int64)
+
+    # Exact cosine similarity of every candidate pair, in blocks to bound memory
+    similarities = np.concatenate(
+        [
+            np.einsum(
+                "ij,ij->i",
+                queries[sources[i : i + config.query_block_size]],
+                indexed_embeddings[targets[i : i + config.query_block_size]],
+            )
+            for i in range(0, len(sources), config.query_block_size)
+        ]
+        or [np.empty(0, dtype=np.float32)]
+    )
+
+    mask = similarities >= threshold
+    return sources[mask], targets[mask], similarities[mask]
+
+
+def similarity_self_join(
+    embeddings: np.ndarray,
+    threshold: float,
+    config: SimilarityJoinConfig | None = None,
+    index: faiss.Index | None = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the pairs of distinct rows whose cosine similarity is at least `threshold`.
+    `index` is built from the embeddings if not given.
+
+    Returns:
+        Three arrays (sources, targets, similarities), one entry per pair. Both
+        directions of a pair are returned when both rows find each other.
+    """
+    if not len(embeddings):
+        return _empty_join()
+
+    if index is None:
+        index = build_similarity_index(embeddings, config)
+
+    sources, targets, similarities = similarity_join(
+        index, embeddings, embeddings, threshold, config
+    )
+
+    mask = sources != targets
+    return sources[mask], targets[mask], similarities[mask]
@@ -1,297 +1,662 @@
-from typing import Dict, List, Set, Tuple
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Literal, Tuple
 
 import faiss
 import numpy as np
 import polars as pl
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components
+from upath import UPath
 
+from data_pipeline.utils.embedding_series import to_embedding_matrix
+from data_pipeline.utils.similarity_join import (
+    SimilarityJoinConfig,
+    add_to_similarity_index,
+    build_similarity_index,
+    similarity_join,
+    similarity_self_join,
+)
 
-def _find_similar_nodes(
-    embeddings: List[List[float]],
+RELATIONSHIP_DTYPE = pl.List(
+    pl.Struct([pl.Field("source", pl.Utf8), pl.Field("target", pl.Utf8)])
+)
+
+RepresentativePolicy = Literal["min_label", "first", "centroid"]
+
+
+@dataclass
+class MergePolicy:
+    """
+    How the nodes of a merge group are combined into one.
+
+    single_fields: Fields retained as single values, taken from the representative.
+    list_fields: Fields aggregated into a list over the group, in row order. Each
+        element is a tuple (new_field_name, old_field_name).
+    representative: Which node of the group represents it.
+        "min_label": the alphabetically smallest label, the other single fields
+            coming from the first node of the group.
+        "first": the first node of the group.
+        "centroid": the node closest to the mean embedding of the group.
+    """
+
+    single_fields: List[str]
+    list_fields: List[Tuple[str, str]]
+    representative: RepresentativePolicy = "min_label"
+
+
+@dataclass
+class DeduplicationState:
+    """
+    What an incremental deduplication keeps from one run to the next.
+
+    index: The similarity index of every node deduplicated so far, with the first
+        row of each label.
+    labels: The label of each row of the index, each one appearing once.
+    groups: The merge group of each row of the index (the union-find state).
+    threshold: The similarity threshold the groups were built with.
+    similarity_join: The config the index was built with, None if unknown.
+    row_counts: The number of input rows with each label, so that the groups of
+        labels emitted again are known to have changed. None if unknown.
+    representatives: Columns of the merged nodes as finalized by the caller (e.g.
+        synthesized descriptions), keyed by label. They're carried over to the
+        nodes whose group didn't change.
+    """
+
+    index: faiss.Index
+    labels: pl.Series
+    groups: np.ndarray
+    threshold: float
+    similarity_join: SimilarityJoinConfig | None = None
+    row_counts: np.ndarray | None = None
+    representatives: pl.DataFrame | None = None
+
+    def save(self, directory: UPath):
+        """
+        The metadata marks a complete state: it's removed first and written last, so
+        that a save interrupted halfway leaves no state rather than a mixed one.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / "metadata.json").unlink(missing_ok=True)
+
+        (directory / "index.faiss").write_bytes(
+            faiss.serialize_index(self.index).tobytes()
+        )
+        with (directory / "groups.parquet").open("wb") as f:
+            pl.DataFrame(
+                {
+                    "label": self.labels,
+                    "group": pl.Series(self.groups),
+                    "rows": pl.Series(self.row_counts, dtype=pl.Int64),
+                }
+            ).write_parquet(f)
+        if self.representatives is not None:
+            with (directory / "representatives.parquet").open("wb") as f:
+                self.representatives.write_parquet(f)
+        else:
+            (directory / "representatives.parquet").unlink(missing_ok=True)
+
+        (directory / "metadata.json").write_text(
+            json.dumps(
+                {
+                    "threshold": self.threshold,
+                    "similarity_join": asdict(self.similarity_join)
+                    if self.similarity_join
+                    else None,
+                }
+            )
+        )
+
+    @classmethod
+    def load(cls, directory: UPath) -> "DeduplicationState | None":
+        """Returns None if no complete state was saved there."""
+        if not (directory / "metadata.json").exists():
+            return None
+
+        metadata = json.loads((directory / "metadata.json").read_text())
+        similarity_join = metadata.get("similarity_join")
+        index = faiss.deserialize_index(
+            np.frombuffer((directory / "index.faiss").read_bytes(), dtype=np.uint8)
+        )
+        with (directory / "groups.parquet").open("rb") as f:
+            groups = pl.read_parquet(f)
+
+        representatives = None
+        if (directory / "representatives.parquet").exists():
+            with (directory / "representatives.parquet").open("rb") as f:
+                representatives = pl.read_parquet(f)
+
+        return cls(
+            index=index,
+            labels=groups.get_column("label"),
+            groups=groups.get_column("group").to_numpy(),
+            threshold=metadata["threshold"],
+            similarity_join=SimilarityJoinConfig(**similarity_join)
+            if similarity_join
+            else None,
+            row_counts=groups.get_column("rows").to_numpy()
+            if "rows" in groups.columns
+            else None,
+            representatives=representatives,
+        )
+
+
+@dataclass
+class DeduplicationResult:
+    """
+    nodes: The merged nodes, in order of first appearance of their group.
+    label_mapping: Frame (old_label, new_label) of every input label.
+    changed: Whether the membership of each node's group changed since the state
+        the run started from (always true without one).
+    state: The state to start the next run from, None if there were no nodes.
+    timings: Seconds spent in each phase.
+    """
+
+    nodes: pl.DataFrame
+    label_mapping: pl.DataFrame
+    changed: pl.Series
+    state: DeduplicationState | None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def format_timings(self) -> str:
+        return ", ".join(
+            f"{phase}: {seconds:.2f}s" for phase, seconds in self.timings.items()
+        )
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], phase: str) -> Iterator[None]:
+    start = time.perf_counter()
+    yield
+    timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+
+
+def _get_label_row_counts(labels: pl.Series) -> np.ndarray:
+    """The number of rows with the label of each row."""
+    return (
+        labels.to_frame("label")
+        .select(pl.len().over("label"))
+        .to_series()
+        .to_numpy()
+        .astype(np.int64)
+    )
+
+
+def _find_similar_pairs_incremental(
+    state: DeduplicationState,
+    labels: pl.Series,
+    row_counts: np.ndarray,
+    embeddings: np.ndarray,
     threshold: float,
-    max_k: int,
-) -> List[Tuple[int, List[Tuple[int, float]]]]:
+    similarity_join_config: SimilarityJoinConfig | None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
     """
-    Performs a FAISS similarity search and returns all similar node pairs
-    that exceed the `threshold`.
+    Similarity pairs of the rows against the state: only the rows with a new label
+    are searched, among themselves and against the index, while the rows already
+    indexed are linked together as in their previous group.
+
+    Returns:
+        The (sources, targets) row pairs, the previous group of each row (-1 for
+        new rows), the row of each node of the index and whether the label of each
+        row has more rows than in the state.
+    """
+    # First row of each indexed node, every label of the state being in the rows
+    indexed_rows = (
+        pl.DataFrame({"label": state.labels})
+        .join(
+            pl.DataFrame({"label": labels})
+            .with_row_index("row")
+            .unique("label", keep="first"),
+            on="label",
+            how="left",
+            maintain_order="left",
+        )
+        .get_column("row")
+        .to_numpy()
+        .astype(np.int64)
+    )
+
+    previous = pl.DataFrame({"label": labels}).join(
+        pl.DataFrame(
+            {"label": state.labels, "group": state.groups, "rows": state.row_counts}
+        ),
+        on="label",
+        how="left",
+        maintain_order="left",
+    )
+    previous_groups = previous.get_column("group").fill_null(-1).to_numpy()
+    grown = (
+        (previous.get_column("rows") != pl.Series(row_counts))
+        .fill_null(False)
+        .to_numpy()
+    )
+    new_rows = np.flatnonzero(previous_groups < 0)
+
+    # Links every indexed node to the first node of its previous group
+    _, first, inverse = np.unique(state.groups, return_index=True, return_inverse=True)
+    pairs = [(indexed_rows, indexed_rows[first[inverse]])]
+
+    if len(new_rows):
+        new_sources, new_targets, _ = similarity_self_join(
+            embeddings[new_rows], threshold, similarity_join_config
+        )
+        pairs.append((new_rows[new_sources], new_rows[new_targets]))
+
+        new_sources, indexed_targets, _ = similarity_join(
+            state.index,
+            embeddings[indexed_rows],
+            embeddings[new_rows],
+            threshold,
+            similarity_join_config,
+        )
+        pairs.append((new_rows[new_sources], indexed_rows[indexed_targets]))
+
+    return (
+        np.concatenate([sources for sources, _ in pairs]),
+        np.concatenate([targets for _, targets in pairs]),
+        previous_groups,
+        indexed_rows,
+        grown,
+    )
+
+
+def _build_merge_groups(
+    labels: pl.Series, sources: np.ndarray, targets: np.ndarray
+) -> np.ndarray:
+    """
+    Assigns each row to the group of nodes it should be merged with, i.e. the
+    connected components of the similarity pairs. Rows sharing a label are the same
+    node.
 
     Args:
-        embeddings: A list of embedding vectors (one per node).
-        threshold: Cosine similarity threshold for considering two nodes 'similar'.
+        labels: The unique label of each row.
+        sources, targets: Output of `similarity_self_join`, as row indices.
 
     Returns:
-        A list of tuples, where each tuple is:
-            (node_index, [(similar_node_index, similarity_score), ...])
+        The group number of each row.
     """
-    if not embeddings:
-        return []
+    # Integer node ids, shared by the rows with the same label
+    node_ids = (labels.rank("dense") - 1).cast(pl.Int64).to_numpy()
+    n_nodes = int(node_ids.max()) + 1 if len(node_ids) else 0
+
+    adjacency = coo_matrix(
+        (
+            np.ones(len(sources), dtype=np.int8),
+            (node_ids[sources], node_ids[targets]),
+        ),
+        shape=(n_nodes, n_nodes),
+    )
+    _, components = connected_components(adjacency, directed=True, connection="weak")
+
+    return components[node_ids]
 
-    embeddings_array = np.array(embeddings, dtype=np.float32)
-    faiss.normalize_L2(embeddings_array)
 
-    dimension = embeddings_array.shape[1]
-    index = faiss.IndexFlatIP(dimension)
-    index.add(embeddings_array)  # type: ignore
+def _can_resume(
+    state: DeduplicationState,
+    labels: pl.Series,
+    embeddings: np.ndarray,
+    threshold: float,
+    config: SimilarityJoinConfig,
+) -> bool:
+    """
+    The state must have been built the same way, with one index row per label.
+    Groups can only grow, so a state can't be resumed if some of its nodes are gone.
+    """
+    previous = state.similarity_join
+    return (
+        state.threshold == threshold
+        and previous is not None
+        and (previous.kind, previous.pca_dimensions, previous.max_k)
+        == (config.kind, config.pca_dimensions, config.max_k)
+        and state.index.d == embeddings.shape[1]
+        and state.row_counts is not None
+        and state.index.ntotal
+        == len(state.labels)
+        == len(state.groups)
+        == len(state.row_counts)
+        and state.labels.n_unique() == len(state.labels)
+        and bool(state.labels.is_in(labels.implode()).all())
+    )
 
-    similarities, indices = index.search(embeddings_array, k=max_k)  # type: ignore
 
-    # Collect similar pairs
-    similar_pairs = []
-    for i, (sim_scores, idx_list) in enumerate(zip(similarities, indices)):
-        matches = []
-        for j, sim in zip(idx_list, sim_scores):
-            if i != j and sim >= threshold:
-                matches.append((j, float(sim)))
-        similar_pairs.append((i, matches))
+def _get_changed_groups(
+    groups: np.ndarray, previous_groups: np.ndarray, grown: np.ndarray
+) -> np.ndarray:
+    """
+    Whether the membership of each group changed, i.e. it has new nodes, new rows
+    for its labels or joins several previous groups.
+    """
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    has_new_nodes = np.bincount(
+        groups, weights=(previous_groups < 0) | grown, minlength=n_groups
+    )
+    merged_groups, _ = np.unique(np.stack([groups, previous_groups]), axis=1)
 
-    return similar_pairs
+    return (has_new_nodes > 0) | (np.bincount(merged_groups, minlength=n_groups) > 1)
 
 
-def _build_merge_groups(
-    similar_pairs: List[Tuple[int, List[Tuple[int, float]]]],
-    nodes: List[Dict[str, str]],
+def _carry_over_representatives(
+    nodes: pl.DataFrame,
+    changed: pl.Series,
+    representatives: pl.DataFrame,
     label_col: str,
-) -> List[Set[str]]:
+) -> Tuple[pl.DataFrame, pl.Series]:
     """
-    Builds groups of node labels (strings) that should be merged together,
-    using a Union-Find structure for transitivity.
+    Replaces the columns of the nodes whose group didn't change by their previous
+    representative values. Nodes without one (e.g. a new representative was picked)
+    are marked as changed.
+    """
+    columns = [
+        col for col in representatives.columns if col != label_col and col in nodes
+    ]
+    previous = representatives.unique(label_col).select(
+        label_col,
+        pl.lit(True).alias("_has_previous"),
+        *[
+            pl.col(col).cast(nodes.schema[col]).alias(f"{col}_previous")
+            for col in columns
+        ],
+    )
 
-    Args:
-        similar_pairs: Output of `find_similar_nodes`.
-        nodes: A list of dicts, each dict representing a node's attributes.
-        label_col: The key in the node dict that represents the node's unique label.
+    nodes = (
+        nodes.with_columns(changed.alias("_changed"))
+        .join(previous, on=label_col, how="left", maintain_order="left")
+        .with_columns(
+            pl.col("_changed") | pl.col("_has_previous").is_null(),
+        )
+    )
+    nodes = nodes.with_columns(
+        pl.when(pl.col("_changed"))
+        .then(pl.col(col))
+        .otherwise(pl.col(f"{col}_previous"))
+        .alias(col)
+        for col in columns
+    )
 
-    Returns:
-        A list of sets. Each set is a group of labels that should be merged.
+    return (
+        nodes.drop("_changed", "_has_previous", *[f"{c}_previous" for c in columns]),
+        nodes.get_column("_changed").alias(changed.name),
+    )
+
+
+def _get_representative_priorities(
+    embeddings: np.ndarray, groups: np.ndarray, representative: RepresentativePolicy
+) -> np.ndarray:
+    """
+    Ranks the rows of each group, the representative having the lowest priority.
     """
-    # Initialize Union-Find
-    parent = {node[label_col]: node[label_col] for node in nodes}
-    rank = {node[label_col]: 0 for node in nodes}
-
-    def find(x: str) -> str:
-        if parent[x] != x:
-            parent[x] = find(parent[x])
-        return parent[x]
-
-    def union(x: str, y: str):
-        px, py = find(x), find(y)
-        if px == py:
-            return
-        if rank[px] < rank[py]:
-            px, py = py, px
-        parent[py] = px
-        if rank[px] == rank[py]:
-            rank[px] += 1
-
-    # For each pair, union their labels
-    for idx, matches in similar_pairs:
-        node_label = nodes[idx][label_col]
-        for match_idx, _sim in matches:
-            match_label = nodes[match_idx][label_col]
-            union(node_label, match_label)
-
-    # Collect final groups
-    groups_map = {}
-    for node in nodes:
-        root = find(node[label_col])
-        if root not in groups_map:
-            groups_map[root] = set()
-        groups_map[root].add(node[label_col])
-
-    return list(groups_map.values())
+    if representative != "centroid" or not len(groups):
+        return np.arange(len(groups), dtype=np.float64)
+
+    embeddings = embeddings / np.maximum(
+        np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+    )
+    membership = csr_matrix(
+        (np.ones(len(groups), dtype=np.float32), (groups, np.arange(len(groups)))),
+        shape=(int(groups.max()) + 1, len(groups)),
+    )
+    centroids = np.asarray(membership @ embeddings)
+
+    # Closest to the centroid first, then first in row order
+    return -np.einsum("ij,ij->i", embeddings, centroids[groups]).astype(np.float64)
 
 
 def _merge_nodes(
-    nodes: List[Dict[str, str]],
-    merge_groups: List[Set[str]],
-    single_fields: List[str],
-    list_fields: List[Tuple[str, str]],
+    df: pl.DataFrame,
+    groups: np.ndarray,
+    priorities: np.ndarray,
+    policy: MergePolicy,
     label_col: str,
-) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+) -> Tuple[pl.DataFrame, pl.DataFrame]:
     """
     Merges node attributes based on the provided merge groups.
 
     Args:
-        nodes: List of dicts, each representing a node's attributes.
-        merge_groups: A list of sets of labels, where each set is to be merged.
-        single_fields: Which fields get retained as single values (taken from the
-            first node in the merge group).
-        list_fields: Which fields get aggregated into a list. Each element in `list_fields`
-            is a tuple (new_field_name, old_field_name).
-        label_col: The name of the label (unique ID) in each node dict.
+        df: The nodes, one per row.
+        groups: Output of `_build_merge_groups`.
+        priorities: Output of `_get_representative_priorities`.
+        policy: Which fields are single or list valued, and the representative.
+        label_col: The name of the label (unique ID) column.
 
     Returns:
         A tuple of:
-          (1) A list of merged node dicts
-          (2) A label mapping dict from old_label -> new_label (the representative).
+          (1) The merged nodes, in order of first appearance of their group
+          (2) A label mapping frame (old_label, new_label)
     """
-    # Create mapping from old labels to their representative
-    label_mapping = {}
-    for group in merge_groups:
-        # pick a stable representative; in this example, we pick min() by alphabetical
-        representative = min(group)
-        for label in group:
-            label_mapping[label] = representative
-
-    # If a label wasn't in any merge group, map it to itself
-    for node in nodes:
-        node_label = node[label_col]
-        if node_label not in label_mapping:
-            label_mapping[node_label] = node_label
-
-    merged_nodes = {}
-    for node in nodes:
-        old_label = node[label_col]
-        new_label = label_mapping[old_label]
-
-        if new_label not in merged_nodes:
-            merged_nodes[new_label] = {}
-            # Force the "label_col" for the merged node to be the representative
-            merged_nodes[new_label][label_col] = new_label
-            # Initialize frequency counter
-            merged_nodes[new_label]["frequency"] = 1
-
-            # Copy over single-value fields from the first example node
-            for field in single_fields:
-                if field == label_col:
-                    continue  # we already set that
-                merged_nodes[new_label][field] = node.get(field, None)
-
-            # Initialize list-value fields
-            for new_field_name, old_field_name in list_fields:
-                merged_nodes[new_label][new_field_name] = [
-                    node.get(old_field_name, None)
-                ]
+    df = df.with_columns(_group=pl.Series(groups), _priority=pl.Series(priorities))
+
+    def representative(field: str) -> pl.Expr:
+        return pl.col(field).sort_by("_priority").first()
+
+    merged_df = df.group_by("_group", maintain_order=True).agg(
+        (
+            pl.col(label_col).min()
+            if policy.representative == "min_label"
+            else representative(label_col)
+        ),
+        pl.len().cast(pl.Int64).alias("frequency"),
+        *[representative(f) for f in policy.single_fields if f != label_col],
+        *[
+            pl.col(old_field_name).alias(new_field_name)
+            for new_field_name, old_field_name in policy.list_fields
+        ],
+    )
 
-        else:
-            # We are merging into an existing representative
-            merged_nodes[new_label]["frequency"] += 1
-            for new_field_name, old_field_name in list_fields:
-                merged_nodes[new_label][new_field_name].append(
-                    node.get(old_field_name, None)
-                )
+    label_mapping = (
+        df.select(pl.col(label_col).alias("old_label"), "_group")
+        .unique("old_label")
+        .join(
+            merged_df.select("_group", pl.col(label_col).alias("new_label")),
+            on="_group",
+        )
+        .drop("_group")
+    )
+
+    return merged_df.drop("_group"), label_mapping
 
-    return list(merged_nodes.values()), label_mapping
 
+def _remap_relationships(
+    df: pl.DataFrame,
+    relationship_col: str,
+    label_mapping: pl.DataFrame,
+) -> pl.DataFrame:
+    """
+    Re-maps the relationships onto the merged labels, dropping self-loops and
+    duplicates. Labels that aren't in the mapping are kept as they are.
+
+    Returns:
+        One row per source, with its `edges` (targets) and `relationships`.
+    """
+    relationships = (
+        df.select(pl.col(relationship_col).explode())
+        .drop_nulls()
+        .unnest(relationship_col)
+        .filter(
+            pl.col("source").is_not_null()
+            & (pl.col("source") != "")
+            & pl.col("target").is_not_null()
+            & (pl.col("target") != "")
+        )
+        .with_row_index("_order")
+    )
+
+    for col in ("source", "target"):
+        relationships = relationships.join(
+            label_mapping, left_on=col, right_on="old_label", how="left"
+        ).with_columns(pl.coalesce("new_label", col).alias(col)).drop("new_label")
+
+    return (
+        relationships.sort("_order")
+        .filter(pl.col("source") != pl.col("target"))
+        .unique(["source", "target"], keep="first", maintain_order=True)
+        .group_by("source", maintain_order=True)
+        .agg(
+            pl.col("target").alias("edges"),
+            pl.struct("source", "target").alias("relationships"),
+        )
+    )
 
-def deduplicate_nodes_dataframe(
+
+def deduplicate_nodes(
     df: pl.DataFrame,
     label_col: str,
     embedding_col: str,
-    single_fields: List[str],
-    list_fields: List[Tuple[str, str]],
-    relationship_col: str,
+    policy: MergePolicy,
+    relationship_col: str | None = None,
     threshold: float = 0.9,
-    max_k: int = 30,
-) -> pl.DataFrame:
+    similarity_join: SimilarityJoinConfig | None = None,
+    state: DeduplicationState | None = None,
+    embeddings: np.ndarray | None = None,
+) -> DeduplicationResult:
     """
     High-level pipeline that:
-      1) Extracts embeddings,
-      2) Finds similar node groups,
-      3) Merges them,
+      1) Finds similar nodes,
+      2) Groups them,
+      3) Merges them according to the policy,
       4) (Optionally) merges relationships,
-      5) Returns a deduplicated DataFrame and final relationship list.
+      5) Returns the deduplicated nodes with their adjacency lists.
 
     Args:
         df: Your input Polars DataFrame containing the nodes.
         label_col: Name of the column containing the unique node label (string ID).
-        embedding_col: Name of the column containing the node embeddings (List[float]).
-        single_fields: Fields to treat as single-valued in merges.
-        list_fields: Fields to treat as aggregated lists in merges.
-                     Each item is (new_field_name, old_field_name).
+        embedding_col: Name of the column containing the node embeddings.
+        policy: How to merge the nodes of a group.
         relationship_col: If present, the column containing relationships to deduplicate
                           and re-map. Typically a list of dicts with "source" and "target".
         threshold: Cosine similarity threshold for merging nodes.
-        max_k: Max # of neighbors to check in FAISS. (Optional, defaults to len(embeddings))
+        similarity_join: How to search the similar nodes.
+        state: The state of a previous run over a subset of these nodes. Only the
+               new nodes are then searched, and the groups that didn't change keep
+               their previous representatives. Starts from scratch if the state
+               can't be resumed.
+        embeddings: The embedding matrix of the nodes, if already extracted. It's
+                    only read, so several runs can share one normalized matrix.
 
     Returns:
-        A Polars DataFrame of merged nodes
+        The merged nodes, with the label mapping, which of them changed, the state
+        for the next run and the time spent in each phase.
     """
+    timings: Dict[str, float] = {}
+    similarity_join = similarity_join or SimilarityJoinConfig()
+    if relationship_col not in df.columns:
+        relationship_col = None
+
+    labels = df.get_column(label_col)
+    row_counts = _get_label_row_counts(labels)
+    # The state indexes the first row of each label
+    is_first_row = labels.is_first_distinct().to_numpy()
+
     # STEP 1: Find similar nodes
-    embeddings = df[embedding_col].to_list()
-    # If you want to override k, you can modify find_similar_nodes or pass it in
-    similar_pairs = _find_similar_nodes(embeddings, threshold, max_k)
+    with _timed(timings, "similarity_search"):
+        if embeddings is None:
+            embeddings = to_embedding_matrix(df.get_column(embedding_col))
+        index = None
+
+        if state is not None and not _can_resume(
+            state, labels, embeddings, threshold, similarity_join
+        ):
+            state = None
+
+        if state is not None:
+            sources, targets, previous_groups, indexed_rows, grown = (
+                _find_similar_pairs_incremental(
+                    state, labels, row_counts, embeddings, threshold, similarity_join
+                )
+            )
+            new_rows = np.flatnonzero((previous_groups < 0) & is_first_row)
+            add_to_similarity_index(state.index, embeddings[new_rows])
+        else:
+            if len(df):
+                index = build_similarity_index(embeddings, similarity_join)
+            sources, targets, _ = similarity_self_join(
+                embeddings, threshold, similarity_join, index=index
+            )
+            previous_groups = np.full(len(df), -1, dtype=np.int64)
+            grown = np.zeros(len(df), dtype=bool)
+            indexed_rows = np.arange(0, dtype=np.int64)
+            new_rows = np.flatnonzero(is_first_row)
+            if index is not None and len(new_rows) < len(df):
+                index = build_similarity_index(embeddings[new_rows], similarity_join)
 
     # STEP 2: Build merge groups
-    # We'll ensure we include label_col plus the single and list fields
-    fields_to_select = set([label_col] + single_fields + [lf[1] for lf in list_fields])
-    partial_df = df.select(list(fields_to_select)).to_dicts()  # List[Dict]
-    merge_groups = _build_merge_groups(similar_pairs, partial_df, label_col=label_col)
+    with _timed(timings, "merge_groups"):
+        groups = _build_merge_groups(labels, sources, targets)
+        changed = pl.Series(
+            "changed",
+            _get_changed_groups(groups, previous_groups, grown)[
+                pl.Series(groups).unique(maintain_order=True).to_numpy()
+            ],
+        )
 
     # STEP 3: Merge nodes
-    merged_nodes_list, label_mapping = _merge_nodes(
-        partial_df,
-        merge_groups,
-        single_fields,
-        list_fields,
-        label_col=label_col,
-    )
+    with _timed(timings, "merge_nodes"):
+        priorities = _get_representative_priorities(
+            embeddings, groups, policy.representative
+        )
+        merged_df, label_mapping = _merge_nodes(
+            df, groups, priorities, policy, label_col=label_col
+        )
 
     # STEP 4: Deduplicate relationships if desired
-    final_relationships = []
-    if relationship_col and (relationship_col in df.columns):
-        relationships = df[relationship_col].explode().drop_nulls().to_list()
-        seen_relationships = set()
-        for rel in relationships:
-            old_source = rel.get("source")
-            old_target = rel.get("target")
-            if not old_source or not old_target:
-                continue
-
-            new_source = label_mapping.get(old_source, old_source)
-            new_target = label_mapping.get(old_target, old_target)
-
-            # Avoid self-loops, or duplicates
-            if new_source != new_target:
-                rel_key = f"{new_source}->{new_target}"
-                if rel_key not in seen_relationships:
-                    seen_relationships.add(rel_key)
-                    final_relationships.append(
-                        {"source": new_source, "target": new_target}
-                    )
-
-    # STEP 5: Convert merged node dicts into a Polars DataFrame
-    # Optionally, you can add 'frequency', edges, or other logic here
-    merged_rows = []
-    # Build adjacency list from final_relationships
-    node_edges_map: Dict[str, List[str]] = {}
-    for r in final_relationships:
-        s, t = r["source"], r["target"]
-        node_edges_map.setdefault(s, [])
-        if t not in node_edges_map[s]:
-            node_edges_map[s].append(t)
-
-    for node_dict in merged_nodes_list:
-        row = {}
-        # Single value fields
-        for field in single_fields:
-            row[field] = node_dict.get(field, None)
-
-        # Aggregated list-value fields
-        for new_field_name, _old_field_name in list_fields:
-            row[new_field_name] = node_dict.get(new_field_name, [])
-
-        # The label and frequency
-        row[label_col] = node_dict.get(label_col, None)
-        row["frequency"] = node_dict.get("frequency", 1)
-
-        # Edges for the adjacency list
-        label_val = node_dict.get(label_col, None)
-        if label_val:
-            row["edges"] = node_edges_map.get(label_val, [])
-
-        merged_rows.append(row)
-
-    merged_df = pl.DataFrame(merged_rows)
-
-    # Assign relationships from the adjacency list to the row where the node is a source
-    if final_relationships:
-        merged_df = merged_df.join(
-            pl.DataFrame(final_relationships)
-            .group_by("source")
-            .agg(pl.struct(["source", "target"]).alias("relationships")),
-            left_on="id",
-            right_on="source",
-            how="left",
-        ).with_columns(pl.col("relationships").fill_null(pl.Series([[]])))
+    with _timed(timings, "relationships"):
+        if relationship_col:
+            adjacency = _remap_relationships(df, relationship_col, label_mapping)
+        else:
+            adjacency = pl.DataFrame(
+                schema={
+                    "source": pl.Utf8,
+                    "edges": pl.List(pl.Utf8),
+                    "relationships": RELATIONSHIP_DTYPE,
+                }
+            )
+
+    # STEP 5: Attach the adjacency list to the row where the node is a source
+    columns = [
+        *policy.single_fields,
+        *[new_field_name for new_field_name, _ in policy.list_fields],
+        *([label_col] if label_col not in policy.single_fields else []),
+        "frequency",
+        "edges",
+    ]
+    if relationship_col:
+        columns.append("relationships")
+
+    with _timed(timings, "assemble"):
+        nodes = (
+            merged_df.join(
+                adjacency,
+                left_on=label_col,
+                right_on="source",
+                how="left",
+                maintain_order="left",
+            )
+            .with_columns(
+                pl.col("edges").fill_null([]),
+                pl.col("relationships").fill_null([]),
+            )
+            .select(columns)
+        )
+        if state is not None and state.representatives is not None:
+            nodes, changed = _carry_over_representatives(
+                nodes, changed, state.representatives, label_col
+            )
+
+    if state is not None:
+        index = state.index
+
+    next_state = None
+    if index is not None:
+        state_rows = np.concatenate([indexed_rows, new_rows])
+        next_state = DeduplicationState(
+            index=index,
+            labels=labels.gather(state_rows),
+            groups=groups[state_rows],
+            threshold=threshold,
+            similarity_join=similarity_join,
+            row_counts=row_counts[state_rows],
+        )
+
+    return DeduplicationResult(nodes, label_mapping, changed, next_state, timings)
 
-    return merged_df
@@ -0,0 +1 @@
+"""unit tests."""
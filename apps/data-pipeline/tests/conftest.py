@@ -0,0 +1,3 @@
+"""Unit tests configuration module."""
+
+pytest_plugins = []
@@ -0,0 +1,138 @@
+"""Batch API resource unit test module, against an in-memory provider stub."""
+
+import json
+
+import httpx
+import pytest
+from dagster import build_init_resource_context
+from upath import UPath
+
+from data_pipeline.resources.batch_inference import batch_api_llm_resource
+from data_pipeline.resources.batch_inference.batch_api_llm_resource import (
+    BatchApiLlmResource,
+)
+from data_pipeline.resources.batch_inference.batch_llm_config import BatchLlmConfig
+
+
+class StubBatchProvider:
+    """
+    Answers the OpenAI batch routes: every batch completes on its second poll,
+    the first poll fails with a 503, and prompts containing "fail" are reported in
+    the error file.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.batches = {}
+        self.polls = 0
+
+    def _add_file(self, content: str) -> str:
+        file_id = f"file-{len(self.files)}"
+        self.files[file_id] = content
+        return file_id
+
+    def _run_batch(self, batch_id: str):
+        outputs, errors = [], []
+        for line in self.files[self.batches[batch_id]["input_file_id"]].splitlines():
+            request = json.loads(line)
+            prompt = request["body"]["messages"][-1]["content"]
+            if "fail" in prompt:
+                errors.append(
+                    {"custom_id": request["custom_id"], "error": {"code": "invalid"}}
+                )
+                continue
+
+            body = {
+                "choices": [{"message": {"content": f"answer to {prompt}"}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+            }
+            outputs.append(
+                {
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": body},
+                }
+            )
+
+        self.batches[batch_id].update(
+            status="completed",
+            output_file_id=self._add_file("\n".join(map(json.dumps, outputs))),
+            error_file_id=self._add_file("\n".join(map(json.dumps, errors)))
+            if errors
+            else None,
+        )
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if request.method == "POST" and path == "/v1/files":
+            content = request.content.decode("utf-8")
+            # The multipart body wraps the JSONL lines
+            lines = [line for line in content.splitlines() if line.startswith("{")]
+            return httpx.Response(200, json={"id": self._add_file("\n".join(lines))})
+
+        if request.method == "POST" and path == "/v1/batches":
+            batch_id = f"batch-{len(self.batches)}"
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "status": "in_progress",
+                "input_file_id": json.loads(request.content)["input_file_id"],
+            }
+            return httpx.Response(200, json=self.batches[batch_id])
+
+        if request.method == "GET" and path.startswith("/v1/batches/"):
+            self.polls += 1
+            if self.polls == 1:
+                return httpx.Response(503, text="overloaded")
+
+            batch_id = path.rsplit("/", 1)[-1]
+            if self.batches[batch_id]["status"] == "in_progress":
+                self._run_batch(batch_id)
+            return httpx.Response(200, json=self.batches[batch_id])
+
+        if request.method == "GET" and path.endswith("/content"):
+            return httpx.Response(200, text=self.files[path.split("/")[-2]])
+
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def provider(monkeypatch, tmp_path):
+    """Routes the resource to the stub and keeps its files in a temporary directory."""
+    monkeypatch.setattr(
+        batch_api_llm_resource, "BATCH_STORAGE_DIRECTORY", UPath(tmp_path)
+    )
+    monkeypatch.setattr(batch_api_llm_resource.time, "sleep", lambda _: None)
+    return StubBatchProvider()
+
+
+def test_submit_poll_and_collect(provider):
+    """Test that every round is submitted, polled through errors and collected."""
+    resource = BatchApiLlmResource(
+        llm_config=BatchLlmConfig(
+            api_key="key",
+            base_url="http://provider/v1",
+            inference_config={"model": "stub"},
+            input_cpm=1_000_000,
+            output_cpm=1_000_000,
+            poll_interval=0,
+        ),
+        completion_cache_enabled=False,
+    )
+    context = build_init_resource_context()
+    resource.setup_for_execution(context)
+    resource._client = httpx.Client(
+        base_url="http://provider/v1", transport=httpx.MockTransport(provider.handle)
+    )
+
+    completions, cost = resource.get_prompt_sequences_completions_batch(
+        [["first", lambda answer: f"then {answer}"], ["second"], ["fail"]]
+    )
+    resource.teardown_after_execution(context)
+
+    assert completions == [
+        ["answer to first", "answer to then answer to first"],
+        ["answer to second"],
+        [],
+    ]
+    # Two rounds, three successful requests of 10 input and 5 output tokens
+    assert cost == 45
+    assert len(provider.batches) == 2
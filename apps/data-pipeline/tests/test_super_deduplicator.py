@@ -0,0 +1,113 @@
+"""Incremental deduplication unit test module."""
+
+import numpy as np
+import polars as pl
+from upath import UPath
+
+from data_pipeline.utils.similarity_join import SimilarityJoinConfig
+from data_pipeline.utils.super_deduplicator import (
+    DeduplicationState,
+    MergePolicy,
+    deduplicate_nodes,
+)
+
+DIMENSIONS = 16
+POLICY = MergePolicy(["description", "embedding"], [("ids", "id")])
+
+
+def make_nodes(n: int, start: int, seed: int) -> pl.DataFrame:
+    """Nodes scattered around a few topics, so that many of them get merged."""
+    rng = np.random.default_rng(seed)
+    topics = np.random.default_rng(0).normal(size=(40, DIMENSIONS))
+    embeddings = topics[rng.integers(0, len(topics), n)]
+    embeddings += rng.normal(scale=0.1, size=embeddings.shape)
+    return pl.DataFrame(
+        {
+            "id": [f"node{i}" for i in range(start, start + n)],
+            "description": [f"description {i}" for i in range(start, start + n)],
+            "embedding": pl.Series(embeddings.astype(np.float32)).cast(
+                pl.Array(pl.Float32, DIMENSIONS)
+            ),
+        }
+    )
+
+
+def get_groups(nodes: pl.DataFrame) -> list:
+    return sorted(sorted(ids) for ids in nodes.get_column("ids").to_list())
+
+
+def test_incremental_runs_match_a_full_run(tmp_path):
+    """Test that two incremental runs merge the nodes like one run from scratch."""
+    batches = [make_nodes(200, 0, seed=1), make_nodes(100, 200, seed=2)]
+    args = dict(
+        label_col="id",
+        embedding_col="embedding",
+        policy=POLICY,
+        threshold=0.95,
+        similarity_join=SimilarityJoinConfig(kind="flat", max_k=None),
+    )
+
+    first = deduplicate_nodes(batches[0], **args)
+    first.state.save(UPath(tmp_path))
+    state = DeduplicationState.load(UPath(tmp_path))
+
+    incremental = deduplicate_nodes(pl.concat(batches), state=state, **args)
+    full = deduplicate_nodes(pl.concat(batches), **args)
+
+    assert incremental.state.index.ntotal == 300
+    assert get_groups(incremental.nodes) == get_groups(full.nodes)
+    # The groups of the first run that got no new nodes didn't change
+    previous = {frozenset(ids) for ids in first.nodes.get_column("ids").to_list()}
+    assert incremental.changed.to_list() == [
+        frozenset(ids) not in previous
+        for ids in incremental.nodes.get_column("ids").to_list()
+    ]
+
+
+def test_state_is_not_resumed_with_another_index(tmp_path):
+    """Test that changing the similarity join config starts from scratch."""
+    nodes = make_nodes(100, 0, seed=1)
+    args = dict(
+        label_col="id", embedding_col="embedding", policy=POLICY, threshold=0.95
+    )
+
+    first = deduplicate_nodes(
+        nodes, similarity_join=SimilarityJoinConfig(kind="flat"), **args
+    )
+    first.state.save(UPath(tmp_path))
+
+    rerun = deduplicate_nodes(
+        nodes,
+        state=DeduplicationState.load(UPath(tmp_path)),
+        similarity_join=SimilarityJoinConfig(kind="flat", pca_dimensions=8),
+        **args,
+    )
+
+    assert rerun.changed.all()
+
+
+def test_reused_label_changes_its_group(tmp_path):
+    """Test that a group is changed when a new batch emits one of its labels again."""
+    nodes = make_nodes(100, 0, seed=1)
+    args = dict(
+        label_col="id", embedding_col="embedding", policy=POLICY, threshold=0.95
+    )
+
+    first = deduplicate_nodes(nodes, **args)
+    single = first.nodes.filter(pl.col("frequency") == 1).get_column("id")[0]
+    first.state.representatives = first.nodes.select("id", "description")
+    first.state.save(UPath(tmp_path))
+
+    reused = nodes.filter(pl.col("id") == single).with_columns(
+        description=pl.lit("emitted again")
+    )
+    rerun = deduplicate_nodes(
+        pl.concat([nodes, reused]),
+        state=DeduplicationState.load(UPath(tmp_path)),
+        **args,
+    )
+
+    changed = rerun.nodes.filter(rerun.changed)
+    assert changed.get_column("id").to_list() == [single]
+    assert changed.get_column("frequency").to_list() == [2]
+    assert rerun.state.labels.n_unique() == len(rerun.state.labels) == 100
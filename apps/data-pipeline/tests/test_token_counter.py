@@ -0,0 +1,57 @@
+"""Token counter unit test module."""
+
+from data_pipeline.resources.batch_inference.token_counter import (
+    TRUNCATION_MARKER,
+    count_messages_tokens,
+    fit_messages_to_budget,
+)
+
+
+def test_fit_messages_to_budget_keeps_fitting_messages():
+    """Test that messages within the budget are returned unchanged."""
+    messages = [{"role": "user", "content": "short prompt"}]
+
+    assert fit_messages_to_budget(messages, 1000) is messages
+
+
+def test_fit_messages_to_budget_truncates_the_longest_middle():
+    """Test that only the middle of the longest message is dropped."""
+    document = "start " + "filler text " * 2000 + " end"
+    messages = [
+        {"role": "system", "content": "instructions"},
+        {"role": "user", "content": [{"type": "text", "text": document}]},
+    ]
+
+    fitted = fit_messages_to_budget(messages, 500)
+
+    assert fitted is not None
+    assert count_messages_tokens(fitted) <= 500
+    assert fitted[0] == messages[0]
+    text = fitted[1]["content"][0]["text"]
+    assert text.startswith("start") and text.endswith("end")
+    assert TRUNCATION_MARKER in text
+    # The input is left untouched
+    assert messages[1]["content"][0]["text"] == document
+
+
+def test_fit_messages_to_budget_rejects_impossible_budgets():
+    """Test that None is returned when truncating one message can't be enough."""
+    messages = [
+        {"role": "system", "content": "instructions " * 200},
+        {"role": "user", "content": "question " * 300},
+    ]
+
+    assert fit_messages_to_budget(messages, 100) is None
+
+
+def test_fit_messages_to_budget_truncates_non_english_text():
+    """Test that truncated non-English text fits the budget too."""
+    document = "début " + "日本語のテキスト" * 2000 + " fin"
+    messages = [{"role": "user", "content": document}]
+
+    fitted = fit_messages_to_budget(messages, 500)
+
+    assert fitted is not None
+    assert count_messages_tokens(fitted) <= 500
+    text = fitted[0]["content"]
+    assert text.startswith("début") and text.endswith("fin")
@@ -1,39 +1,264 @@
+import asyncio
+import base64
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, List, Tuple
+
+import numpy as np
 import torch
 from ray import serve
 from sentence_transformers import SentenceTransformer
+from starlette.responses import JSONResponse
+
+# Requests arriving within the wait window are encoded together
+MAX_BATCHED_REQUESTS = 64
+BATCH_WAIT_TIMEOUT_S = 0.05
+# Padded tokens per forward pass, sized for NV-Embed-v2 on an 80GB A100
+MAX_BATCH_TOKENS = 65_536
+
+# Replicas scale on the number of queued + running requests. Micro-batching needs a
+# few requests waiting on each replica, so we don't scale up on a single one.
+MAX_ONGOING_REQUESTS = 32
+AUTOSCALING_CONFIG = {
+    "min_replicas": 0,
+    "max_replicas": 4,
+    "target_ongoing_requests": 8,
+    "upscale_delay_s": 30,
+    "downscale_delay_s": 300,
+}
+# Batches considered for the metrics endpoint
+METRICS_WINDOW = 200
+
+
+@dataclass
+class BatchStats:
+    requests: int
+    texts: int
+    tokens: int
+    queue_wait: float
+    encode_time: float
+
+
+class MicroBatchEncoder:
+    """
+    Encodes the texts of many requests at once. Texts are sorted by token length and
+    packed into forward passes of at most `max_batch_tokens`, counting padding to the
+    longest text of the batch. A batch running out of GPU memory is split in halves
+    and retried; a text that doesn't fit even on its own gets a NaN row.
+    """
+
+    def __init__(self, model: Any, max_batch_tokens: int = MAX_BATCH_TOKENS):
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        input_ids = self.model.tokenizer(
+            texts, truncation=True, max_length=self.model.max_seq_length
+        )["input_ids"]
+        return [len(ids) for ids in input_ids]
+
+    def pack(self, lengths: List[int]) -> List[List[int]]:
+        """Groups text indices into batches, longest texts first."""
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+
+        batches: List[List[int]] = []
+        for i in order:
+            batch = batches[-1] if batches else None
+            # Sorted by decreasing length: the first text sets the padded length
+            if batch and (len(batch) + 1) * lengths[batch[0]] <= self.max_batch_tokens:
+                batch.append(i)
+            else:
+                batches.append([i])
+        return batches
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        try:
+            return self.model.encode(
+                texts,
+                batch_size=len(texts),
+                normalize_embeddings=False,
+                convert_to_numpy=True,
+            ).astype(np.float32)
+        except torch.cuda.OutOfMemoryError:
+            torch.cuda.empty_cache()
+            if len(texts) == 1:
+                return np.full(
+                    (1, self.model.get_sentence_embedding_dimension()),
+                    np.nan,
+                    dtype=np.float32,
+                )
+
+            half = len(texts) // 2
+            return np.concatenate(
+                [self._encode_batch(texts[:half]), self._encode_batch(texts[half:])]
+            )
+
+    def encode(self, texts: List[str], lengths: List[int] | None = None) -> np.ndarray:
+        """Returns the (unnormalized) float32 embeddings in the input order."""
+        embeddings = np.empty(
+            (len(texts), self.model.get_sentence_embedding_dimension()),
+            dtype=np.float32,
+        )
+        for batch in self.pack(lengths or self.count_tokens(texts)):
+            embeddings[batch] = self._encode_batch([texts[i] for i in batch])
+        return embeddings
+
+
+def encode_response(
+    embeddings: np.ndarray, normalize_embeddings: bool, encoding: str, dtype: str
+) -> dict:
+    """
+    Serializes the embeddings of a request. The rows of texts that didn't fit in GPU
+    memory (NaN) are listed in "failed", and sent as nulls ("json") or NaN rows
+    ("base64"), so that the other rows of the request aren't lost.
+    """
+    failed = np.flatnonzero(np.isnan(embeddings).any(axis=1))
+
+    if normalize_embeddings:
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
 
+    if encoding == "base64":
+        buffer = np.ascontiguousarray(
+            embeddings, dtype=np.dtype(dtype).newbyteorder("<")
+        )
+        return {
+            "embeddings": base64.b64encode(buffer.tobytes()).decode("ascii"),
+            "dtype": dtype,
+            "shape": list(buffer.shape),
+            "failed": failed.tolist(),
+        }
 
-@serve.deployment(ray_actor_options={"num_gpus": 1})
+    rows = embeddings.tolist()
+    for i in failed:
+        rows[i] = None
+    return {"embeddings": rows, "failed": failed.tolist()}
+
+
+@serve.deployment(
+    ray_actor_options={"num_gpus": 1},
+    max_ongoing_requests=MAX_ONGOING_REQUESTS,
+    autoscaling_config=AUTOSCALING_CONFIG,
+)
 class EmbeddingService:
-    def __init__(self, model_name="nvidia/NV-Embed-v2"):
+    def __init__(
+        self,
+        model_name="nvidia/NV-Embed-v2",
+        max_batch_tokens: int = MAX_BATCH_TOKENS,
+    ):
         self.model = SentenceTransformer(model_name, trust_remote_code=True)
         self.model.max_seq_length = 32768
         self.model.tokenizer.padding_side = "right"
 
+        self.encoder = MicroBatchEncoder(self.model, max_batch_tokens)
+
+        self.batch_stats: Deque[BatchStats] = deque(maxlen=METRICS_WINDOW)
+        self.ongoing_requests = 0
+
+    @serve.batch(
+        max_batch_size=MAX_BATCHED_REQUESTS, batch_wait_timeout_s=BATCH_WAIT_TIMEOUT_S
+    )
+    async def _encode_batched(
+        self, requests: List[Tuple[float, List[str]]]
+    ) -> List[np.ndarray]:
+        """Each request is (arrival time, texts)."""
+        started_at = time.monotonic()
+        texts = [text for _, inputs in requests for text in inputs]
+        lengths = self.encoder.count_tokens(texts)
+        # Off the event loop, so that the next requests can queue up meanwhile
+        embeddings = await asyncio.to_thread(self.encoder.encode, texts, lengths)
+
+        self.batch_stats.append(
+            BatchStats(
+                requests=len(requests),
+                texts=len(texts),
+                tokens=sum(lengths),
+                queue_wait=float(
+                    np.mean([started_at - arrival for arrival, _ in requests])
+                ),
+                encode_time=time.monotonic() - started_at,
+            )
+        )
+
+        offsets = np.cumsum([0] + [len(inputs) for _, inputs in requests])
+        return [embeddings[offsets[i] : offsets[i + 1]] for i in range(len(requests))]
+
+    def _get_running_replicas(self) -> int | None:
+        try:
+            app_name = serve.get_replica_context().app_name
+            deployment = serve.status().applications[app_name].deployments[
+                "EmbeddingService"
+            ]
+            return deployment.replica_states.get("RUNNING", 0)
+        except Exception:
+            return None
+
+    async def get_metrics(self) -> dict:
+        """
+        Stats of this replica over the last METRICS_WINDOW batches, plus the current
+        capacity of the deployment so that clients can size their concurrency.
+        """
+        stats = list(self.batch_stats)
+        n_batches = max(1, len(stats))
+        encode_time = sum(batch.encode_time for batch in stats)
+
+        return {
+            "replica": serve.get_replica_context().replica_tag,
+            "running_replicas": await asyncio.to_thread(self._get_running_replicas),
+            "max_replicas": AUTOSCALING_CONFIG["max_replicas"],
+            "target_ongoing_requests": AUTOSCALING_CONFIG["target_ongoing_requests"],
+            "max_ongoing_requests": MAX_ONGOING_REQUESTS,
+            "ongoing_requests": self.ongoing_requests,
+            "batches": len(stats),
+            "avg_batch_requests": sum(b.requests for b in stats) / n_batches,
+            "avg_batch_texts": sum(b.texts for b in stats) / n_batches,
+            "tokens_per_s": sum(b.tokens for b in stats) / encode_time
+            if encode_time
+            else 0.0,
+            "avg_queue_wait_s": sum(b.queue_wait for b in stats) / n_batches,
+            "avg_encode_time_s": encode_time / n_batches,
+        }
+
     async def __call__(self, request):
-        data = await request.json()
+        if request.method == "GET" and request.url.path.rstrip("/").endswith(
+            "/metrics"
+        ):
+            return await self.get_metrics()
+
+        self.ongoing_requests += 1
+        try:
+            return await self._embed(await request.json())
+        finally:
+            self.ongoing_requests -= 1
+
+    async def _embed(self, data: dict) -> dict:
+        arrived_at = time.monotonic()
 
         inputs = data.get("inputs", [])
 
         if not inputs:
             return {"embeddings": []}
 
+        # batch_size is ignored: batches are packed by token budget across requests
         normalize_embeddings = data.get("normalize_embeddings", True)
-        batch_size = data.get("batch_size", 1)
+        # "json" returns float lists, "base64" a base64-encoded little-endian buffer
+        encoding = data.get("encoding", "json")
+        dtype = data.get("dtype", "float32")
+
+        if encoding not in ("json", "base64") or dtype not in ("float32", "float16"):
+            return JSONResponse(
+                {"error": f"Unsupported encoding {encoding} with dtype {dtype}"},
+                status_code=400,
+            )
 
         inputs_w_eos = [i + self.model.tokenizer.eos_token for i in inputs]
 
         try:
-            embeddings = self.model.encode(
-                inputs_w_eos,
-                normalize_embeddings=normalize_embeddings,
-                batch_size=batch_size,
-            )
+            embeddings = await self._encode_batched((arrived_at, inputs_w_eos))
         except Exception as e:
-            torch.cuda.empty_cache()
-            return {"error": str(e)}
+            return JSONResponse({"error": str(e)}, status_code=500)
 
-        return {"embeddings": embeddings.tolist()}
+        return encode_response(embeddings, normalize_embeddings, encoding, dtype)
 
 
 app = EmbeddingService.bind()
@@ -0,0 +1,106 @@
+"""MicroBatchEncoder unit tests, runnable on CPU."""
+
+import numpy as np
+import pytest
+import torch
+
+from nvembed_ray_serve.main import MicroBatchEncoder, encode_response
+
+
+class FakeTokenizer:
+    def __call__(self, texts, truncation=True, max_length=None):
+        return {"input_ids": [list(range(len(text.split()))) for text in texts]}
+
+
+class FakeModel:
+    """Embeds a text as its number of words, running out of memory on big batches."""
+
+    max_seq_length = 512
+    tokenizer = FakeTokenizer()
+
+    def __init__(self, max_words_per_batch=None):
+        self.max_words_per_batch = max_words_per_batch
+        self.batches = []
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+    def encode(self, texts, batch_size, normalize_embeddings, convert_to_numpy):
+        words = sum(len(text.split()) for text in texts)
+        if self.max_words_per_batch is not None and words > self.max_words_per_batch:
+            raise torch.cuda.OutOfMemoryError("CUDA out of memory")
+        self.batches.append(len(texts))
+        return np.array([[len(text.split()), 1.0] for text in texts])
+
+
+def test_pack_respects_token_budget():
+    encoder = MicroBatchEncoder(FakeModel(), max_batch_tokens=10)
+    lengths = [1, 5, 2, 5, 3]
+
+    batches = encoder.pack(lengths)
+
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) * max(lengths[i] for i in batch) <= 10
+    # Longest texts first
+    assert batches[0] == [1, 3]
+
+
+def test_encode_restores_input_order():
+    texts = ["a b c", "a", "a b c d e", "a b"]
+    encoder = MicroBatchEncoder(FakeModel(), max_batch_tokens=6)
+
+    embeddings = encoder.encode(texts)
+
+    assert embeddings.dtype == np.float32
+    assert embeddings[:, 0].tolist() == [3, 1, 5, 2]
+
+
+def test_encode_splits_batches_on_oom():
+    model = FakeModel(max_words_per_batch=4)
+    encoder = MicroBatchEncoder(model, max_batch_tokens=100)
+
+    embeddings = encoder.encode(["a b", "a b", "a b", "a b c d e"])
+
+    assert embeddings[:3, 0].tolist() == [2, 2, 2]
+    # Doesn't fit even on its own
+    assert np.isnan(embeddings[3]).all()
+    assert max(model.batches) <= 2
+
+
+def test_response_keeps_the_rows_that_fit_on_oom():
+    model = FakeModel(max_words_per_batch=4)
+    embeddings = MicroBatchEncoder(model, max_batch_tokens=100).encode(
+        ["a b", "a b c d e", "a b c"]
+    )
+
+    response = encode_response(embeddings, True, "json", "float32")
+
+    assert response["failed"] == [1]
+    assert response["embeddings"][1] is None
+    np.testing.assert_allclose(
+        np.linalg.norm(response["embeddings"][0]), 1.0, rtol=1e-6
+    )
+    assert response["embeddings"][2] is not None
+
+    response = encode_response(embeddings, True, "base64", "float16")
+
+    assert response["failed"] == [1]
+    assert response["shape"] == [3, 2]
+
+
+def test_encode_matches_sentence_transformers():
+    sentence_transformers = pytest.importorskip("sentence_transformers")
+    try:
+        model = sentence_transformers.SentenceTransformer(
+            "sentence-transformers-testing/stsb-bert-tiny-safetensors", device="cpu"
+        )
+    except OSError:
+        pytest.skip("Tiny test model not available")
+
+    texts = ["short", "a much longer sentence than the others", "medium length"]
+    encoder = MicroBatchEncoder(model, max_batch_tokens=16)
+
+    np.testing.assert_allclose(
+        encoder.encode(texts), model.encode(texts), rtol=1e-4, atol=1e-5
+    )
@@ -1,41 +1,63 @@
 import os
-from collections.abc import Generator
-from contextlib import contextmanager
 from functools import lru_cache
+from pathlib import Path
 
 import joblib
-import networkx as nx
 import polars as pl
-import psycopg
 from ai_agents.embeddings.base_embedder_client import BaseEmbedderClient
 from ai_agents.embeddings.deepinfra_embedder_client import DeepInfraEmbedderClient
 from attr import dataclass
-from pgvector.psycopg import register_vector
-from psycopg_pool import ConnectionPool
+from fastapi import Depends
+from pgvector.psycopg import register_vector_async
+from psycopg_pool import AsyncConnectionPool
 from sklearn.decomposition import PCA
 
+from query_service.graph_store import (
+    AzureGraphSource,
+    GraphStore,
+    LoadedGraph,
+    LocalGraphSource,
+)
+
 # TODO: get this from auth
-CONST_NODES_PATH = "/Users/ma9o/Desktop/enclaveid/apps/data-pipeline/data/dagster/whatsapp_nodes_deduplicated/00393494197577/0034689896443.snappy"
+CONST_TENANT_ID = "00393494197577/0034689896443"
+NODES_PATH_TEMPLATE = (
+    "/Users/ma9o/Desktop/enclaveid/apps/data-pipeline/data/dagster"
+    "/whatsapp_nodes_deduplicated/{tenant_id}.snappy"
+)
+NODES_BLOB_PATH_TEMPLATE = "dagster/whatsapp_nodes_deduplicated/{tenant_id}.snappy"
 CONST_SUBGRAPHS_PATH = "/Users/ma9o/Desktop/enclaveid/apps/data-pipeline/data/dagster/whatsapp_chunks_subgraphs/00393494197577/0034689896443.snappy"
 
 MAX_USERS_CACHE_SIZE = 10  # Cache 10 users (once auth implemented)
+GRAPH_STORE_MEMORY_BUDGET = (
+    int(os.getenv("GRAPH_STORE_MEMORY_BUDGET_MB", "4096")) * 2**20
+)
+GRAPH_STORE_INDEX_DIRECTORY = Path(
+    os.getenv("GRAPH_STORE_INDEX_DIRECTORY", "/tmp/query-service/similarity_indexes")
+)
 
 
-@lru_cache(maxsize=MAX_USERS_CACHE_SIZE)
-def get_graph_df() -> tuple[nx.DiGraph, pl.DataFrame]:
-    df = pl.read_parquet(CONST_NODES_PATH)
-    G = nx.DiGraph()
-    for row in df.iter_rows(named=True):
-        G.add_node(
-            row["id"],
-            description=row["proposition"],
-            frequency=row["frequency"],
-            user=row["user"],
-            datetime=row["datetimes"],
-            chunk_ids=row["chunk_ids"],
-        )
-        G.add_edges_from([(row["id"], e) for e in row["edges"]])
-    return G, df
+def get_tenant_id() -> str:
+    return CONST_TENANT_ID
+
+
+@lru_cache(maxsize=1)
+def get_graph_store() -> GraphStore:
+    source = (
+        AzureGraphSource(NODES_BLOB_PATH_TEMPLATE)
+        if os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
+        else LocalGraphSource(NODES_PATH_TEMPLATE)
+    )
+    return GraphStore(
+        source,
+        index_directory=GRAPH_STORE_INDEX_DIRECTORY,
+        memory_budget=GRAPH_STORE_MEMORY_BUDGET,
+    )
+
+
+# Sync so that FastAPI runs it in a worker thread: loading a graph is blocking
+def get_graph(tenant_id: str = Depends(get_tenant_id)) -> LoadedGraph:
+    return get_graph_store().get(tenant_id)
 
 
 @lru_cache(maxsize=MAX_USERS_CACHE_SIZE)
@@ -48,26 +70,29 @@ def get_embedder_client() -> BaseEmbedderClient:
     return DeepInfraEmbedderClient(api_key=os.environ["DEEPINFRA_API_KEY"])
 
 
-# The pool is shared across requests
-@lru_cache(maxsize=1)
-def _get_db_pool() -> ConnectionPool:
-    return ConnectionPool(
-        "postgresql://ma9o@localhost:5432/enclaveid",  # TODO it doesnt seem to get the one from .env idk why
-        min_size=1,
-        max_size=10,  # TODO
-        configure=lambda conn: register_vector(conn),
-    )
+DATABASE_URL = os.getenv(
+    "DATABASE_URL", "postgresql://ma9o@localhost:5432/enclaveid"
+)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Server-side limit, so a slow query only holds its own connection
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
 
 
-# Each request gets a new connection from the pool
-@contextmanager
-def get_db() -> Generator[psycopg.Connection, None, None]:
-    pool = _get_db_pool()
-    conn = pool.getconn()
-    try:
-        yield conn
-    finally:
-        pool.putconn(conn)
+# The pool is shared across requests, opened and closed with the app
+@lru_cache(maxsize=1)
+def get_db_pool() -> AsyncConnectionPool:
+    return AsyncConnectionPool(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        kwargs={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+        configure=register_vector_async,
+        open=False,
+    )
 
 
 @dataclass
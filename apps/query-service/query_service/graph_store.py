@@ -0,0 +1,181 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Protocol
+
+import polars as pl
+from ai_agents.graph_explorer_agent.compact_graph import CompactGraph
+from ai_agents.graph_explorer_agent.utils.similarity_index import SimilarityIndex
+from azure.storage.blob import BlobServiceClient
+
+
+class GraphSource(Protocol):
+    """Where the nodes parquet of each tenant lives."""
+
+    def get_version(self, tenant_id: str) -> str:
+        """Changes whenever the parquet is rewritten (mtime, etag...)."""
+        ...
+
+    def read(self, tenant_id: str) -> pl.DataFrame: ...
+
+
+class LocalGraphSource:
+    def __init__(self, path_template: str):
+        # e.g. ".../whatsapp_nodes_deduplicated/{tenant_id}.snappy"
+        self.path_template = path_template
+
+    def _get_path(self, tenant_id: str) -> str:
+        return self.path_template.format(tenant_id=tenant_id)
+
+    def get_version(self, tenant_id: str) -> str:
+        stat = os.stat(self._get_path(tenant_id))
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def read(self, tenant_id: str) -> pl.DataFrame:
+        return pl.read_parquet(self._get_path(tenant_id))
+
+
+class AzureGraphSource:
+    def __init__(self, blob_path_template: str):
+        account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
+        account_key = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
+        container_name = os.getenv("AZURE_STORAGE_CONTAINER_NAME")
+
+        if not account_name or not account_key or not container_name:
+            raise ValueError("Azure storage environment variables are not set")
+
+        connect_str = (
+            "DefaultEndpointsProtocol=https;"
+            f"AccountName={account_name};"
+            f"AccountKey={account_key};"
+            "EndpointSuffix=core.windows.net"
+        )
+        self.container_client = BlobServiceClient.from_connection_string(
+            connect_str
+        ).get_container_client(container_name)
+        self.blob_path_template = blob_path_template
+
+    def _get_blob_client(self, tenant_id: str):
+        return self.container_client.get_blob_client(
+            self.blob_path_template.format(tenant_id=tenant_id)
+        )
+
+    def get_version(self, tenant_id: str) -> str:
+        return self._get_blob_client(tenant_id).get_blob_properties().etag
+
+    def read(self, tenant_id: str) -> pl.DataFrame:
+        data = self._get_blob_client(tenant_id).download_blob().readall()
+        return pl.read_parquet(io.BytesIO(data))
+
+
+@dataclass
+class LoadedGraph:
+    graph: CompactGraph
+    similarity_index: SimilarityIndex
+    version: str
+    nbytes: int
+    # Last time the version was checked against the source
+    validated_at: float
+
+
+class GraphStore:
+    """
+    Per-tenant cache of the graph and its similarity index.
+
+    Graphs are loaded on first use and the least recently used ones are evicted once
+    the loaded graphs add up to more than `memory_budget` bytes. A graph is reloaded
+    when the version of its source changes, which is checked at most every
+    `revalidate_interval` seconds. Similarity indexes are persisted under
+    `index_directory`, so reloads only rebuild them when the source changed.
+    """
+
+    def __init__(
+        self,
+        source: GraphSource,
+        index_directory: Path,
+        memory_budget: int,
+        revalidate_interval: float = 30,
+    ):
+        self.source = source
+        self.index_directory = index_directory
+        self.memory_budget = memory_budget
+        self.revalidate_interval = revalidate_interval
+
+        self._graphs: OrderedDict[str, LoadedGraph] = OrderedDict()
+        self._lock = threading.Lock()
+        self._tenant_locks: dict[str, threading.Lock] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(loaded.nbytes for loaded in self._graphs.values())
+
+    def _load_or_build_similarity_index(
+        self, tenant_id: str, version: str, df: pl.DataFrame
+    ) -> SimilarityIndex:
+        directory = self.index_directory / tenant_id
+        version_path = directory / "version"
+
+        if version_path.exists() and version_path.read_text() == version:
+            return SimilarityIndex.load(directory)
+
+        index = SimilarityIndex.from_nodes_df(df)
+        index.save(directory)
+        version_path.write_text(version)
+        return index
+
+    def _load(self, tenant_id: str, version: str) -> LoadedGraph:
+        df = self.source.read(tenant_id)
+        graph = CompactGraph.from_nodes_df(df, version=f"{tenant_id}:{version}")
+        index = self._load_or_build_similarity_index(tenant_id, version, df)
+
+        return LoadedGraph(
+            graph=graph,
+            similarity_index=index,
+            version=version,
+            # The nodes frame itself (with the embeddings) isn't kept
+            nbytes=graph.nbytes + index.nbytes,
+            validated_at=time.monotonic(),
+        )
+
+    def _evict(self) -> None:
+        # Always keep the most recently used graph, even if over budget
+        while len(self._graphs) > 1 and self.nbytes > self.memory_budget:
+            self._graphs.popitem(last=False)
+
+    def get(self, tenant_id: str) -> LoadedGraph:
+        with self._lock:
+            tenant_lock = self._tenant_locks.setdefault(tenant_id, threading.Lock())
+
+        # Concurrent requests of a tenant wait for a single load
+        with tenant_lock:
+            with self._lock:
+                loaded = self._graphs.get(tenant_id)
+
+            now = time.monotonic()
+            if loaded and now - loaded.validated_at < self.revalidate_interval:
+                with self._lock:
+                    # Another tenant's load may have evicted it in the meantime
+                    if tenant_id in self._graphs:
+                        self._graphs.move_to_end(tenant_id)
+                return loaded
+
+            version = self.source.get_version(tenant_id)
+            if loaded and loaded.version == version:
+                loaded.validated_at = now
+            else:
+                loaded = self._load(tenant_id, version)
+
+            with self._lock:
+                self._graphs[tenant_id] = loaded
+                self._graphs.move_to_end(tenant_id)
+                self._evict()
+
+            return loaded
+
+    def invalidate(self, tenant_id: str) -> None:
+        with self._lock:
+            self._graphs.pop(tenant_id, None)
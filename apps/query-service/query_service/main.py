@@ -1,36 +1,47 @@
 import asyncio
 import logging
-from typing import Tuple
+from contextlib import asynccontextmanager
+from typing import Literal
 
-import networkx as nx
 import numpy as np
 import polars as pl
 import psycopg
 from ai_agents.embeddings.base_embedder_client import BaseEmbedderClient
 from ai_agents.graph_explorer_agent.actions.get_causal_chain import get_causal_chain
+from ai_agents.graph_explorer_agent.actions.get_neighborhood import get_neighborhood
 from ai_agents.graph_explorer_agent.actions.get_raw_data import get_raw_data
 from ai_agents.graph_explorer_agent.actions.get_relatives import (
     get_children,
     get_parents,
 )
-from ai_agents.graph_explorer_agent.actions.get_similar_nodes import get_similar_nodes
+from ai_agents.graph_explorer_agent.actions.get_similar_nodes import (
+    get_similar_nodes,
+    get_similar_nodes_batch,
+)
 from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from psycopg.rows import dict_row
-from pydantic import BaseModel
+from psycopg_pool import AsyncConnectionPool
+from pydantic import BaseModel, Field
 from sklearn.decomposition import PCA  # noqa: I001
 
 from query_service.dependencies import (
     PCAReducers,
-    get_db,
+    get_db_pool,
     get_embedder_client,
-    get_graph_df,
+    get_graph,
     get_pca_reducers,
     get_raw_data_df,
 )
+from query_service.graph_store import LoadedGraph
 from query_service.pad_vectors import pad_vectors
 from query_service.pre_init import pre_init
 
+# Limits of the batch endpoints
+MAX_BATCH_SIZE = 100
+MAX_NEIGHBORHOOD_DEPTH = 3
+MAX_NEIGHBORHOOD_NODES = 2000
+
 
 class QueryRequest(BaseModel):
     query: str
@@ -47,9 +58,36 @@ class NodeRequest(BaseModel):
     node_id: str
 
 
+class NodesRequest(BaseModel):
+    node_ids: list[str] = Field(max_length=MAX_BATCH_SIZE)
+
+
+class NeighborhoodRequest(BaseModel):
+    node_ids: list[str] = Field(max_length=MAX_BATCH_SIZE)
+    depth: int = Field(1, ge=1, le=MAX_NEIGHBORHOOD_DEPTH)
+    fan_out: int = Field(20, ge=1, le=MAX_NEIGHBORHOOD_NODES)
+    direction: Literal["in", "out", "both"] = "both"
+    max_nodes: int = Field(500, ge=1, le=MAX_NEIGHBORHOOD_NODES)
+
+
+class SimilarNodesBatchRequest(BaseModel):
+    queries: list[str] = Field(max_length=MAX_BATCH_SIZE)
+    top_k: int = Field(10, ge=1, le=100)
+    threshold: float = 0.6
+
+
 pre_init()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pool = get_db_pool()
+    await pool.open()
+    yield
+    await pool.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -60,9 +98,6 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# TODO: this is just for dev
-similar_nodes_semaphore = asyncio.Semaphore(1)
-
 # Get the logger
 logger = logging.getLogger(__name__)
 
@@ -70,33 +105,30 @@ logger = logging.getLogger(__name__)
 @app.post("/similar_nodes")
 async def similar_nodes(
     request: QueryRequest,
-    graph_and_df: Tuple[nx.DiGraph, pl.DataFrame] = Depends(get_graph_df),
+    loaded: LoadedGraph = Depends(get_graph),
     embedder_client: BaseEmbedderClient = Depends(get_embedder_client),
 ):
     """Get similar nodes for a query."""
-    async with similar_nodes_semaphore:  # This ensures only one request runs at a time
-        try:
-            G, df = graph_and_df
-            label_embeddings = df.select("id", "embedding").to_dicts()
-            return await get_similar_nodes(
-                G,
-                label_embeddings,
-                embedder_client,
-                request.query,
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e)) from e
+    try:
+        return await get_similar_nodes(
+            loaded.graph,
+            loaded.similarity_index,
+            embedder_client,
+            request.query,
+            use_lock=False,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
 
 
 @app.post("/causal_chain")
 async def causal_chain(
     request: CausalChainRequest,
-    graph_and_df: Tuple[nx.DiGraph, pl.DataFrame] = Depends(get_graph_df),
+    loaded: LoadedGraph = Depends(get_graph),
 ):
     """Get causal chain between two nodes."""
     try:
-        G, _ = graph_and_df
-        return get_causal_chain(G, request.node_id1, request.node_id2)
+        return get_causal_chain(loaded.graph, request.node_id1, request.node_id2)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
@@ -104,12 +136,11 @@ async def causal_chain(
 @app.post("/parents")
 async def parents(
     request: NodeRequest,
-    graph_and_df: Tuple[nx.DiGraph, pl.DataFrame] = Depends(get_graph_df),
+    loaded: LoadedGraph = Depends(get_graph),
 ):
     """Get parent nodes."""
     try:
-        G, _ = graph_and_df
-        return get_parents(G, request.node_id)
+        return get_parents(loaded.graph, request.node_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
@@ -117,12 +148,11 @@ async def parents(
 @app.post("/children")
 async def children(
     request: NodeRequest,
-    graph_and_df: Tuple[nx.DiGraph, pl.DataFrame] = Depends(get_graph_df),
+    loaded: LoadedGraph = Depends(get_graph),
 ):
     """Get child nodes."""
     try:
-        G, _ = graph_and_df
-        return get_children(G, request.node_id)
+        return get_children(loaded.graph, request.node_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
@@ -130,13 +160,100 @@ async def children(
 @app.post("/raw_data")
 async def raw_data(
     request: NodeRequest,
-    graph_and_df: Tuple[nx.DiGraph, pl.DataFrame] = Depends(get_graph_df),
+    loaded: LoadedGraph = Depends(get_graph),
     raw_data_df: pl.DataFrame = Depends(get_raw_data_df),
 ):
     """Get raw data for a node."""
     try:
-        _, nodes_df = graph_and_df
-        return get_raw_data(nodes_df, raw_data_df, request.node_id)
+        return get_raw_data(loaded.graph.attributes.df, raw_data_df, request.node_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@app.post("/similar_nodes/batch")
+async def similar_nodes_batch(
+    request: SimilarNodesBatchRequest,
+    loaded: LoadedGraph = Depends(get_graph),
+    embedder_client: BaseEmbedderClient = Depends(get_embedder_client),
+):
+    """Get similar nodes for many queries, in the order of the queries."""
+    if not request.queries:
+        return []
+    try:
+        return await get_similar_nodes_batch(
+            loaded.graph,
+            loaded.similarity_index,
+            embedder_client,
+            request.queries,
+            top_k=request.top_k,
+            threshold=request.threshold,
+            use_lock=False,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@app.post("/parents/batch")
+async def parents_batch(
+    request: NodesRequest,
+    loaded: LoadedGraph = Depends(get_graph),
+):
+    """Get the parent nodes of many nodes, by node id."""
+    try:
+        return {
+            node_id: get_parents(loaded.graph, node_id)
+            for node_id in request.node_ids
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@app.post("/children/batch")
+async def children_batch(
+    request: NodesRequest,
+    loaded: LoadedGraph = Depends(get_graph),
+):
+    """Get the child nodes of many nodes, by node id."""
+    try:
+        return {
+            node_id: get_children(loaded.graph, node_id)
+            for node_id in request.node_ids
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@app.post("/raw_data/batch")
+async def raw_data_batch(
+    request: NodesRequest,
+    loaded: LoadedGraph = Depends(get_graph),
+    raw_data_df: pl.DataFrame = Depends(get_raw_data_df),
+):
+    """Get raw data for many nodes, by node id."""
+    try:
+        return {
+            node_id: get_raw_data(loaded.graph.attributes.df, raw_data_df, node_id)
+            for node_id in request.node_ids
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@app.post("/neighborhood")
+async def neighborhood(
+    request: NeighborhoodRequest,
+    loaded: LoadedGraph = Depends(get_graph),
+):
+    """Expand nodes by a few hops, with a fan-out limit per node."""
+    try:
+        return get_neighborhood(
+            loaded.graph,
+            request.node_ids,
+            depth=request.depth,
+            fan_out=request.fan_out,
+            direction=request.direction,
+            max_nodes=request.max_nodes,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
@@ -146,7 +263,10 @@ async def _get_reduced_embeddings(
     texts: list[str],
     embedder_client: BaseEmbedderClient,
     pca_reducer: PCA,
-) -> list[list[float]]:
+) -> np.ndarray:
+    if not texts:
+        return np.empty((0, 2000), dtype=np.float32)
+
     _, embeddings = await embedder_client.get_embeddings(texts)
     return pad_vectors(pca_reducer.transform(np.array(embeddings)))
 
@@ -154,42 +274,33 @@ async def _get_reduced_embeddings(
 @app.post("/sql_query")
 async def sql_query(
     request: QueryRequest,
-    db: psycopg.Connection = Depends(get_db),
+    pool: AsyncConnectionPool = Depends(get_db_pool),
     embedder_client: BaseEmbedderClient = Depends(get_embedder_client),
     pca_reducers: PCAReducers = Depends(get_pca_reducers),
 ):
-    with db as conn:
-        cur = conn.cursor(row_factory=dict_row)
-        try:
-            # Start transaction explicitly
-            cur.execute("BEGIN")
-            embeddings = []
-
-            # Add node embeddings to the query
-            if request.to_embed_nodes:
-                node_embeddings = await _get_reduced_embeddings(
-                    request.to_embed_nodes,
-                    embedder_client,
-                    pca_reducers.nodes_reducer,
-                )
-                embeddings.extend(node_embeddings)
-
-            # Add raw data embeddings to the query
-            if request.to_embed_raw_data:
-                raw_data_embeddings = await _get_reduced_embeddings(
-                    request.to_embed_raw_data,
-                    embedder_client,
-                    pca_reducers.raw_data_reducer,
-                )
-                embeddings.extend(raw_data_embeddings)
-
-            # Add embedding types to the query
-            embedding_types = ["nodes"] * len(request.to_embed_nodes) + [
-                "rawData"
-            ] * len(request.to_embed_raw_data)
-
-            # Insert embeddings into temporary table
-            cur.execute(
+    # Embed before taking a connection, so that it's only held for the query
+    node_embeddings, raw_data_embeddings = await asyncio.gather(
+        _get_reduced_embeddings(
+            request.to_embed_nodes, embedder_client, pca_reducers.nodes_reducer
+        ),
+        _get_reduced_embeddings(
+            request.to_embed_raw_data, embedder_client, pca_reducers.raw_data_reducer
+        ),
+    )
+    embeddings = np.concatenate([node_embeddings, raw_data_embeddings])
+
+    # Add embedding types to the query
+    embedding_types = ["nodes"] * len(request.to_embed_nodes) + ["rawData"] * len(
+        request.to_embed_raw_data
+    )
+
+    try:
+        async with (
+            pool.connection() as conn,
+            conn.transaction(),
+            conn.cursor(row_factory=dict_row) as cur,
+        ):
+            await cur.execute(
                 """
                 CREATE TEMPORARY TABLE QueryEmbedding (
                     id integer,
@@ -199,39 +310,33 @@ async def sql_query(
             """
             )
 
-            # Use executemany for bulk insertion
-            cur.executemany(
-                """
-                INSERT INTO QueryEmbedding (id, type, embedding) VALUES (%s, %s, %s)
-                """,
-                [
-                    (i, embedding_types[i], embeddings[i])
-                    for i in range(len(embeddings))
-                ],
-            )
+            # Binary COPY sends the float32 vectors as they are
+            async with cur.copy(
+                "COPY QueryEmbedding (id, type, embedding) "
+                "FROM STDIN WITH (FORMAT BINARY)"
+            ) as copy:
+                copy.set_types(["int4", "text", "vector"])
+                for i, (embedding_type, embedding) in enumerate(
+                    zip(embedding_types, embeddings, strict=True)
+                ):
+                    await copy.write_row((i, embedding_type, embedding))
 
             # Run query
-            cur.execute(request.query)
-            results = cur.fetchall()
-
-            # Remove embedding columns if they exist
-            cleaned_results = [
-                {k: v for k, v in row.items() if not k.endswith("embedding")}
-                for row in results
-            ]
-
-            # Commit the transaction
-            cur.execute("COMMIT")
-            cur.close()
-
-            return cleaned_results
-
-        except Exception as e:
-            if cur and not cur.closed:
-                cur.execute("ROLLBACK")
-                cur.close()
-            logger.error(f"SQL Query Error - Query: {request.query}", exc_info=True)
-            raise HTTPException(status_code=500, detail=str(e)) from e
+            await cur.execute(request.query)
+            results = await cur.fetchall()
+
+        # Remove embedding columns if they exist
+        return [
+            {k: v for k, v in row.items() if not k.endswith("embedding")}
+            for row in results
+        ]
+
+    except psycopg.errors.QueryCanceled as e:
+        logger.error(f"SQL Query Timeout - Query: {request.query}")
+        raise HTTPException(status_code=504, detail=str(e)) from e
+    except Exception as e:
+        logger.error(f"SQL Query Error - Query: {request.query}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e)) from e
 
 
 if __name__ == "__main__":
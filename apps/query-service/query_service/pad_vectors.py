@@ -1,13 +1,12 @@
 import numpy as np
 
 
-def pad_vectors(vectors: np.ndarray, target_dim: int = 2000) -> list[list[float]]:
-    res = []
+def pad_vectors(vectors: np.ndarray, target_dim: int = 2000) -> np.ndarray:
+    """Truncates or zero-pads the vectors to target_dim, as float32 for pgvector."""
     if vectors.shape[1] >= target_dim:
-        res = vectors[:, :target_dim].astype(np.float64).tolist()
-    else:
-        padding_width = ((0, 0), (0, target_dim - vectors.shape[1]))
-        padded = np.pad(vectors, padding_width, mode="constant", constant_values=0)
-        res = padded.astype(np.float64).tolist()
+        return np.ascontiguousarray(vectors[:, :target_dim], dtype=np.float32)
 
-    return res  # type: ignore
+    padding_width = ((0, 0), (0, target_dim - vectors.shape[1]))
+    return np.pad(vectors, padding_width, mode="constant", constant_values=0).astype(
+        np.float32
+    )
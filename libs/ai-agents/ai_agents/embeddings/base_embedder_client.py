@@ -2,6 +2,8 @@ import logging
 from abc import ABC, abstractmethod
 from typing import List, Tuple
 
+import numpy as np
+
 
 class BaseEmbedderClient(ABC):
     """
@@ -16,8 +18,11 @@ class BaseEmbedderClient(ABC):
     @abstractmethod
     async def get_embeddings(
         self, texts: List[str], gpu_batch_size: int = 1, api_batch_size: int = 1
-    ) -> Tuple[float, List[List[float]]]:
-        """Get embeddings for a list of texts."""
+    ) -> Tuple[float, List[np.ndarray | None]]:
+        """
+        Get embeddings for a list of texts, as float32 vectors in the input order.
+        Texts that failed to embed are None.
+        """
         pass
 
     @abstractmethod
@@ -3,8 +3,20 @@ import logging
 from typing import List, Tuple
 
 import httpx
+import numpy as np
 
 from ai_agents.embeddings.base_embedder_client import BaseEmbedderClient
+from ai_agents.embeddings.dynamic_batcher import (
+    BatchSizeTuner,
+    BatchTooLargeError,
+    DynamicBatcher,
+    is_batch_too_large,
+    run_dynamic_batches,
+)
+from ai_agents.embeddings.embedding_encoding import (
+    decode_embeddings,
+    to_embedding_list,
+)
 
 
 class DeepInfraEmbedderClient(BaseEmbedderClient):
@@ -20,7 +32,13 @@ class DeepInfraEmbedderClient(BaseEmbedderClient):
     _max_connections: int = 50
     _max_retries: int = 3
     _last_log_time: float = 0
-    _completed_requests: int = 0
+    _completed_texts: int = 0
+
+    # Token budget of a batch, auto-tuned to keep requests around the target latency
+    _initial_batch_tokens: int = 32_768
+    _min_batch_tokens: int = 2_048
+    _max_batch_tokens: int = 262_144
+    _target_latency: float = 30
 
     def __init__(
         self,
@@ -45,13 +63,20 @@ class DeepInfraEmbedderClient(BaseEmbedderClient):
         self._api_key = api_key
         self._status_printer_task = None
         self._total_tokens = 0
+        # Shared across calls so that what we learn carries over
+        self._tuner = BatchSizeTuner(
+            initial_tokens=self._initial_batch_tokens,
+            min_tokens=self._min_batch_tokens,
+            max_tokens=self._max_batch_tokens,
+            target_latency=self._target_latency,
+        )
 
     async def _periodic_status_printer(self, total_texts: int) -> None:
         start_time = asyncio.get_event_loop().time()
         while True:
             current_time = asyncio.get_event_loop().time()
             if current_time - self._last_log_time >= 60:  # Only log every 60 seconds
-                progress = (self._completed_requests) / total_texts
+                progress = self._completed_texts / total_texts
                 elapsed_time = current_time - start_time
                 estimated_total_time = elapsed_time / progress if progress > 0 else 0
                 estimated_remaining_time = estimated_total_time - elapsed_time
@@ -59,7 +84,8 @@ class DeepInfraEmbedderClient(BaseEmbedderClient):
                 self._logger.info(
                     f"Progress: {progress:.1%} | "
                     f"Elapsed: {elapsed_time:.1f}s | "
-                    f"Estimated remaining: {estimated_remaining_time:.1f}s"
+                    f"Estimated remaining: {estimated_remaining_time:.1f}s | "
+                    f"Batch token budget: {self._tuner.max_batch_tokens}"
                 )
                 self._last_log_time = current_time
             await asyncio.sleep(60)
@@ -68,14 +94,13 @@ class DeepInfraEmbedderClient(BaseEmbedderClient):
         self,
         batch: List[str],
         batch_id: int,
-    ) -> List[List[float] | None]:
+    ) -> List[np.ndarray | None]:
         """
         A helper function that sends a single batch request to the server
         and handles retries.
         """
-        response = None
-
         for attempt in range(self._max_retries):
+            response = None
             try:
                 payload = {
                     "inputs": batch,
@@ -90,22 +115,28 @@ class DeepInfraEmbedderClient(BaseEmbedderClient):
                         "Authorization": f"Bearer {self._api_key}",
                     },
                 )
-                self._completed_requests += 1
                 response.raise_for_status()
 
                 json_response = response.json()
 
                 self._total_tokens += json_response["input_tokens"]
 
-                result = json_response["embeddings"]
+                # Rows are views on a single contiguous float32 array
+                result = to_embedding_list(decode_embeddings(json_response))
+                self._completed_texts += len(batch)
                 return result
 
             except Exception as e:
-                error_details = response.text if response else str(e)
+                error_details = response.text if response is not None else str(e)
 
                 self._logger.error(
                     f"Error processing batch {batch_id} of size {len(batch)}: {error_details}"
                 )
+                if response is not None and is_batch_too_large(
+                    response.status_code, error_details
+                ):
+                    # Retrying the same batch won't help, it gets split instead
+                    raise BatchTooLargeError(error_details) from e
                 if attempt < self._max_retries - 1:
                     self._logger.info(
                         f"Retrying batch {batch_id} (attempt {attempt + 2}/{self._max_retries})"
@@ -123,39 +154,26 @@ class DeepInfraEmbedderClient(BaseEmbedderClient):
         texts: List[str],
         api_batch_size: int = 100,
         gpu_batch_size: int = 0,
-    ) -> Tuple[float, List[List[float]]]:
+    ) -> Tuple[float, List[np.ndarray | None]]:
+        """
+        Texts are packed into length-sorted batches up to an auto-tuned token budget,
+        with at most api_batch_size texts per batch. Embeddings are returned in the
+        input order.
+        """
         self._logger.info(f"Getting embeddings for {len(texts)} texts")
 
-        # Create batches based on max_batch_size
-        batches = [
-            texts[i : i + api_batch_size] for i in range(0, len(texts), api_batch_size)
-        ]
-
+        self._completed_texts = 0
         self._status_printer_task = asyncio.create_task(
             self._periodic_status_printer(len(texts))
         )
 
         try:
-            # If only one batch, run it directly
-            if len(batches) == 1:
-                responses = [await self._get_batch_embeddings(batches[0], 0)]
-            else:
-                # If more than one batch, warm up with the first batch
-                first_batch_response = await self._get_batch_embeddings(batches[0], 0)
-
-                # Then run the remaining batches in parallel
-                other_responses = await asyncio.gather(
-                    *(
-                        self._get_batch_embeddings(batches[i], i)
-                        for i in range(1, len(batches))
-                    )
-                )
-                responses = [first_batch_response] + list(other_responses)
-
-            # Combine all embeddings
-            all_embeddings = []
-            for response in responses:
-                all_embeddings.extend(response)
+            all_embeddings = await run_dynamic_batches(
+                texts,
+                DynamicBatcher(texts, self._tuner, max_batch_size=api_batch_size),
+                self._get_batch_embeddings,
+                concurrency=self._max_connections,
+            )
 
             cost = self._total_tokens * self._cost_per_token
 
@@ -0,0 +1,167 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, List
+
+import numpy as np
+
+# Rough chars-per-token ratio, we only need relative lengths to pack batches
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+class BatchTooLargeError(Exception):
+    """Raised by `embed_batch` when the backend couldn't take the batch at once."""
+
+
+def is_batch_too_large(status_code: int, body: str) -> bool:
+    """Whether an error response means that a smaller batch would have succeeded."""
+    return status_code == 413 or "out of memory" in body.lower()
+
+
+class BatchSizeTuner:
+    """
+    Adapts the token budget of a batch to the observed latency: the budget grows by
+    `increase_factor` while batches come back faster than `target_latency`, shrinks
+    proportionally when they are slower and is halved when a batch is too large
+    (OOMs, payload too large), down to `min_tokens`.
+    """
+
+    def __init__(
+        self,
+        initial_tokens: int,
+        min_tokens: int,
+        max_tokens: int,
+        target_latency: float,
+        increase_factor: float = 1.2,
+    ):
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.target_latency = target_latency
+        self.increase_factor = increase_factor
+
+        self.max_batch_tokens = max(min_tokens, min(max_tokens, initial_tokens))
+
+    def _set(self, max_batch_tokens: float) -> None:
+        self.max_batch_tokens = int(
+            max(self.min_tokens, min(self.max_tokens, max_batch_tokens))
+        )
+
+    def record_success(self, latency: float) -> None:
+        if latency > self.target_latency:
+            self._set(self.max_batch_tokens * max(0.5, self.target_latency / latency))
+        else:
+            self._set(self.max_batch_tokens * self.increase_factor)
+
+    def record_failure(self) -> None:
+        self._set(self.max_batch_tokens * 0.5)
+
+
+class DynamicBatcher:
+    """
+    Hands out batches of text indices sorted by decreasing length, so that texts of
+    similar length are padded together. Each batch is packed up to the tuner's
+    current token budget, counting every text as long as the longest one in the
+    batch (i.e. including padding), and up to `max_batch_size` texts.
+
+    Longest texts go first: the tuner learns from the worst case, and the small
+    batches at the end balance the load across concurrent requests. Callers put the
+    results back by index, which restores the input order.
+    """
+
+    def __init__(self, texts: List[str], tuner: BatchSizeTuner, max_batch_size: int):
+        self.tuner = tuner
+        self.max_batch_size = max_batch_size
+
+        self._lengths = [estimate_tokens(text) for text in texts]
+        self._order = sorted(
+            range(len(texts)), key=lambda i: self._lengths[i], reverse=True
+        )
+        self._position = 0
+
+    @property
+    def remaining(self) -> int:
+        return len(self._order) - self._position
+
+    def next_batch(self) -> List[int]:
+        """Returns the indices of the next batch, or an empty list when done."""
+        if not self.remaining:
+            return []
+
+        start = self._position
+        # Sorted by decreasing length: the first text sets the padded length
+        padded_length = self._lengths[self._order[start]]
+        size = max(1, self.tuner.max_batch_tokens // padded_length)
+        size = min(size, self.max_batch_size, self.remaining)
+
+        self._position += size
+        return self._order[start : start + size]
+
+
+async def run_dynamic_batches(
+    texts: List[str],
+    batcher: DynamicBatcher,
+    embed_batch: Callable[[List[str], int], Awaitable[List[np.ndarray | None]]],
+    concurrency: int | Callable[[], int],
+    max_concurrency: int | None = None,
+) -> List[np.ndarray | None]:
+    """
+    Embeds the texts with `concurrency` requests in flight, feeding the latency of
+    every batch back to the tuner. `embed_batch(batch, batch_id)` returns None for
+    every text of a failed batch, which are left as None. It raises
+    BatchTooLargeError when the batch was too large, in which case the budget is
+    shrunk and the batch is split in halves until it goes through.
+
+    `concurrency` can be a callable, re-read between batches (e.g. following the
+    capacity of an autoscaling backend), in which case it's capped at max_concurrency.
+    """
+    embeddings: List[np.ndarray | None] = [None] * len(texts)
+    batch_counter = 0
+
+    async def run_batch(indices: List[int]) -> None:
+        nonlocal batch_counter
+        batch_id = batch_counter
+        batch_counter += 1
+
+        t0 = time.monotonic()
+        try:
+            result = await embed_batch([texts[i] for i in indices], batch_id)
+        except BatchTooLargeError:
+            batcher.tuner.record_failure()
+            if len(indices) == 1:
+                return
+            half = len(indices) // 2
+            await run_batch(indices[:half])
+            await run_batch(indices[half:])
+            return
+
+        # Other failures (outages...) aren't fixed by smaller batches, their texts
+        # are left as None
+        if any(embedding is not None for embedding in result):
+            batcher.tuner.record_success(time.monotonic() - t0)
+
+        for i, embedding in zip(indices, result):
+            embeddings[i] = embedding
+
+    def get_concurrency() -> int:
+        return concurrency() if callable(concurrency) else concurrency
+
+    async def worker(worker_id: int) -> None:
+        while batcher.remaining:
+            if worker_id >= get_concurrency():
+                # Parked until the concurrency grows
+                await asyncio.sleep(1)
+                continue
+            if indices := batcher.next_batch():
+                await run_batch(indices)
+
+    # Warm up with the first (i.e. longest) batch alone, then run in parallel
+    if indices := batcher.next_batch():
+        await run_batch(indices)
+
+    n_workers = max_concurrency or get_concurrency()
+    await asyncio.gather(*(worker(i) for i in range(n_workers)))
+
+    return embeddings
@@ -0,0 +1,33 @@
+import base64
+from typing import Any, Dict
+
+import numpy as np
+
+
+def decode_embeddings(response: Dict[str, Any]) -> np.ndarray:
+    """
+    Decodes the embeddings of a response into a contiguous (n, dim) float32 array,
+    whether they were sent as float lists or as a base64-encoded little-endian buffer
+    (see the `encoding` option of the nvembed EmbeddingService). The rows of texts
+    that failed (nulls) are NaN.
+    """
+    embeddings = response["embeddings"]
+
+    if isinstance(embeddings, str):
+        dtype = np.dtype(response.get("dtype", "float32")).newbyteorder("<")
+        buffer = np.frombuffer(base64.b64decode(embeddings), dtype=dtype)
+        return buffer.reshape(response["shape"]).astype(np.float32)
+
+    if any(row is None for row in embeddings):
+        dimensions = next((len(row) for row in embeddings if row is not None), 0)
+        embeddings = [
+            [np.nan] * dimensions if row is None else row for row in embeddings
+        ]
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def to_embedding_list(embeddings: np.ndarray) -> list[np.ndarray | None]:
+    """Rows of a decoded response, None for the texts that failed."""
+    failed = np.isnan(embeddings).any(axis=1)
+    return [None if failed[i] else row for i, row in enumerate(embeddings)]
+
@@ -1,5 +1,7 @@
 from typing import Any, List
 
+import numpy as np
+
 from .base_embedder_client import BaseEmbedderClient
 
 
@@ -36,7 +38,7 @@ class LocalEmbedderClient(BaseEmbedderClient):
             batch_size=gpu_batch_size,
         )
 
-        return 0, embeddings.tolist()
+        return 0, list(embeddings.astype(np.float32))
 
     async def close(self) -> None:
         pass
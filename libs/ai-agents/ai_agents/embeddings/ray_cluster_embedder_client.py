@@ -5,19 +5,44 @@ import time
 from typing import List, Tuple
 
 import httpx
+import numpy as np
 
 from .base_embedder_client import BaseEmbedderClient
+from .dynamic_batcher import (
+    BatchSizeTuner,
+    BatchTooLargeError,
+    DynamicBatcher,
+    is_batch_too_large,
+    run_dynamic_batches,
+)
+from .embedding_encoding import decode_embeddings, to_embedding_list
 
 GPU_BATCH_SIZE = 1  # NB: careful with this one
-API_BATCH_SIZE = 2
-RUNTIME_COST_HOURLY = (
-    0.566 * 4
-)  # A100 spot price * nodes (assuming we can get 4 which is not guaranteed)
+API_BATCH_SIZE = 64  # Upper bound, the token budget usually binds first
+# Token budget of a request, auto-tuned to keep requests around the target latency
+INITIAL_BATCH_TOKENS = 8_192
+MIN_BATCH_TOKENS = 1_024
+MAX_BATCH_TOKENS = 131_072
+TARGET_LATENCY = 60
+# Embeddings are sent back as a base64 buffer, float16 halves the payload
+TRANSPORT_DTYPE = "float16"
+REPLICA_COST_HOURLY = 0.566  # A100 spot price
+# Assumed when the deployment metrics can't be read
+FALLBACK_REPLICAS = 4
+FALLBACK_CONCURRENCY = 4
+CAPACITY_REFRESH_INTERVAL = 30
 
 
 class RayClusterEmbedderClient(BaseEmbedderClient):
+    """
+    Client for the nvembed Ray Serve deployment. Its concurrency follows the capacity
+    reported by the deployment's /metrics endpoint: enough requests to keep every
+    running replica at its autoscaling target, plus one replica's worth to trigger
+    scaling up (up to max_replicas), within `max_connections`.
+    """
+
     _timeout: int = 60 * 5
-    _max_connections: int = 4
+    _max_connections: int = 64
     _max_retries: int = 3
 
     def __init__(
@@ -38,32 +63,86 @@ class RayClusterEmbedderClient(BaseEmbedderClient):
             verify=False,
         )
         self._base_url = base_url
-        self._remaining_reqs = 0
+        self._remaining_texts = 0
         self._status_printer_task = None
+        self._concurrency = FALLBACK_CONCURRENCY
+        self._running_replicas = FALLBACK_REPLICAS
+        self._replica_seconds = 0.0
+        self._accounted_until = time.monotonic()
+        # Shared across calls so that what we learn carries over
+        self._tuner = BatchSizeTuner(
+            initial_tokens=INITIAL_BATCH_TOKENS,
+            min_tokens=MIN_BATCH_TOKENS,
+            max_tokens=MAX_BATCH_TOKENS,
+            target_latency=TARGET_LATENCY,
+        )
+
+    def _account_replica_time(self) -> None:
+        # We pay for the replicas that are up, whether we keep them busy or not
+        now = time.monotonic()
+        self._replica_seconds += (now - self._accounted_until) * self._running_replicas
+        self._accounted_until = now
+
+    async def _refresh_capacity(self) -> None:
+        self._account_replica_time()
+        try:
+            response = await self._client.get(f"{self._base_url.rstrip('/')}/metrics")
+            response.raise_for_status()
+            metrics = response.json()
+        except Exception as e:
+            self._logger.warning(f"Could not read the deployment metrics: {e}")
+            return
+
+        replicas = metrics["running_replicas"]
+        if replicas is not None:
+            self._running_replicas = replicas
+        # A cold deployment (0 replicas) only scales up if requests are queued
+        wanted_replicas = min(self._running_replicas + 1, metrics["max_replicas"])
+        self._concurrency = max(
+            1,
+            min(
+                self._max_connections,
+                wanted_replicas * metrics["target_ongoing_requests"],
+            ),
+        )
+
+        self._logger.info(
+            f"Replicas: {self._running_replicas}/{metrics['max_replicas']} | "
+            f"Concurrency: {self._concurrency} | "
+            f"Tokens/s (replica): {metrics['tokens_per_s']:.0f} | "
+            f"Avg batch: {metrics['avg_batch_requests']:.1f} requests, {metrics['avg_batch_texts']:.1f} texts | "
+            f"Queue wait: {metrics['avg_queue_wait_s']:.2f}s | "
+            f"Encode time: {metrics['avg_encode_time_s']:.2f}s"
+        )
 
     async def _periodic_status_printer(self) -> None:
         while True:
-            self._logger.info(f"Remaining embedding requests: {self._remaining_reqs}")
-            await asyncio.sleep(60)
+            await asyncio.sleep(CAPACITY_REFRESH_INTERVAL)
+            await self._refresh_capacity()
+            self._logger.info(
+                f"Remaining embedding texts: {self._remaining_texts} | "
+                f"Batch token budget: {self._tuner.max_batch_tokens}"
+            )
 
     async def _get_batch_embeddings(
         self,
         batch: List[str],
         batch_id: int,
         gpu_batch_size: int,
-    ) -> List[List[float] | None]:
+    ) -> List[np.ndarray | None]:
         """
         A helper function that sends a single batch request to the server
         and handles retries.
         """
-        response = None
-
         for attempt in range(self._max_retries):
+            response = None
             try:
                 payload = {
                     "inputs": batch,
                     "normalize_embeddings": True,
                     "batch_size": gpu_batch_size,
+                    "encoding": "base64",
+                    "dtype": TRANSPORT_DTYPE,
                 }
 
                 response = await self._client.post(
@@ -73,18 +152,24 @@ class RayClusterEmbedderClient(BaseEmbedderClient):
                         "Content-Type": "application/json",
                     },
                 )
-                self._remaining_reqs -= 1
                 response.raise_for_status()
 
-                result = response.json()["embeddings"]
+                # Rows are views on a single contiguous float32 array
+                result = to_embedding_list(decode_embeddings(response.json()))
+                self._remaining_texts -= len(batch)
                 return result
 
             except Exception as e:
-                error_details = response.text if response else str(e)
+                error_details = response.text if response is not None else str(e)
 
                 self._logger.error(
                     f"Error processing batch {batch_id} of size {len(batch)}: {error_details}"
                 )
+                if response is not None and is_batch_too_large(
+                    response.status_code, error_details
+                ):
+                    # Retrying the same batch won't help, it gets split instead
+                    raise BatchTooLargeError(error_details) from e
                 if attempt < self._max_retries - 1:
                     self._logger.info(
                         f"Retrying batch {batch_id} (attempt {attempt + 2}/{self._max_retries})"
@@ -102,47 +187,33 @@ class RayClusterEmbedderClient(BaseEmbedderClient):
         texts: List[str],
         api_batch_size: int = API_BATCH_SIZE,
         gpu_batch_size: int = GPU_BATCH_SIZE,
-    ) -> Tuple[float, List[List[float]]]:
+    ) -> Tuple[float, List[np.ndarray | None]]:
+        """
+        Texts are packed into length-sorted batches up to an auto-tuned token budget,
+        with at most api_batch_size texts per request. Embeddings are returned in the
+        input order.
+        """
         self._logger.info(f"Getting embeddings for {len(texts)} texts")
 
-        # Create batches based on max_batch_size
-        batches = [
-            texts[i : i + api_batch_size] for i in range(0, len(texts), api_batch_size)
-        ]
-
-        # Set remaining requests count to number of batches
-        self._remaining_reqs = len(batches)
+        self._remaining_texts = len(texts)
+        self._replica_seconds = 0.0
+        self._accounted_until = time.monotonic()
+        await self._refresh_capacity()
         self._status_printer_task = asyncio.create_task(self._periodic_status_printer())
 
-        t0 = time.time()
-
         try:
-            # If only one batch, run it directly
-            if len(batches) == 1:
-                responses = [
-                    await self._get_batch_embeddings(batches[0], 0, gpu_batch_size)
-                ]
-            else:
-                # If more than one batch, warm up with the first batch
-                first_batch_response = await self._get_batch_embeddings(
-                    batches[0], 0, gpu_batch_size
-                )
-
-                # Then run the remaining batches in parallel
-                other_responses = await asyncio.gather(
-                    *(
-                        self._get_batch_embeddings(batches[i], i, gpu_batch_size)
-                        for i in range(1, len(batches))
-                    )
-                )
-                responses = [first_batch_response] + list(other_responses)
-
-            # Combine all embeddings
-            all_embeddings = []
-            for response in responses:
-                all_embeddings.extend(response)
-
-            cost = (time.time() - t0) * RUNTIME_COST_HOURLY / 3600
+            all_embeddings = await run_dynamic_batches(
+                texts,
+                DynamicBatcher(texts, self._tuner, max_batch_size=api_batch_size),
+                lambda batch, batch_id: self._get_batch_embeddings(
+                    batch, batch_id, gpu_batch_size
+                ),
+                concurrency=lambda: self._concurrency,
+                max_concurrency=self._max_connections,
+            )
+
+            self._account_replica_time()
+            cost = self._replica_seconds * REPLICA_COST_HOURLY / 3600
 
             return cost, all_embeddings
 
@@ -88,14 +88,14 @@ class RunpodEmbedderClient(BaseEmbedderClient):
         self._logger.error(f"Max polling attempts reached for job {job_id}")
         return None
 
-    def _extract_and_normalize_embeddings(self, data: List[dict]) -> List[List[float]]:
-        embeddings = np.array([d["embedding"] for d in data])
+    def _extract_and_normalize_embeddings(self, data: List[dict]) -> List[np.ndarray]:
+        embeddings = np.array([d["embedding"] for d in data], dtype=np.float32)
         embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-        return embeddings.tolist()
+        return list(embeddings)
 
     async def _process_response(
         self, response: httpx.Response, batch_id: int
-    ) -> List[List[float]] | None:
+    ) -> List[np.ndarray] | None:
         """Process the initial response from the run endpoint. If it's a job record or
         if it is COMPLETED with no output, poll until done."""
         try:
@@ -143,7 +143,7 @@ class RunpodEmbedderClient(BaseEmbedderClient):
 
     async def get_embeddings(
         self, texts: List[str], batch_size: int = DEFAULT_MAX_BATCH_SIZE
-    ) -> Tuple[float, List[List[float]]]:
+    ) -> Tuple[float, List[np.ndarray | None]]:
         self._logger.info(f"Getting embeddings for {len(texts)} texts")
 
         time_start = time.time()
@@ -161,7 +161,7 @@ class RunpodEmbedderClient(BaseEmbedderClient):
 
             async def get_batch_embeddings(
                 batch: List[str], batch_id: int
-            ) -> List[List[float] | None]:
+            ) -> List[np.ndarray | None]:
                 result_embeddings = None
                 response = None
 
@@ -1,82 +1,80 @@
-import networkx as nx
-
-from ..types import AdjacencyList, AdjacencyListRecord
-from ..utils.get_node_datetime import get_node_datetime
+from ..compact_graph import CompactGraph
+from ..types import AdjacencyList
+from ..utils.pagerank import get_top_pageranked_nodes
+from ..utils.path_search import (
+    SearchBudget,
+    bidirectional_shortest_path,
+    k_shortest_paths,
+)
 
 
 def _get_pageranked_nodes(
-    G: nx.DiGraph, node_id: str, target_node_id: str, top_k: int
-) -> list[str]:
+    graph: CompactGraph, source: int, target: int, top_k: int
+) -> list[int]:
+    frequencies = graph.attributes.frequencies
+
     # Calculate weights based on inverse frequencies
-    weight1 = 1.0 / G.nodes[node_id]["frequency"]
-    weight2 = 1.0 / G.nodes[target_node_id]["frequency"]
+    weight1 = 1.0 / frequencies[source]
+    weight2 = 1.0 / frequencies[target]
 
     # Normalize weights to sum to 1
     total_weight = weight1 + weight2
-    # Set up personalization dictionary focused on both nodes
-    personalization = {node: 0.0 for node in G.nodes()}
-    personalization[node_id] = weight1 / total_weight
-    personalization[target_node_id] = weight2 / total_weight
-
-    # Run personalized PageRank
-    pagerank_scores = nx.pagerank(
-        G,
-        alpha=0.85,  # Same alpha as before
-        personalization=personalization,
-    )
+    # Personalization focused on both nodes
+    seeds = {source: weight1 / total_weight, target: weight2 / total_weight}
 
-    # Get top scoring nodes and sort by PageRank score
-    scored_nodes = [(node, score) for node, score in pagerank_scores.items()]
-    scored_nodes.sort(key=lambda x: x[1], reverse=True)
-
-    node_ids = [x for x, _ in scored_nodes[:top_k]]
-
-    return node_ids
+    return get_top_pageranked_nodes(graph, seeds, top_k)
 
 
 def get_causal_chain(
-    G: nx.DiGraph, node_id: str, target_node_id: str, top_k: int = 10
+    graph: CompactGraph,
+    node_id: str,
+    target_node_id: str,
+    top_k: int = 10,
+    k_paths: int = 3,
 ) -> AdjacencyList:
     """
-    Find a causal chain between two nodes using personalized PageRank.
+    Find a causal chain between two nodes.
+
+    Looks for the k_paths shortest directed paths, then for an undirected path and
+    finally falls back to personalized PageRank. Path searches share a SearchBudget,
+    which bounds the latency on dense graphs.
 
     Args:
-        G: NetworkX DiGraph containing the graph
+        graph: CompactGraph containing the graph
         node_id: ID of the first node
         target_node_id: ID of the second node
-        top_k: Number of top nodes to return
+        top_k: Number of top nodes to return when falling back to PageRank
+        k_paths: Number of alternative paths to merge into the chain
 
     Returns:
-        List of AdjacencyListRecord representing the causal chain
+        List of AdjacencyListRecord representing the causal chain: the nodes of the
+        shortest path, followed by the intermediate nodes of the alternative ones
     """
+    source = graph.index_of(node_id)
+    target = graph.index_of(target_node_id)
+    if source is None or target is None:
+        missing = node_id if source is None else target_node_id
+        raise ValueError(f"Node {missing} not in graph")
+
+    budget = SearchBudget()
+    paths = k_shortest_paths(graph, source, target, k_paths, budget=budget)
+
+    if not paths and not budget.exhausted:
+        path = bidirectional_shortest_path(
+            graph, source, target, budget=budget, directed=False
+        )
+        paths = [path] if path else []
 
-    try:
-        node_ids = nx.shortest_path(G, node_id, target_node_id)
-
-    except nx.NetworkXNoPath:
+    if paths:
+        # Dedupe the nodes shared by the paths, keeping the first path's order
+        node_indices = list(dict.fromkeys(i for path in paths for i in path))
+    else:
         print("No shortest path")
         # If no shortest path, use pageranked nodes
-        try:
-            node_ids = _get_pageranked_nodes(G, node_id, target_node_id, top_k)
-        except Exception as e:
-            print(e)
-            raise e
+        node_indices = _get_pageranked_nodes(graph, source, target, top_k)
 
     # Convert top nodes to AdjacencyListRecord format
-    result = []
-    for node_id in node_ids:
-        node_data = G.nodes(data=True)[node_id]
-        record = AdjacencyListRecord(
-            id=node_id,
-            description=node_data.get("description", ""),
-            datetime=get_node_datetime(node_data.get("datetime", [])),
-            frequency=node_data.get("frequency", 1),
-            # parents_count=len(list(G.predecessors(node_id))),
-            # children_count=len(list(G.successors(node_id))),
-        )
-        result.append(record)
-
-    return result
+    return graph.get_records(node_indices)
 
 
 if __name__ == "__main__":
@@ -85,16 +83,6 @@ if __name__ == "__main__":
     filename = "/Users/ma9o/Desktop/enclaveid/apps/data-pipeline/data/dagster/whatsapp_nodes_deduplicated/cm0i27jdj0000aqpa73ghpcxf.snappy"
     df = pl.read_parquet(filename)
 
-    G = nx.DiGraph()
-    for row in df.iter_rows(named=True):
-        G.add_node(
-            row["id"],
-            description=row["proposition"],
-            frequency=row["frequency"],
-            user=row["user"],
-            datetime=get_node_datetime(row["datetimes"]),
-            chunk_ids=row["chunk_ids"],
-        )
-        G.add_edges_from([(row["id"], e) for e in row["edges"]])
+    G = CompactGraph.from_nodes_df(df)
 
     print(get_causal_chain(G, "giovanni_commitment_phobia", "mutual frustration"))
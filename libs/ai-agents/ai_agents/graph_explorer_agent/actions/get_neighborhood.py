@@ -0,0 +1,81 @@
+from typing import Literal
+
+import numpy as np
+
+from ai_agents.graph_explorer_agent.compact_graph import CompactGraph
+from ai_agents.graph_explorer_agent.types import Neighborhood
+
+
+def get_neighborhood(
+    graph: CompactGraph,
+    node_ids: list[str],
+    depth: int = 1,
+    fan_out: int = 20,
+    direction: Literal["in", "out", "both"] = "both",
+    max_nodes: int = 500,
+) -> Neighborhood:
+    """
+    Expands the given nodes by `depth` hops. Each node contributes at most `fan_out`
+    neighbors per hop, the most frequent ones first, and the expansion stops once
+    `max_nodes` nodes are reached. Unknown node ids are ignored.
+    """
+    seeds = [i for node_id in node_ids if (i := graph.index_of(node_id)) is not None]
+    visited = np.zeros(len(graph), dtype=bool)
+    frontier = np.unique(np.array(seeds, dtype=np.int64))
+    visited[frontier] = True
+
+    modes: list[Literal["in", "out"]] = (
+        ["in", "out"] if direction == "both" else [direction]
+    )
+    frequencies = graph.attributes.frequencies.astype(np.int64)
+    nodes, edges = [frontier], []
+
+    for _ in range(depth):
+        n_visited = sum(len(n) for n in nodes)
+        if not len(frontier) or n_visited >= max_nodes:
+            break
+
+        hop_edges = []
+        for mode in modes:
+            sources, neighbors = graph.gather_neighbors(frontier, mode)
+
+            # Rank the neighbors of each node by decreasing frequency
+            order = np.lexsort((-frequencies[neighbors], sources))
+            sources, neighbors = sources[order], neighbors[order]
+            group_starts = np.flatnonzero(np.r_[True, sources[1:] != sources[:-1]])
+            ranks = np.arange(len(sources)) - np.repeat(
+                group_starts, np.diff(np.r_[group_starts, len(sources)])
+            )
+            keep = ranks < fan_out
+            sources, neighbors = sources[keep], neighbors[keep]
+
+            # Edges keep their direction in the graph
+            hop_edges.append(
+                np.stack(
+                    [sources, neighbors] if mode == "out" else [neighbors, sources]
+                )
+            )
+
+        hop_edges = np.concatenate(hop_edges, axis=1)
+        discovered = np.unique(hop_edges)
+        discovered = discovered[~visited[discovered]][: max_nodes - n_visited]
+        visited[discovered] = True
+
+        # Only edges between kept nodes
+        edges.append(hop_edges[:, visited[hop_edges[0]] & visited[hop_edges[1]]])
+        nodes.append(discovered)
+        frontier = discovered
+
+    edge_pairs = (
+        np.unique(np.concatenate(edges, axis=1), axis=1)
+        if edges
+        else np.empty((2, 0), dtype=np.int64)
+    )
+
+    return Neighborhood(
+        nodes=graph.get_records(np.concatenate(nodes)),
+        edges=[
+            (graph.node_ids[src], graph.node_ids[dst])
+            for src, dst in edge_pairs.T.tolist()
+        ],
+    )
@@ -1,75 +1,58 @@
 from contextlib import nullcontext
 from threading import Semaphore
 
-import faiss
-import networkx as nx
 import numpy as np
 
 from ai_agents.embeddings.base_embedder_client import BaseEmbedderClient
-from ai_agents.graph_explorer_agent.utils.get_node_datetime import get_node_datetime
+from ai_agents.graph_explorer_agent.compact_graph import CompactGraph
+from ai_agents.graph_explorer_agent.utils.similarity_index import SimilarityIndex
 
-from ..types import AdjacencyList, AdjacencyListRecord
+from ..types import AdjacencyList
 
 similarity_semaphore = Semaphore(1)
 
 
 async def get_similar_nodes(
-    G: nx.DiGraph,
-    label_embeddings: list[dict],  # [{"id": <node_id>, "embedding": <vec>}]
+    graph: CompactGraph,
+    index: SimilarityIndex,
     embedder_client: BaseEmbedderClient,
     query: str,
     top_k: int = 10,
     threshold: float = 0.6,
     use_lock: bool = True,
 ) -> AdjacencyList:
+    (result,) = await get_similar_nodes_batch(
+        graph, index, embedder_client, [query], top_k, threshold, use_lock
+    )
+    return result
+
+
+async def get_similar_nodes_batch(
+    graph: CompactGraph,
+    index: SimilarityIndex,
+    embedder_client: BaseEmbedderClient,
+    queries: list[str],
+    top_k: int = 10,
+    threshold: float = 0.6,
+    use_lock: bool = True,
+) -> list[AdjacencyList]:
+    """Embeds all the queries in one call and searches them as one matrix."""
     # Use semaphore if running locally bc we can get only 1 embedding at a time
     lock = similarity_semaphore if use_lock else nullcontext()
 
     with lock:
-        # Extract node IDs and embeddings in a consistent order
-        node_ids = [d["id"] for d in label_embeddings]
-        embeddings = np.array(
-            [d["embedding"] for d in label_embeddings], dtype=np.float32
-        )
+        cost, query_embeddings = await embedder_client.get_embeddings(queries)
 
-        # Normalize embeddings for cosine similarity
-        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-        embeddings = embeddings / norms  # in-place normalization
+    for query, embedding in zip(queries, query_embeddings):
+        if embedding is None:
+            raise ValueError(f"Failed to embed query: {query}")
 
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatIP(dimension)
-        index.add(embeddings)  # type: ignore
+    # The index is prebuilt, so the search can run alongside other requests
+    matches = await index.asearch(
+        np.asarray(query_embeddings, dtype=np.float32), top_k, threshold
+    )
 
-        cost, query_embeddings = await embedder_client.get_embeddings([query])
-        query_embedding = np.array(query_embeddings[0], dtype=np.float32).reshape(1, -1)
-
-        # Normalize query as well
-        query_embedding = query_embedding / np.linalg.norm(
-            query_embedding, axis=1, keepdims=True
-        )
-
-        # Perform similarity search. For efficiency, ask for top_k directly
-        scores, idxs = index.search(query_embedding, top_k)  # type: ignore
-        scores, idxs = scores[0], idxs[0]  # unwrap since we only had 1 query
-
-        # Filter by threshold
-        filtered = [
-            (idx, score) for (idx, score) in zip(idxs, scores) if score >= threshold
-        ]
-
-        result = []
-        for i, _score in filtered:
-            node_id = node_ids[i]
-            node_data = G.nodes[node_id]
-
-            record = AdjacencyListRecord(
-                id=node_id,
-                description=node_data.get("description", ""),
-                datetime=get_node_datetime(node_data.get("datetime", [])),
-                frequency=node_data.get("frequency", 1),
-                # parents_count=len(list(G.predecessors(node_id))),
-                # children_count=len(list(G.successors(node_id))),
-            )
-            result.append(record)
-
-    return result
+    return [
+        graph.get_records([graph.index_of(node_id) for node_id, _ in query_matches])
+        for query_matches in matches
+    ]
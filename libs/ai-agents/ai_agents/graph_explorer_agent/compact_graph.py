@@ -0,0 +1,152 @@
+import sys
+from functools import cached_property
+from typing import Literal
+
+import numpy as np
+import polars as pl
+
+from ai_agents.graph_explorer_agent.node_attribute_store import NodeAttributeStore
+from ai_agents.graph_explorer_agent.types import AdjacencyList
+
+
+def _to_csr(src: np.ndarray, dst: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32)
+
+
+def gather_csr_neighbors(
+    indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the (node, neighbor) pairs of the given nodes of a CSR adjacency."""
+    degrees = indptr[nodes + 1] - indptr[nodes]
+    offsets = np.arange(degrees.sum()) - np.repeat(
+        np.cumsum(degrees) - degrees, degrees
+    )
+    neighbors = indices[np.repeat(indptr[nodes], degrees) + offsets]
+    return np.repeat(nodes, degrees), neighbors
+
+
+class CompactGraph:
+    """
+    Immutable directed graph over node ids interned to contiguous integers.
+
+    Edges are stored as CSR arrays in both directions and node attributes in a
+    columnar NodeAttributeStore, so loading a graph doesn't create Python objects per
+    node attribute or per edge.
+    """
+
+    def __init__(
+        self,
+        node_ids: list[str],
+        out_indptr: np.ndarray,
+        out_indices: np.ndarray,
+        in_indptr: np.ndarray,
+        in_indices: np.ndarray,
+        attributes: NodeAttributeStore,
+        version: str = "",
+    ):
+        self.node_ids = node_ids
+        self.out_indptr = out_indptr
+        self.out_indices = out_indices
+        self.in_indptr = in_indptr
+        self.in_indices = in_indices
+        self.attributes = attributes
+        # Identifies the source data, for caches built on top of the graph
+        self.version = version
+
+        self._index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    @classmethod
+    def from_nodes_df(
+        cls,
+        df: pl.DataFrame,
+        id_col: str = "id",
+        edges_col: str = "edges",
+        version: str = "",
+    ) -> "CompactGraph":
+        """
+        Builds the graph from a nodes frame as written by the deduplication assets:
+        one row per node, with the ids of its children in `edges_col`. Edges to ids
+        that aren't in the frame are dropped.
+        """
+        ids = df.get_column(id_col)
+        index = pl.DataFrame(
+            {id_col: ids, "dst": np.arange(len(ids), dtype=np.int32)}
+        ).unique(id_col, keep="first")
+
+        edges = (
+            df.select(
+                pl.int_range(pl.len(), dtype=pl.Int32).alias("src"),
+                pl.col(edges_col).alias(id_col),
+            )
+            .explode(id_col)
+            .join(index, on=id_col, how="inner")
+            .select("src", "dst")
+            .unique()
+        )
+        src = edges.get_column("src").to_numpy()
+        dst = edges.get_column("dst").to_numpy()
+
+        out_indptr, out_indices = _to_csr(src, dst, len(ids))
+        in_indptr, in_indices = _to_csr(dst, src, len(ids))
+
+        # Embeddings are only needed by the similarity index
+        attributes = NodeAttributeStore.from_nodes_df(
+            df.select(pl.exclude(edges_col, "embedding"))
+        )
+
+        return cls(
+            ids.to_list(),
+            out_indptr,
+            out_indices,
+            in_indptr,
+            in_indices,
+            attributes,
+            version,
+        )
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._index
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.out_indices)
+
+    @cached_property
+    def nbytes(self) -> int:
+        """Approximate memory footprint, including the id interning table."""
+        arrays = (self.out_indptr, self.out_indices, self.in_indptr, self.in_indices)
+        return (
+            sum(a.nbytes for a in arrays)
+            + self.attributes.nbytes
+            + sys.getsizeof(self._index)
+            + sum(sys.getsizeof(node_id) for node_id in self.node_ids)
+        )
+
+    def index_of(self, node_id: str) -> int | None:
+        return self._index.get(node_id)
+
+    def successors(self, i: int) -> np.ndarray:
+        return self.out_indices[self.out_indptr[i] : self.out_indptr[i + 1]]
+
+    def predecessors(self, i: int) -> np.ndarray:
+        return self.in_indices[self.in_indptr[i] : self.in_indptr[i + 1]]
+
+    def gather_neighbors(
+        self, nodes: np.ndarray, mode: Literal["in", "out"] = "out"
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the (node, neighbor) pairs of all the given nodes at once."""
+        indptr, indices = (
+            (self.out_indptr, self.out_indices)
+            if mode == "out"
+            else (self.in_indptr, self.in_indices)
+        )
+        return gather_csr_neighbors(indptr, indices, nodes)
+
+    def get_records(self, indices: np.ndarray | list[int]) -> AdjacencyList:
+        return self.attributes.get_records(indices)
@@ -0,0 +1,78 @@
+import numpy as np
+import polars as pl
+
+from ai_agents.graph_explorer_agent.types import AdjacencyList, AdjacencyListRecord
+
+
+def get_datetime_summary(datetimes: pl.Expr) -> pl.Expr:
+    """Vectorized get_node_datetime: "Unknown", a single datetime or a range."""
+    datetimes = datetimes.list.drop_nulls()
+    first, last = datetimes.list.min(), datetimes.list.max()
+
+    return (
+        pl.when(first.is_null())
+        .then(pl.lit("Unknown"))
+        .when(first == last)
+        .then(first)
+        .otherwise(pl.format("from {} to {}", first, last))
+    )
+
+
+class NodeAttributeStore:
+    """
+    Node attributes as Arrow-backed columns, one row per node in index order.
+
+    The datetime summary shown to the agent is computed once for all the nodes when
+    the store is built, and records are assembled by gathering whole columns, so
+    expanding a hub node doesn't go through per-node dicts.
+    """
+
+    def __init__(self, df: pl.DataFrame):
+        self.df = df
+
+        self._ids = df.get_column("id")
+        self._descriptions = df.get_column("description")
+        self._datetimes = df.get_column("datetime")
+        self._frequencies = df.get_column("frequency")
+
+    @classmethod
+    def from_nodes_df(cls, df: pl.DataFrame) -> "NodeAttributeStore":
+        df = df.rename({"proposition": "description"}, strict=False)
+
+        return cls(
+            df.with_columns(
+                pl.col("description").fill_null(""),
+                pl.col("frequency").fill_null(1),
+                (
+                    get_datetime_summary(pl.col("datetimes"))
+                    if "datetimes" in df.columns
+                    else pl.lit("Unknown")
+                ).alias("datetime"),
+            )
+        )
+
+    @property
+    def frequencies(self) -> np.ndarray:
+        return self._frequencies.to_numpy()
+
+    @property
+    def nbytes(self) -> int:
+        return self.df.estimated_size()
+
+    def get_records(self, indices: np.ndarray | list[int]) -> AdjacencyList:
+        indices = pl.Series(np.asarray(indices, dtype=np.int64))
+
+        return [
+            AdjacencyListRecord(
+                id=node_id,
+                description=description,
+                datetime=datetime,
+                frequency=frequency,
+            )
+            for node_id, description, datetime, frequency in zip(
+                self._ids.gather(indices).to_list(),
+                self._descriptions.gather(indices).to_list(),
+                self._datetimes.gather(indices).to_list(),
+                self._frequencies.gather(indices).to_list(),
+            )
+        ]
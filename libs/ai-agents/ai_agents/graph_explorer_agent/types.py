@@ -19,6 +19,12 @@ class AdjacencyListRecord:
 AdjacencyList = list[AdjacencyListRecord]
 
 
+@dataclass
+class Neighborhood:
+    nodes: AdjacencyList
+    edges: list[tuple[str, str]]
+
+
 @dataclass
 class HypothesisValidationResult:
     decision: Literal["accept", "refine", "reject"]
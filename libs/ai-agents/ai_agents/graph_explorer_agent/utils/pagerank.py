@@ -0,0 +1,183 @@
+import threading
+import weakref
+from collections import OrderedDict
+from functools import cached_property
+from typing import Literal
+
+import numpy as np
+import scipy.sparse as sp
+
+from ai_agents.graph_explorer_agent.compact_graph import (
+    CompactGraph,
+    gather_csr_neighbors,
+)
+
+PageRankMethod = Literal["push", "exact"]
+
+# Same damping as nx.pagerank
+ALPHA = 0.85
+# Residual per out-edge below which the push stops, bounds the error on each score
+PUSH_EPSILON = 1e-7
+# Rounds pushing to more than 1/DENSE_PUSH_RATIO of the nodes scan them all instead
+DENSE_PUSH_RATIO = 16
+RESULTS_CACHE_SIZE = 4096
+
+
+class PageRankEngine:
+    """
+    Personalized PageRank over a CompactGraph, with the same semantics as
+    nx.pagerank (dangling nodes teleport back to the personalization).
+
+    "exact" runs a power iteration on a sparse transition matrix over the whole
+    graph. "push" is the forward push approximation (Andersen, Chung, Lang): it only
+    touches the nodes around the seeds that hold enough probability mass, which is
+    what an interactive query about two nodes needs.
+    """
+
+    def __init__(self, graph: CompactGraph, alpha: float = ALPHA):
+        # Only the edges are kept, not the graph: engines are cached per graph in a
+        # weak dictionary, whose entries must not keep their graph alive
+        self.n_nodes = len(graph)
+        self.out_indptr = graph.out_indptr
+        self.out_indices = graph.out_indices
+        self.alpha = alpha
+
+        self.out_degrees = np.diff(graph.out_indptr)
+
+    @cached_property
+    def _transition_matrix(self) -> sp.csr_matrix:
+        """Transposed transition matrix, i.e. (target, source) -> 1 / out_degree."""
+        n = self.n_nodes
+        weights = np.repeat(
+            1.0 / np.maximum(self.out_degrees, 1), self.out_degrees
+        ).astype(np.float64)
+        return sp.csr_matrix(
+            (weights, self.out_indices, self.out_indptr), shape=(n, n)
+        ).T.tocsr()
+
+    def _personalization(self, seeds: dict[int, float]) -> np.ndarray:
+        personalization = np.zeros(self.n_nodes)
+        for node, weight in seeds.items():
+            personalization[node] += weight
+        return personalization / personalization.sum()
+
+    def exact(
+        self, seeds: dict[int, float], tol: float = 1e-6, max_iter: int = 100
+    ) -> np.ndarray:
+        n = self.n_nodes
+        personalization = self._personalization(seeds)
+        dangling = self.out_degrees == 0
+
+        scores = personalization.copy()
+        for _ in range(max_iter):
+            previous = scores
+            dangling_mass = previous[dangling].sum()
+            scores = (
+                self.alpha * (self._transition_matrix @ previous)
+                + (self.alpha * dangling_mass + 1 - self.alpha) * personalization
+            )
+            # Same stopping criterion as nx.pagerank
+            if np.abs(scores - previous).sum() < n * tol:
+                break
+        return scores
+
+    def push(
+        self, seeds: dict[int, float], epsilon: float = PUSH_EPSILON
+    ) -> np.ndarray:
+        personalization = self._personalization(seeds)
+        seed_nodes = np.flatnonzero(personalization)
+        thresholds = epsilon * np.maximum(self.out_degrees, 1)
+
+        scores = np.zeros(self.n_nodes)
+        residuals = personalization.copy()
+
+        # Only the nodes whose residual grew since they were last checked can be
+        # over their threshold, so each round only looks at those
+        frontier = seed_nodes
+        while len(active := frontier[residuals[frontier] > thresholds[frontier]]):
+            mass = residuals[active]
+            residuals[active] = 0
+            scores[active] += (1 - self.alpha) * mass
+
+            degrees = self.out_degrees[active]
+            spread = self.alpha * mass
+
+            # Dangling nodes send their mass back to the seeds
+            has_edges = degrees > 0
+            dangling_mass = spread[~has_edges].sum()
+            residuals[seed_nodes] += dangling_mass * personalization[seed_nodes]
+
+            _, targets = gather_csr_neighbors(
+                self.out_indptr, self.out_indices, active[has_edges]
+            )
+            degrees = degrees[has_edges]
+            weights = np.repeat(spread[has_edges] / degrees, degrees)
+            if len(targets) * DENSE_PUSH_RATIO < len(residuals):
+                frontier, inverse = np.unique(
+                    np.concatenate([targets, seed_nodes]) if dangling_mass else targets,
+                    return_inverse=True,
+                )
+                residuals[frontier] += np.bincount(
+                    inverse[: len(targets)], weights=weights, minlength=len(frontier)
+                )
+            else:
+                # Once the push reaches a good part of the graph, scanning all the
+                # nodes is cheaper than sorting the targets
+                residuals += np.bincount(
+                    targets, weights=weights, minlength=len(residuals)
+                )
+                frontier = np.flatnonzero(residuals > thresholds)
+
+        return scores
+
+    def top_k(
+        self, seeds: dict[int, float], top_k: int, method: PageRankMethod = "push"
+    ) -> list[int]:
+        scores = self.push(seeds) if method == "push" else self.exact(seeds)
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        # Ties broken by index, for deterministic results
+        return top[np.lexsort((top, -scores[top]))].tolist()
+
+
+_engines: "weakref.WeakKeyDictionary[CompactGraph, PageRankEngine]" = (
+    weakref.WeakKeyDictionary()
+)
+_results: OrderedDict[tuple, list[int]] = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_pagerank_engine(graph: CompactGraph) -> PageRankEngine:
+    with _lock:
+        if (engine := _engines.get(graph)) is None:
+            engine = _engines[graph] = PageRankEngine(graph)
+        return engine
+
+
+def get_top_pageranked_nodes(
+    graph: CompactGraph,
+    seeds: dict[int, float],
+    top_k: int,
+    method: PageRankMethod = "push",
+) -> list[int]:
+    """
+    Top nodes by personalized PageRank. Results are cached by graph version and
+    seeds, so graphs without a version are always recomputed.
+    """
+    key = (graph.version, tuple(sorted(seeds.items())), top_k, method)
+
+    if graph.version:
+        with _lock:
+            if key in _results:
+                _results.move_to_end(key)
+                return _results[key]
+
+    result = get_pagerank_engine(graph).top_k(seeds, top_k, method)
+
+    if graph.version:
+        with _lock:
+            _results[key] = result
+            while len(_results) > RESULTS_CACHE_SIZE:
+                _results.popitem(last=False)
+
+    return result
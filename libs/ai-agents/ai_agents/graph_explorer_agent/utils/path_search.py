@@ -0,0 +1,192 @@
+import time
+
+import numpy as np
+
+from ai_agents.graph_explorer_agent.compact_graph import CompactGraph
+
+# A causal chain longer than this isn't meaningful to the agent anyway
+MAX_DEPTH = 6
+MAX_EXPANSIONS = 200_000
+TIME_LIMIT = 0.2
+
+
+class SearchBudget:
+    """
+    Caps the work of the searches sharing it, in scanned edges and wall time. Once
+    spent, searches stop and return what they found so far.
+    """
+
+    def __init__(
+        self, max_expansions: int = MAX_EXPANSIONS, time_limit: float = TIME_LIMIT
+    ):
+        self.max_expansions = max_expansions
+        self.deadline = time.monotonic() + time_limit
+        self.expansions = 0
+        self.exhausted = False
+
+    def charge(self, expansions: int) -> bool:
+        """Returns False once the budget is spent."""
+        self.expansions += expansions
+        if self.expansions > self.max_expansions or time.monotonic() > self.deadline:
+            self.exhausted = True
+        return not self.exhausted
+
+
+class _Frontier:
+    """One side of a bidirectional BFS."""
+
+    def __init__(self, graph: CompactGraph, root: int, forward: bool, directed: bool):
+        self.parents = np.full(len(graph), -1, dtype=np.int64)
+        self.parents[root] = root
+        self.nodes = np.array([root])
+        self.depth = 0
+
+        self.graph = graph
+        self.forward = forward
+        if not directed:
+            self.modes = ["out", "in"]
+        else:
+            self.modes = ["out" if forward else "in"]
+
+    def expand(
+        self,
+        budget: SearchBudget,
+        blocked_nodes: np.ndarray | None,
+        blocked_edges: np.ndarray | None,
+        n: int,
+    ) -> np.ndarray | None:
+        """Visits the next layer and returns its nodes, or None if out of budget."""
+        pairs = [self.graph.gather_neighbors(self.nodes, mode) for mode in self.modes]
+        sources = np.concatenate([p[0] for p in pairs])
+        targets = np.concatenate([p[1] for p in pairs])
+
+        if not budget.charge(len(targets)):
+            return None
+
+        keep = self.parents[targets] < 0
+        if blocked_nodes is not None:
+            keep &= ~blocked_nodes[targets]
+        if blocked_edges is not None and len(blocked_edges):
+            # Edges are blocked in the direction of the path, i.e. source -> target
+            heads, tails = (sources, targets) if self.forward else (targets, sources)
+            keep &= ~np.isin(heads * n + tails, blocked_edges)
+
+        targets, first = np.unique(targets[keep], return_index=True)
+        self.parents[targets] = sources[keep][first]
+        self.nodes = targets
+        self.depth += 1
+        return targets
+
+    def path_to(self, node: int) -> list[int]:
+        path = [node]
+        while self.parents[path[-1]] != path[-1]:
+            path.append(int(self.parents[path[-1]]))
+        return path
+
+
+def bidirectional_shortest_path(
+    graph: CompactGraph,
+    source: int,
+    target: int,
+    max_depth: int = MAX_DEPTH,
+    budget: SearchBudget | None = None,
+    directed: bool = True,
+    blocked_nodes: np.ndarray | None = None,
+    blocked_edges: np.ndarray | None = None,
+) -> list[int] | None:
+    """
+    Shortest path of at most max_depth edges, growing a BFS from both ends and
+    always expanding the smaller frontier. Undirected searches follow edges both
+    ways. `blocked_nodes` is a boolean mask and `blocked_edges` holds
+    source * len(graph) + target codes, both excluded from the path.
+    """
+    budget = budget or SearchBudget()
+    if source == target:
+        return [source]
+
+    n = len(graph)
+    forward = _Frontier(graph, source, forward=True, directed=directed)
+    backward = _Frontier(graph, target, forward=False, directed=directed)
+
+    while forward.depth + backward.depth < max_depth:
+        if not len(forward.nodes) or not len(backward.nodes):
+            return None
+
+        side, other = (
+            (forward, backward)
+            if len(forward.nodes) <= len(backward.nodes)
+            else (backward, forward)
+        )
+        visited = side.expand(budget, blocked_nodes, blocked_edges, n)
+        if visited is None:
+            return None
+
+        meeting = visited[other.parents[visited] >= 0]
+        if len(meeting):
+            # Every meeting node of the layer gives a path of the same length
+            node = int(meeting[0])
+            return forward.path_to(node)[::-1] + backward.path_to(node)[1:]
+
+    return None
+
+
+def k_shortest_paths(
+    graph: CompactGraph,
+    source: int,
+    target: int,
+    k: int,
+    max_depth: int = MAX_DEPTH,
+    budget: SearchBudget | None = None,
+) -> list[list[int]]:
+    """
+    Up to k shortest simple paths from source to target (Yen's algorithm), in
+    increasing length. Returns fewer paths if the budget runs out.
+    """
+    budget = budget or SearchBudget()
+    n = len(graph)
+
+    shortest = bidirectional_shortest_path(graph, source, target, max_depth, budget)
+    if shortest is None:
+        return []
+
+    paths = [shortest]
+    candidates: list[list[int]] = []
+
+    while len(paths) < k and not budget.exhausted:
+        previous = paths[-1]
+
+        for i in range(len(previous) - 1):
+            spur, root = previous[i], previous[: i + 1]
+
+            # Edges leaving the root of the paths already found, so as to deviate
+            blocked_edges = np.array(
+                [p[i] * n + p[i + 1] for p in paths if p[: i + 1] == root],
+                dtype=np.int64,
+            )
+            blocked_nodes = np.zeros(n, dtype=bool)
+            blocked_nodes[root[:-1]] = True
+
+            spur_path = bidirectional_shortest_path(
+                graph,
+                spur,
+                target,
+                max_depth - i,
+                budget,
+                blocked_nodes=blocked_nodes,
+                blocked_edges=blocked_edges,
+            )
+            if spur_path is not None:
+                candidate = root[:-1] + spur_path
+                if candidate not in candidates and candidate not in paths:
+                    candidates.append(candidate)
+
+            if budget.exhausted:
+                break
+
+        if not candidates:
+            break
+
+        candidates.sort(key=len)
+        paths.append(candidates.pop(0))
+
+    return paths
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import math
+from pathlib import Path
+from typing import Literal
+
+import faiss
+import numpy as np
+import polars as pl
+
+IndexKind = Literal["auto", "flat", "hnsw", "ivf"]
+
+# Below this many nodes an exact search is fast enough
+APPROXIMATE_MIN_NODES = 50_000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.array(vectors, dtype=np.float32, order="C", ndmin=2)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+class SimilarityIndex:
+    """
+    Cosine similarity index over the node embeddings of a graph, built once and
+    persisted next to it.
+
+    "flat" is exact, "hnsw" and "ivf" are approximate indexes for large graphs, and
+    "auto" picks HNSW above APPROXIMATE_MIN_NODES nodes. Searches on a built index
+    are read-only and faiss releases the GIL, so lookups can run concurrently.
+    """
+
+    def __init__(self, index: faiss.Index, node_ids: list[str]):
+        self.index = index
+        self.node_ids = node_ids
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint: the stored vectors (plus HNSW links)."""
+        nbytes = self.index.ntotal * self.index.d * 4
+        if isinstance(self.index, faiss.IndexHNSW):
+            nbytes += self.index.ntotal * HNSW_M * 2 * 4
+        return nbytes
+
+    @classmethod
+    def build(
+        cls, node_ids: list[str], embeddings: np.ndarray, kind: IndexKind = "auto"
+    ) -> "SimilarityIndex":
+        vectors = _normalize(embeddings)
+        n, dimension = vectors.shape
+
+        if kind == "auto":
+            kind = "hnsw" if n >= APPROXIMATE_MIN_NODES else "flat"
+
+        if kind == "hnsw":
+            index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        elif kind == "ivf":
+            # faiss wants ~39 training points per list
+            n_lists = max(1, min(int(4 * math.sqrt(n)), n // 39))
+            quantizer = faiss.IndexFlatIP(dimension)
+            index = faiss.IndexIVFFlat(
+                quantizer, dimension, n_lists, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(vectors)  # type: ignore
+            index.nprobe = max(1, n_lists // 16)
+        else:
+            index = faiss.IndexFlatIP(dimension)
+
+        index.add(vectors)  # type: ignore
+        return cls(index, node_ids)
+
+    @classmethod
+    def from_nodes_df(
+        cls,
+        df: pl.DataFrame,
+        id_col: str = "id",
+        embedding_col: str = "embedding",
+        kind: IndexKind = "auto",
+    ) -> "SimilarityIndex":
+        df = df.select(id_col, embedding_col).filter(
+            pl.col(embedding_col).is_not_null()
+        )
+        embeddings = df.get_column(embedding_col)
+
+        # Fixed-size arrays convert to a 2D array without going through Python lists
+        if isinstance(embeddings.dtype, pl.Array):
+            vectors = embeddings.to_numpy()
+        else:
+            vectors = np.array(embeddings.to_list(), dtype=np.float32)
+
+        return cls.build(df.get_column(id_col).to_list(), vectors, kind)
+
+    def save(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        faiss.write_index(self.index, str(directory / "index.faiss"))
+        (directory / "node_ids.json").write_text(json.dumps(self.node_ids))
+
+    @classmethod
+    def load(cls, directory: Path) -> "SimilarityIndex":
+        return cls(
+            faiss.read_index(str(directory / "index.faiss")),
+            json.loads((directory / "node_ids.json").read_text()),
+        )
+
+    def search(
+        self, queries: np.ndarray, top_k: int, threshold: float | None = None
+    ) -> list[list[tuple[str, float]]]:
+        """Returns the (node_id, similarity) of the top_k matches of each query."""
+        scores, idxs = self.index.search(_normalize(queries), top_k)  # type: ignore
+
+        return [
+            [
+                (self.node_ids[i], float(score))
+                for i, score in zip(row_idxs, row_scores)
+                # faiss pads with -1 when there are fewer than top_k results
+                if i >= 0 and (threshold is None or score >= threshold)
+            ]
+            for row_idxs, row_scores in zip(idxs, scores)
+        ]
+
+    async def asearch(
+        self, queries: np.ndarray, top_k: int, threshold: float | None = None
+    ) -> list[list[tuple[str, float]]]:
+        return await asyncio.to_thread(self.search, queries, top_k, threshold)